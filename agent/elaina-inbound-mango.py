@@ -13,10 +13,12 @@ sys.path.append(agent_dir)
 
 import asyncio
 import logging
+import time
 from livekit import rtc, api
 from livekit.agents import (
     AgentSession,
     JobContext,
+    JobProcess,
     RunContext,
     get_job_context,
     cli,
@@ -25,9 +27,11 @@ from livekit.agents import (
 from livekit.agents.llm import ChatMessage
 
 from modules.agent_core import InboundAgent
-from modules.config_manager import get_llm_config, get_stt_config, get_tts_config, get_vad_config, get_session_config, initialize_environment, get_config_value
-from modules.media_config import setup_vad, setup_stt, setup_tts, setup_llm, setup_session_config, setup_metrics_handler, warmup_llm
-from modules.sip_data_handler import process_sip_call_data
+from modules.config_manager import get_llm_config, get_stt_config, get_tts_config, get_vad_config, get_session_config, get_client_directory_config, initialize_environment, get_config_value
+from modules.media_config import setup_vad, setup_stt, setup_tts, setup_llm, setup_session_config, setup_metrics_handler, setup_llm_warmup, load_tts_model, setup_tts_phrase_cache, start_tts_warmup, load_vad, create_http_clients
+from modules.sip_data_handler import determine_phone_number, lookup_client_name
+from modules.client_directory import get_client_directory
+from modules.prompt_processor import format_greeting, prompt_registry
 
 # Инициализируем окружение до создания WorkerOptions
 initialize_environment()
@@ -40,24 +44,79 @@ logger.info(f"LIVEKIT_API_KEY из окружения: {get_config_value('LIVEKI
 logger.info(f"LIVEKIT_API_SECRET из окружения: {get_config_value('LIVEKIT_API_SECRET')}")
 
 
-async def entrypoint(ctx: JobContext):
-    logger.info(f"connecting to room {ctx.room.name}")
-    await ctx.connect()
+def prewarm(proc: JobProcess):
+    """Загрузка тяжелых моделей и клиентов один раз на процесс воркера, до поступления звонков"""
+    prewarm_start = time.perf_counter()
+
+    proc.userdata["vad"] = load_vad(get_vad_config())
+    logger.info(f"Silero VAD загружен в prewarm за {time.perf_counter() - prewarm_start:.2f}с")
+
+    # Пулы соединений с локальными whisper и llama.cpp
+    proc.userdata["http_clients"] = create_http_clients(get_stt_config(), get_llm_config())
+    proc.userdata["llm_warmup"] = setup_llm_warmup(get_llm_config())
+
+    # Индекс справочника клиентов строится до первого звонка
+    get_client_directory().load()
+
+    tts_start = time.perf_counter()
+    tts_config = get_tts_config()
+    proc.userdata["tts_model"] = load_tts_model()
+    proc.userdata["tts_phrase_cache"] = setup_tts_phrase_cache(tts_config)
+    logger.info(f"Модель TTS загружена в prewarm за {time.perf_counter() - tts_start:.2f}с")
+
+    # Приветствия известных клиентов синтезируются в фоне (уже закэшированные на диске
+    # пропускаются), готовность процесса от этого не зависит; первый звонок прогрев останавливает
+    if proc.userdata["tts_phrase_cache"] is not None and tts_config["cache_warmup"]:
+        tts = setup_tts(tts_config, model=proc.userdata["tts_model"], phrase_cache=proc.userdata["tts_phrase_cache"])
+        proc.userdata["tts_warmup_stop"] = start_tts_warmup(tts_config, tts)
+
+    # Шаблоны промптов читаются и разбираются один раз на процесс
+    prompt_registry.preload()
+
+    proc.userdata["jobs_started"] = 0
+    logger.info(f"prewarm завершён за {time.perf_counter() - prewarm_start:.2f}с")
+
 
-    # Для входящего вызова получаем информацию о SIP-участнике из метаданных
+async def entrypoint(ctx: JobContext):
+    call_start = time.perf_counter()
+    # Первый звонок процесса — «холодный» воркер
+    jobs_started = ctx.proc.userdata.get("jobs_started", 0)
+    ctx.proc.userdata["jobs_started"] = jobs_started + 1
+    # Фоновый прогрев кэша фраз TTS не должен занимать модель и CPU во время звонков
+    tts_warmup_stop = ctx.proc.userdata.get("tts_warmup_stop")
+    if tts_warmup_stop is not None:
+        tts_warmup_stop.set()
+
+    # Для входящего вызова получаем информацию о SIP-участнике из метаданных задания
+    # (доступны до подключения к комнате)
     phone_number = "unknown"
-    client_name = "Иван"
     
     if ctx.job.metadata:
         # Используем новый обработчик SIP-данных
-        phone_number, client_name = process_sip_call_data(
+        phone_number = determine_phone_number(
             ctx.job.metadata,
-            ctx.room.name,
+            ctx.job.room.name,
             ""  # participant_identity пока не известен
         )
 
+    # Имя клиента ищется асинхронно, не блокируя цикл событий
+    client_lookup_timeout = get_client_directory_config()["lookup_timeout"]
+    client_name = await lookup_client_name(phone_number, timeout=client_lookup_timeout)
+
     # Создаем агента с информацией о звонящем
-    agent = InboundAgent(phone_number=phone_number)
+    agent = InboundAgent(phone_number=phone_number, client_name=client_name)
+
+    # Прогрев префикса промпта в llama.cpp идёт в фоне, параллельно с подключением к комнате
+    # и ожиданием участника (Prompt Warmup)
+    # Когда пользователь заговорил, прогрев слот уже не трогает: restore или prefill перезаписали
+    # бы KV-кэш запроса разговора
+    llm_session_started = asyncio.Event()
+    llm_warmup = ctx.proc.userdata.get("llm_warmup")
+    if llm_warmup is not None:
+        llm_warmup.schedule(agent.instructions, session_started=llm_session_started)
+
+    logger.info(f"connecting to room {ctx.job.room.name}")
+    await ctx.connect()
 
     # Получаем конфигурации
     llm_config = get_llm_config()
@@ -66,11 +125,13 @@ async def entrypoint(ctx: JobContext):
     vad_config = get_vad_config()
     session_config = get_session_config()
 
-    # Создаем компоненты
-    vad = setup_vad(vad_config)
-    stt = setup_stt(stt_config)
-    tts = setup_tts(tts_config)
-    llm = setup_llm(llm_config)
+    # Создаем компоненты (модели и клиенты из prewarm переиспользуются между звонками)
+    http_clients = ctx.proc.userdata.get("http_clients", {})
+    vad = setup_vad(vad_config, vad=ctx.proc.userdata.get("vad"))
+    stt = setup_stt(stt_config, client=http_clients.get("stt"))
+    tts = setup_tts(tts_config, model=ctx.proc.userdata.get("tts_model"),
+                    phrase_cache=ctx.proc.userdata.get("tts_phrase_cache"))
+    llm = setup_llm(llm_config, client=http_clients.get("llm"))
 
     # Создаем конфигурацию сессии
     session_kwargs = setup_session_config(session_config, stt, tts, llm, vad)
@@ -78,12 +139,14 @@ async def entrypoint(ctx: JobContext):
     # Пайплайн
     session = AgentSession(**session_kwargs)
 
+    @session.on("user_state_changed")
+    def _on_user_started_speaking(ev):
+        if ev.new_state == "speaking":
+            llm_session_started.set()
+
     # Настройка обработчика метрик
     setup_metrics_handler(session)
 
-    # Прогрев промпта (Prompt Warmup)
-    await warmup_llm(llm, phone_number, client_name)
-
     # Начинаем сессию агента
     await session.start(agent=agent, room=ctx.room)
 
@@ -93,28 +156,37 @@ async def entrypoint(ctx: JobContext):
 
     # Если номер телефона не был определен ранее, пробуем извлечь из идентификатора участника
     if agent.phone_number == "unknown":
-        from modules.sip_data_handler import extract_phone_number_from_participant_identity, identify_client_by_phone
+        from modules.sip_data_handler import extract_phone_number_from_participant_identity
         phone_number = extract_phone_number_from_participant_identity(participant.identity)
         if phone_number:
-            agent.client_name = identify_client_by_phone(phone_number)
+            agent.client_name = await lookup_client_name(phone_number, timeout=client_lookup_timeout)
             agent.phone_number = phone_number
 
     # Устанавливаем участника в агенте
     agent.set_participant(participant)
 
     # Сразу говорим фразу приветствия
-    await session.say(f'<prosody rate="175%"> Здравствуйте {agent.client_name}, медицинский центр СМИТРА. </prosody> <prosody rate="175%"> Меня зовут Елена, слушаю вас? </prosody>')
+    await session.say(format_greeting(agent.client_name))
+    logger.info(f"[Latency] От ответа на звонок до конца приветствия: {time.perf_counter() - call_start:.2f}с "
+                f"({'холодный' if jobs_started == 0 else 'прогретый'} воркер, звонок №{jobs_started + 1} процесса)")
+
+    # Фраза прощания в окончательной расшифровке завершает вызов. В промежуточной — только взводит
+    # завершение: вызов завершается, если пользователь замолчал (VAD) и окончательная расшифровка
+    # за farewell_interim_delay не опровергла фразу; расшифровка без фразы в конце его отменяет
+    @session.on("user_input_transcribed")
+    def _on_user_input_transcribed(ev):
+        if agent.call_ended:
+            return
+        if ev.is_final:
+            logger.info(f"Пользователь сказал: {ev.transcript}")
+        agent.farewell_hangup.on_transcript(ev.transcript, ev.is_final)
 
-    # Добавляем обработчик для отслеживания генерации речи агентом
-    @session.on("user_speech_committed")
-    def _on_user_speech_committed(user_speech: rtc.SpeechData):
-        logger.info(f"Пользователь сказал: {user_speech.text}")
-        
-        # Проверяем, сказал ли пользователь фразу прощания
-        if agent.should_end_call(user_speech.text):
-            logger.info("Пользователь сказал фразу прощания, инициируем завершение вызова")
-            # Запускаем завершение в контексте текущей сессии
-            asyncio.create_task(agent._trigger_end_call())
+    @session.on("user_state_changed")
+    def _on_user_state_changed(ev):
+        if ev.new_state == "speaking":
+            agent.farewell_hangup.on_user_speaking()
+        elif ev.new_state == "listening":
+            agent.farewell_hangup.on_user_speech_ended()
 
     # Добавляем обработчик для отслеживания генерации речи агентом
     @session.on("agent_speech_committed")
@@ -147,6 +219,7 @@ if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
             agent_name="elaina-inbound-mango",
             job_memory_warn_mb=1500,
             ws_url=get_config_value("LIVEKIT_URL"),
@@ -33,6 +33,7 @@ from livekit.plugins.turn_detector.multilingual import MultilingualModel
 # Добавляем родительскую директорию в sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from elaina_tts.elaina_tts import ElainaTTS
+from modules.sip_data_handler import identify_client_by_phone, lookup_client_name
 
 logger = logging.getLogger("elaina-inbound-worker")
 logger.setLevel(logging.INFO)
@@ -57,15 +58,8 @@ load_env_file(env_path)
 
 class InboundAgent(Agent):
     def __init__(self, *, phone_number: str = ""):
-        # Словарь сопоставления номеров телефонов именам клиентов
-        phone_to_name = {
-            "79133888778": "Денис Сергеевич",
-            "79955701443": "Денис",
-            "79137296699": "Павел",
-            "79831379240": "Артем"
-        }
-        # Определяем имя клиента по номеру телефона
-        self.client_name = phone_to_name.get(phone_number, "Иван")
+        # Определяем имя клиента по номеру телефона (справочник клиентов)
+        self.client_name = identify_client_by_phone(phone_number)
         
         # Читаем промпт из markdown файла
         prompt_template = self._load_prompt_template()
@@ -420,13 +414,7 @@ async def entrypoint(ctx: JobContext):
         if participant_identity and participant_identity.startswith('sip_'):
             phone_number = participant_identity[4:]  # Убираем префикс 'sip_'
             # Обновляем имя клиента в агенте
-            phone_to_name = {
-                "79133888778": "Денис Сергеевич",
-                "79955701443": "Денис",
-                "79137296699": "Павел",
-                "79831379240": "Артем"
-            }
-            agent.client_name = phone_to_name.get(phone_number, "Иван")
+            agent.client_name = await lookup_client_name(phone_number)
             agent.phone_number = phone_number
 
     # Устанавливаем участника в агенте
@@ -14,6 +14,7 @@ from livekit.agents import (
     AgentSession,
     Agent,
     JobContext,
+    JobProcess,
     function_tool,
     RunContext,
     get_job_context,
@@ -31,7 +32,7 @@ from livekit.plugins import (
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 # Добавляем родительскую директорию в sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from elaina_tts.elaina_tts import ElainaTTS
+from elaina_tts.elaina_tts import ElainaTTS, load_elaina_model
 
 logger = logging.getLogger("elaina-outbound-caller-worker")
 logger.setLevel(logging.INFO)
@@ -255,6 +256,11 @@ class OutboundCaller(Agent):
         await self.hangup()
 
 
+def prewarm(proc: JobProcess):
+    """Загрузка модели TTS один раз на процесс воркера, до поступления звонков"""
+    proc.userdata["tts_model"] = load_elaina_model()
+
+
 async def entrypoint(ctx: JobContext):
     logger.info(f"connecting to room {ctx.room.name}")
     await ctx.connect()
@@ -276,7 +282,7 @@ async def entrypoint(ctx: JobContext):
     llama_model = os.getenv("LLAMA_MODEL", "qwen3-4b")
     llama_base_url = os.getenv("LLAMA_BASE_URL", "http://127.0.0.1:11434/v1")
     #aidar, baya, kseniya, xenia, eugene
-    elaina_tts = ElainaTTS(speaker="baya", sample_rate=48000, num_channels=1)
+    elaina_tts = ElainaTTS(speaker="baya", sample_rate=48000, num_channels=1, model=ctx.proc.userdata.get("tts_model"))
 
     # Пайплайн
     session = AgentSession(
@@ -351,6 +357,7 @@ if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
             agent_name="elaina-outbound-mango",
             job_memory_warn_mb=8000, 
         )
@@ -17,21 +17,22 @@ from livekit.agents import (
 )
 from livekit.agents.llm import ChatMessage
 
+from .config_manager import get_session_config
+from .farewell_detector import DEFAULT_FAREWELL_PHRASES, FarewellDetector, FarewellHangup, load_farewell_phrases
+
 logger = logging.getLogger("elaina-inbound-worker")
 logger.setLevel(logging.INFO)
 
 
 class InboundAgent(Agent):
-    def __init__(self, *, phone_number: str = ""):
-        # Словарь сопоставления номеров телефонов именам клиентов
-        phone_to_name = {
-            "79133888778": "Денис Сергеевич",
-            "79955701443": "Денис",
-            "79137296699": "Павел",
-            "79831379240": "Артем"
-        }
-        # Определяем имя клиента по номеру телефона
-        self.client_name = phone_to_name.get(phone_number, "Иван")
+    _farewell_detector: FarewellDetector | None = None
+
+    def __init__(self, *, phone_number: str = "", client_name: str | None = None):
+        # Имя клиента: найденное заранее (асинхронно) или из справочника клиентов
+        if client_name is None:
+            from .sip_data_handler import identify_client_by_phone
+            client_name = identify_client_by_phone(phone_number)
+        self.client_name = client_name
         
         # Загружаем промпт из внешнего обработчика
         from .prompt_processor import load_and_process_prompt
@@ -47,28 +48,23 @@ class InboundAgent(Agent):
         # Флаг для отслеживания состояния завершения вызова
         self.call_ended = False
         
-        # Список ключевых фраз прощания, которые должны приводить к завершению вызова
-        self.farewell_phrases = [
-            "спасибо за обращение",
-            "хорошего дня",
-            "до свидания",
-            "всего доброго",
-            "благодарю за звонок",
-            "рада была помочь",
-            "звоните еще",
-            "обращайтесь еще",
-            "спасибо, до свидания",
-            "спасибо, хорошего дня",
-            "ладно, до свидания",
-            "всего наилучшего",
-            "благодарю, до новых встреч",
-            "рада была помочь, до свидания",
-            "спасибо за обращение! до свидания",
-            "хорошо, до связи",
-            "пока",
-            "покидаю вас",
-            "завершаю вызов"
-        ]
+        # Ключевые фразы прощания (детектор строится один раз на класс)
+        self.farewell_phrases = self.get_farewell_detector().phrases
+
+        # Завершение вызова по фразе прощания в расшифровках речи пользователя
+        self.farewell_hangup = FarewellHangup(
+            self.get_farewell_detector(), self._trigger_end_call,
+            grace=get_session_config()["farewell_interim_delay"],
+        )
+
+    @classmethod
+    def get_farewell_detector(cls) -> FarewellDetector:
+        """Детектор фраз прощания; фразы берутся из FAREWELL_PHRASES_FILE или списка по умолчанию"""
+        if cls._farewell_detector is None:
+            phrases_file = get_session_config()["farewell_phrases_file"]
+            phrases = load_farewell_phrases(phrases_file) if phrases_file else DEFAULT_FAREWELL_PHRASES
+            cls._farewell_detector = FarewellDetector(phrases)
+        return cls._farewell_detector
 
     def set_participant(self, participant: rtc.RemoteParticipant):
         self.participant = participant
@@ -81,6 +77,7 @@ class InboundAgent(Agent):
 
         logger.info(f"Начинаем завершение вызова для {self.participant.identity}")
         self.call_ended = True
+        self.farewell_hangup.cancel()
 
         try:
             # Получаем контекст задания
@@ -160,23 +157,13 @@ class InboundAgent(Agent):
         # Запускаем завершение
         await self._trigger_end_call()
 
-    def should_end_call(self, text: str) -> bool:
-        """Проверяет, содержит ли текст фразы прощания, требующие завершения вызова"""
-        import re
-        text_lower = text.lower().strip()
-        
-        # Нормализация: удаляем знаки препинания, оставляем пробелы
-        normalized_text = re.sub(r'[^\w\s]', ' ', text_lower)
-        normalized_text = ' '.join(normalized_text.split())
-        
-        # Проверяем наличие ключевых фраз В КОНЦЕ текста (чтобы избежать ложных срабатываний)
-        for phrase in self.farewell_phrases:
-            if phrase in normalized_text:
-                # Дополнительно проверяем, что фраза находится ближе к концу сообщения
-                if normalized_text.endswith(phrase) or \
-                   len(normalized_text) - normalized_text.find(phrase) < len(phrase) + 5:
-                    return True
-        return False
+    def should_end_call(self, text: str, interim: bool = False) -> bool:
+        """Проверяет, содержит ли текст фразы прощания, требующие завершения вызова
+
+        Фраза должна стоять в конце текста (чтобы избежать ложных срабатываний); в промежуточной
+        расшифровке (interim) — в самом конце, без хвоста
+        """
+        return self.farewell_hangup.matches(text, interim=interim)
 
     @function_tool()
     async def look_up_availability(
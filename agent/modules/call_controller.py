@@ -1,9 +1,12 @@
 import asyncio
 import logging
+from functools import lru_cache
 
 from livekit import rtc, api
 from livekit.agents import get_job_context
 
+from .farewell_detector import FAREWELL_MAX_TAIL, FarewellDetector
+
 logger = logging.getLogger("elaina-inbound-worker")
 logger.setLevel(logging.INFO)
 
@@ -84,20 +87,13 @@ async def handle_detected_answering_machine(participant_identity: str, call_ende
     return await trigger_end_call(participant_identity, call_ended_flag)
 
 
+@lru_cache(maxsize=8)
+def _get_farewell_detector(farewell_phrases: tuple[str, ...]) -> FarewellDetector:
+    return FarewellDetector(farewell_phrases)
+
+
 def check_farewell_phrases(text: str, farewell_phrases: list[str]) -> bool:
     """Проверяет, содержит ли текст фразы прощания, требующие завершения вызова"""
-    import re
-    text_lower = text.lower().strip()
-    
-    # Нормализация: удаляем знаки препинания, оставляем пробелы
-    normalized_text = re.sub(r'[^\w\s]', ' ', text_lower)
-    normalized_text = ' '.join(normalized_text.split())
-    
     # Проверяем наличие ключевых фраз В КОНЦЕ текста (чтобы избежать ложных срабатываний)
-    for phrase in farewell_phrases:
-        if phrase in normalized_text:
-            # Дополнительно проверяем, что фраза находится ближе к концу сообщения
-            if normalized_text.endswith(phrase) or \
-               len(normalized_text) - normalized_text.find(phrase) < len(phrase) + 5:
-                return True
-    return False
\ No newline at end of file
+    detector = _get_farewell_detector(tuple(farewell_phrases))
+    return detector.find(text, max_tail=FAREWELL_MAX_TAIL) is not None
@@ -0,0 +1,210 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("elaina-inbound-worker")
+logger.setLevel(logging.INFO)
+
+DEFAULT_CLIENT_NAME = "Иван"
+
+
+def normalize_phone(phone: str) -> Optional[str]:
+    """Номер телефона в формате E.164 (+79133888778); None, если строка не похожа на номер"""
+    if not phone:
+        return None
+    digits = ''.join(c for c in phone if c.isdigit())
+    # Российские номера: 8XXXXXXXXXX и 9XXXXXXXXX без кода страны
+    if len(digits) == 11 and digits[0] == '8':
+        digits = '7' + digits[1:]
+    elif len(digits) == 10 and digits[0] == '9':
+        digits = '7' + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def _phone_key(phone: str) -> Optional[int]:
+    """Ключ индекса: цифры номера E.164 как int (компактнее строки в словаре на сотни тысяч записей)"""
+    normalized = normalize_phone(phone)
+    return int(normalized[1:]) if normalized else None
+
+
+class ClientDirectory:
+    """
+    Справочник клиентов: номер телефона -> имя.
+
+    Источник — файл (.json: {"номер": "имя"} или [{"phone": ..., "name": ...}]; .csv/.tsv с
+    колонками phone и name) или база SQLite (.db/.sqlite/.sqlite3, таблица
+    clients(phone TEXT PRIMARY KEY, name TEXT), номера в формате E.164).
+
+    Файл загружается один раз в хэш-индекс по нормализованному номеру E.164. Запросы к SQLite
+    выполняются в пуле потоков и кэшируются в LRU-кэше с TTL, так что поиск не блокирует
+    цикл событий.
+    """
+
+    SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+    def __init__(self, path: str, default_name: str = DEFAULT_CLIENT_NAME, cache_size: int = 4096,
+                 cache_ttl: float = 300.0):
+        self.path = path
+        self.default_name = default_name
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.is_sqlite = bool(path) and path.lower().endswith(self.SQLITE_SUFFIXES)
+
+        self._index: Optional[Dict[int, str]] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        # ключ номера -> (имя или None, момент истечения)
+        self._cache: OrderedDict[int, Tuple[Optional[str], float]] = OrderedDict()
+        self._load_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.stats = {"lookups": 0, "cache_hits": 0, "queries": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._connection is not None if self.is_sqlite else self._index is not None
+
+    def load(self):
+        """Строит индекс из файла или открывает базу SQLite (из prewarm воркера)"""
+        with self._load_lock:
+            if self.loaded:
+                return
+            if self.is_sqlite:
+                self._connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+                logger.info(f"Справочник клиентов: база SQLite {self.path}")
+            else:
+                self._index = self._read_file()
+
+    def _read_records(self) -> Iterator[Tuple[str, str]]:
+        if self.path.lower().endswith('.json'):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                yield from data.items()
+            else:
+                yield from ((str(record.get("phone", "")), record.get("name", "")) for record in data)
+        else:
+            delimiter = '\t' if self.path.lower().endswith('.tsv') else ','
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                for record in csv.DictReader(f, delimiter=delimiter):
+                    yield record.get("phone", ""), record.get("name", "")
+
+    def _read_file(self) -> Dict[int, str]:
+        if not self.path or not os.path.exists(self.path):
+            logger.warning(f"Файл справочника клиентов не найден: {self.path}")
+            return {}
+
+        start = time.perf_counter()
+        index: Dict[int, str] = {}
+        # Одинаковые имена хранятся одной строкой
+        names: Dict[str, str] = {}
+        for phone, name in self._read_records():
+            key = _phone_key(phone)
+            name = (name or '').strip()
+            if key is None or not name:
+                continue
+            index[key] = names.setdefault(name, name)
+
+        logger.info(f"Справочник клиентов: {len(index)} номеров из {self.path} "
+                    f"за {time.perf_counter() - start:.2f}с")
+        return index
+
+    def _query(self, key: int) -> Optional[str]:
+        with self._db_lock:
+            row = self._connection.execute("SELECT name FROM clients WHERE phone = ?", (f"+{key}",)).fetchone()
+        self.stats["queries"] += 1
+        return row[0] if row else None
+
+    def _cache_get(self, key: int) -> Tuple[bool, Optional[str]]:
+        entry = self._cache.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        self._cache.move_to_end(key)
+        self.stats["cache_hits"] += 1
+        return True, entry[0]
+
+    def _cache_put(self, key: int, name: Optional[str]):
+        self._cache[key] = (name, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, phone: str) -> Optional[str]:
+        """Имя клиента по номеру или None"""
+        key = _phone_key(phone)
+        if key is None:
+            return None
+        self.stats["lookups"] += 1
+        if not self.loaded:
+            await asyncio.to_thread(self.load)
+        if self._index is not None:
+            return self._index.get(key)
+
+        hit, name = self._cache_get(key)
+        if not hit:
+            name = await asyncio.to_thread(self._query, key)
+            self._cache_put(key, name)
+        return name
+
+    def get_sync(self, phone: str) -> Optional[str]:
+        """Блокирующий вариант get для синхронного кода"""
+        key = _phone_key(phone)
+        if key is None:
+            return None
+        self.stats["lookups"] += 1
+        self.load()
+        if self._index is not None:
+            return self._index.get(key)
+
+        hit, name = self._cache_get(key)
+        if not hit:
+            name = self._query(key)
+            self._cache_put(key, name)
+        return name
+
+    async def lookup(self, phone: str) -> str:
+        """Имя клиента по номеру или имя по умолчанию"""
+        return await self.get(phone) or self.default_name
+
+    def lookup_sync(self, phone: str) -> str:
+        return self.get_sync(phone) or self.default_name
+
+    def known_names(self, limit: Optional[int] = None) -> List[str]:
+        """Имена клиентов, от самых частых к редким (для прогрева кэша фраз TTS)"""
+        self.load()
+        if self._index is not None:
+            return [name for name, _ in Counter(self._index.values()).most_common(limit)]
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT name FROM clients GROUP BY name ORDER BY COUNT(*) DESC LIMIT ?",
+                (-1 if limit is None else limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats, cached=len(self._cache), indexed=len(self._index or {}))
+
+
+_client_directory: Optional[ClientDirectory] = None
+
+
+def get_client_directory() -> ClientDirectory:
+    """Справочник клиентов процесса (создаётся по конфигурации при первом обращении)"""
+    global _client_directory
+    if _client_directory is None:
+        from .config_manager import get_client_directory_config
+        config = get_client_directory_config()
+        _client_directory = ClientDirectory(
+            config["path"],
+            default_name=config["default_name"],
+            cache_size=config["cache_size"],
+            cache_ttl=config["cache_ttl"],
+        )
+    return _client_directory
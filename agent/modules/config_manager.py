@@ -60,6 +60,15 @@ def get_llm_config():
         "api_key": get_config_value("LLM_API_KEY", "no-api-key-required"),  # Для локальных LLM
         "timeout": float(get_config_value("LLM_TIMEOUT", "5.0")),
         "max_retries": int(get_config_value("LLM_MAX_RETRIES", "3")),
+        # Прогрев префикса системного промпта в слоте llama.cpp
+        "slot_id": int(get_config_value("LLAMA_SLOT_ID", "0")),
+        # Сохранение/восстановление слотов (llama-server с --slot-save-path)
+        "slot_save": get_config_value("LLAMA_SLOT_SAVE", "true").lower() in ("1", "true", "yes"),
+        # Каталог --slot-save-path, как он виден воркеру (файлы слотов удаляются отсюда; без доступа
+        # к нему состояние слотов не сохраняется) и сколько последних файлов в нём хранить
+        "slot_save_dir": get_config_value("LLAMA_SLOT_SAVE_DIR", "/srv/livekit/inference/llama/slots"),
+        "slot_save_keep": int(get_config_value("LLAMA_SLOT_SAVE_KEEP", "16")),
+        "warmup_timeout": float(get_config_value("LLAMA_WARMUP_TIMEOUT", "60.0")),
     }
     logger.debug(f"Сформирована конфигурация LLM: {config}")
     return config
@@ -81,6 +90,38 @@ def get_tts_config():
         "speaker": get_config_value("TTS_SPEAKER", "baya"),
         "sample_rate": int(get_config_value("TTS_SAMPLE_RATE", "48000")),
         "num_channels": int(get_config_value("TTS_NUM_CHANNELS", "1")),
+        "streaming": get_config_value("TTS_STREAMING", "true").lower() in ("1", "true", "yes"),
+        # Кэш синтезированных фраз (пустой TTS_CACHE_DIR — только кэш в памяти)
+        "cache_enabled": get_config_value("TTS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "cache_dir": get_config_value(
+            "TTS_CACHE_DIR",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "elaina_tts", "phrase_cache"),
+        ),
+        "cache_memory_mb": int(get_config_value("TTS_CACHE_MEMORY_MB", "64")),
+        # Лимит дискового кэша фраз (вытесняются давно не использованные)
+        "cache_disk_mb": int(get_config_value("TTS_CACHE_DISK_MB", "512")),
+        "cache_warmup": get_config_value("TTS_CACHE_WARMUP", "true").lower() in ("1", "true", "yes"),
+        "cache_warmup_file": get_config_value("TTS_CACHE_WARMUP_FILE", ""),
+        # Сколько самых частых имён клиентов озвучивать заранее в приветствии
+        "cache_warmup_names": int(get_config_value("TTS_CACHE_WARMUP_NAMES", "200")),
+        # Лимит времени фонового прогрева кэша фраз, секунды
+        "cache_warmup_budget": float(get_config_value("TTS_CACHE_WARMUP_BUDGET", "120")),
+    }
+
+
+def get_client_directory_config():
+    """Получение конфигурации справочника клиентов"""
+    return {
+        # Файл (.json, .csv, .tsv) или база SQLite (.db, .sqlite, .sqlite3) с номерами и именами клиентов
+        "path": get_config_value(
+            "CLIENT_DIRECTORY_PATH",
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), "clients.json"),
+        ),
+        "default_name": get_config_value("CLIENT_DEFAULT_NAME", "Иван"),
+        "cache_size": int(get_config_value("CLIENT_DIRECTORY_CACHE_SIZE", "4096")),
+        "cache_ttl": float(get_config_value("CLIENT_DIRECTORY_CACHE_TTL", "300.0")),
+        # Если поиск не уложился в таймаут, используется имя по умолчанию
+        "lookup_timeout": float(get_config_value("CLIENT_LOOKUP_TIMEOUT", "0.5")),
     }
 
 
@@ -98,4 +139,9 @@ def get_session_config():
     return {
         "min_endpointing_delay": float(get_config_value("SESSION_MIN_ENDPOINTING_DELAY", "0.1")),
         "min_interruption_words": int(get_config_value("SESSION_MIN_INTERRUPTION_WORDS", "2")),
+        # Файл фраз прощания (по одной на строку); пустое значение — встроенный список
+        "farewell_phrases_file": get_config_value("FAREWELL_PHRASES_FILE", ""),
+        # Сколько ждать окончательной расшифровки после окончания речи, если промежуточная
+        # закончилась фразой прощания; затем вызов завершается
+        "farewell_interim_delay": float(get_config_value("FAREWELL_INTERIM_DELAY", "1.5")),
     }
\ No newline at end of file
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger("elaina-inbound-worker")
+logger.setLevel(logging.INFO)
+
+# Ключевые фразы прощания, которые должны приводить к завершению вызова
+DEFAULT_FAREWELL_PHRASES = [
+    "спасибо за обращение",
+    "хорошего дня",
+    "до свидания",
+    "всего доброго",
+    "благодарю за звонок",
+    "рада была помочь",
+    "звоните еще",
+    "обращайтесь еще",
+    "спасибо, до свидания",
+    "спасибо, хорошего дня",
+    "ладно, до свидания",
+    "всего наилучшего",
+    "благодарю, до новых встреч",
+    "рада была помочь, до свидания",
+    "спасибо за обращение! до свидания",
+    "хорошо, до связи",
+    "пока",
+    "покидаю вас",
+    "завершаю вызов"
+]
+
+# Сколько символов нормализованного текста может идти после фразы прощания
+FAREWELL_MAX_TAIL = 4
+
+
+class FarewellMatch(NamedTuple):
+    phrase: str
+    # Число символов нормализованного текста после фразы (0 — фраза в самом конце)
+    distance: int
+
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, знаки препинания заменены пробелами, пробелы схлопнуты"""
+    return ' '.join(_PUNCTUATION_RE.sub(' ', text.lower()).split())
+
+
+def load_farewell_phrases(path: str) -> List[str]:
+    """Фразы прощания из текстового файла: по одной на строку, '#' — комментарий"""
+    with open(path, 'r', encoding='utf-8') as f:
+        phrases = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+    logger.info(f"Загружено {len(phrases)} фраз прощания из {path}")
+    return phrases
+
+
+class FarewellDetector:
+    """
+    Детектор фраз прощания: префиксное дерево всех фраз, скомпилированное в одно регулярное
+    выражение. Поиск идёт за один проход по перевёрнутому тексту, поэтому первое совпадение —
+    ближайшая к концу фраза. Фразы совпадают только целыми словами.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        # Фразы нормализуются так же, как текст ("спасибо, до свидания" -> "спасибо до свидания")
+        self.phrases: List[str] = list(dict.fromkeys(p for p in map(normalize_text, phrases) if p))
+        self._phrase_by_reversed = {phrase[::-1]: phrase for phrase in self.phrases}
+
+        trie: Dict[str, dict] = {}
+        for phrase in self.phrases:
+            node = trie
+            for c in reversed(phrase):
+                node = node.setdefault(c, {})
+            node[''] = {}  # конец фразы
+
+        # Пробел во фразе совпадает с любой последовательностью пробелов и знаков препинания,
+        # поэтому текст не нужно нормализовать целиком
+        self._pattern = re.compile(rf'(?<!\w)(?:{self._trie_pattern(trie)})(?!\w)') if self.phrases else None
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict[str, dict]) -> str:
+        branches = [(r'\W+' if c == ' ' else re.escape(c)) + cls._trie_pattern(child)
+                    for c, child in node.items() if c]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Жадный необязательный хвост: при общем конце предпочитается более длинная фраза
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    def find(self, text: str, max_tail: Optional[int] = None) -> Optional[FarewellMatch]:
+        """
+        Фраза прощания, ближайшая к концу текста, и её расстояние от конца.
+
+        Если задан max_tail, совпадения дальше max_tail символов от конца не возвращаются.
+        """
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(text.lower()[::-1])
+        if match is None:
+            return None
+
+        # Расстояние считается в символах нормализованного текста: пробел после фразы и хвост
+        tail = normalize_text(match.string[:match.start()][::-1])
+        distance = len(tail) + 1 if tail else 0
+        if max_tail is not None and distance > max_tail:
+            return None
+        return FarewellMatch(self._phrase_by_reversed[normalize_text(match.group())], distance)
+
+
+class FarewellHangup:
+    """
+    Завершение вызова по фразе прощания в речи пользователя.
+
+    - окончательная расшифровка с фразой прощания в конце завершает вызов, без неё — отменяет
+      взведённое завершение;
+    - промежуточная расшифровка с фразой в самом конце только взводит завершение (она может
+      оказаться началом другой фразы: «пока» -> «пока что подождите»);
+    - если пользователь замолчал при взведённом завершении, вызов завершается через grace
+      секунд, если окончательная расшифровка или новая речь не отменят его раньше.
+    """
+
+    def __init__(self, detector: FarewellDetector, end_call: Callable[[], Awaitable[None]], grace: float):
+        self.detector = detector
+        self.end_call = end_call
+        self.grace = grace
+        # Фраза прощания в конце последней промежуточной расшифровки
+        self.armed = False
+        self._timer: Optional[asyncio.Task] = None
+
+    def matches(self, text: str, interim: bool = False) -> bool:
+        """Фраза прощания в конце текста; в промежуточной расшифровке — в самом конце, без хвоста"""
+        match = self.detector.find(text, max_tail=0 if interim else FAREWELL_MAX_TAIL)
+        if match is not None:
+            logger.info(f"Фраза прощания «{match.phrase}» в {match.distance} символах от конца")
+        return match is not None
+
+    def on_transcript(self, transcript: str, is_final: bool) -> Optional[asyncio.Task]:
+        """Обрабатывает расшифровку; возвращает задачу завершения вызова, если оно началось"""
+        if is_final:
+            if self.matches(transcript):
+                logger.info("Пользователь сказал фразу прощания, инициируем завершение вызова")
+                self.cancel()
+                return asyncio.create_task(self.end_call())
+            self.disarm()
+        elif self.matches(transcript, interim=True):
+            self.armed = True
+            # Уже запущенный таймер перезапускается с каждой новой расшифровкой
+            if self._timer is not None:
+                self._start_timer()
+        else:
+            self.disarm()
+        return None
+
+    def on_user_speaking(self):
+        """Пользователь снова заговорил: таймер отменяется, завершение остаётся взведённым"""
+        self._cancel_timer()
+
+    def on_user_speech_ended(self):
+        """Пользователь замолчал: при взведённом завершении запускается таймер"""
+        if self.armed:
+            self._start_timer()
+
+    def disarm(self):
+        """Фраза прощания больше не в конце расшифровки — пользователь продолжил говорить"""
+        if self.armed:
+            logger.info("Фраза прощания больше не в конце расшифровки, отменяем завершение вызова")
+        self.cancel()
+
+    def cancel(self):
+        self.armed = False
+        self._cancel_timer()
+
+    def _cancel_timer(self):
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+
+    def _start_timer(self):
+        self._cancel_timer()
+        self._timer = asyncio.create_task(self._end_call_after_grace())
+
+    async def _end_call_after_grace(self):
+        await asyncio.sleep(self.grace)
+        if self.armed:
+            logger.info("Пользователь закончил речь фразой прощания, завершаем вызов")
+            self._timer = None
+            await self.end_call()
@@ -0,0 +1,234 @@
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Set
+
+import httpx
+
+logger = logging.getLogger("elaina-inbound-worker")
+logger.setLevel(logging.INFO)
+
+
+class LLMWarmupManager:
+    """
+    Прогрев префикса системного промпта в слоте llama.cpp.
+
+    Слот общий для всех процессов воркера, исходящего агента и идущих разговоров, поэтому
+    его состояние каждый раз проверяется на сервере (GET /slots), а не запоминается в процессе:
+    - слот занят запросом — прогрев пропускается, чтобы не сбросить KV-кэш идущего разговора;
+    - слот уже содержит системный промпт — прогрев не нужен. Если сервер отдаёт текст промпта
+      слота, он сравнивается с промптом; иначе сравнивается состояние слота (id_task, n_past и
+      т. п.) с запомненным после прогрева этого промпта: совпадение значит, что с тех пор слот
+      не обработал ни одного запроса;
+    - слот свободен — состояние восстанавливается из файла, сохранённого после прошлого
+      прогрева этого промпта (POST /slots/{id}?action=restore, нужен --slot-save-path);
+    - иначе префикс вычисляется запросом с cache_prompt (если префикс уже в слоте, это почти
+      бесплатно) и сохраняется в файл (action=save).
+    Перед restore и prefill слот проверяется ещё раз, а если разговор уже начался
+    (session_started), прогрев пропускается: он перезаписал бы KV-кэш разговора.
+    Файлы слотов хранятся только для slot_save_keep последних использованных промптов; если
+    каталог --slot-save-path недоступен воркеру (slot_save_dir), save/restore не используются.
+    Если сервер не отдаёт состояние слотов, используется только запрос с cache_prompt.
+    """
+
+    SLOT_FILE_PREFIX = "elaina-"
+
+    def __init__(self, config: Dict[str, Any], http_client: Optional[httpx.AsyncClient] = None):
+        base_url = config["base_url"].rstrip("/")
+        # Эндпоинты слотов находятся в корне сервера, а не под /v1
+        self.server_url = base_url[:-3] if base_url.endswith("/v1") else base_url
+        self.chat_url = f"{self.server_url}/v1/chat/completions"
+        self.model = config["model"]
+        self.slot_id = config.get("slot_id", 0)
+        self.slot_save = config.get("slot_save", False)
+        self.slot_save_dir = config.get("slot_save_dir") or None
+        self.slot_save_keep = config.get("slot_save_keep", 16)
+        if self.slot_save and not (self.slot_save_dir and os.access(self.slot_save_dir, os.W_OK)):
+            # Файлы слотов сохраняются, только если воркер может удалять старые
+            logger.warning(f"Каталог файлов слотов {self.slot_save_dir} недоступен воркеру, "
+                           f"прогрев без save/restore")
+            self.slot_save = False
+        self._client = http_client or httpx.AsyncClient(
+            timeout=httpx.Timeout(config.get("warmup_timeout", 60.0), connect=5.0),
+        )
+        self._lock = asyncio.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # Ключ промпта -> состояние слота сразу после его прогрева
+        self._warmed_state: Dict[str, str] = {}
+        self.stats = {"skipped": 0, "busy": 0, "late": 0, "restored": 0, "prefilled": 0, "saved": 0,
+                      "pruned": 0, "failed": 0}
+
+    @staticmethod
+    def prompt_key(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+    def _slot_filename(self, key: str) -> str:
+        return f"{self.SLOT_FILE_PREFIX}{key}.bin"
+
+    @staticmethod
+    def _slot_state(slot: Dict[str, Any]) -> Optional[str]:
+        """Состояние слота, меняющееся с каждым обработанным запросом; None, если сервер его не отдаёт"""
+        if not any(field in slot for field in ("id_task", "n_past", "next_token")):
+            return None
+        return json.dumps({k: v for k, v in slot.items() if k != "is_processing"}, sort_keys=True, default=str)
+
+    def _is_resident(self, slot: Dict[str, Any], prompt: str, key: str) -> bool:
+        if "prompt" in slot:
+            return prompt in str(slot["prompt"])
+        state = self._slot_state(slot)
+        return state is not None and self._warmed_state.get(key) == state
+
+    def schedule(self, prompt: str, session_started: Optional[asyncio.Event] = None) -> asyncio.Task:
+        """Запускает прогрев в фоне (повторный вызов для того же промпта возвращает ту же задачу)
+
+        session_started устанавливается, когда разговор начался: после этого прогрев слот не трогает.
+        """
+        key = self.prompt_key(prompt)
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(self.warmup(prompt, session_started))
+            self._inflight[key] = task
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def warmup(self, prompt: str, session_started: Optional[asyncio.Event] = None) -> str:
+        """Прогревает префикс; возвращает 'resident', 'busy', 'late', 'restored', 'prefilled' или 'failed'"""
+        key = self.prompt_key(prompt)
+        async with self._lock:
+            start = time.perf_counter()
+            try:
+                slot = await self._get_slot()
+                if slot is not None and slot.get("is_processing"):
+                    return self._skip_busy(key)
+                if slot is not None and self._is_resident(slot, prompt, key):
+                    self.stats["skipped"] += 1
+                    logger.info(f"Префикс промпта {key} уже в слоте {self.slot_id}, прогрев пропущен")
+                    return "resident"
+
+                # Восстанавливаем только в свободный слот, состояние которого известно
+                if slot is not None and self.slot_save:
+                    # Между проверкой и restore слот мог занять запрос разговора
+                    if session_started is not None and session_started.is_set():
+                        return self._skip_late(key)
+                    slot = await self._get_slot()
+                    if slot is None or slot.get("is_processing"):
+                        return self._skip_busy(key)
+                    if await self._slot_action("restore", key):
+                        self.stats["restored"] += 1
+                        await self._remember_state(key)
+                        await asyncio.to_thread(self._touch_slot_file, key)
+                        logger.info(f"✅ Префикс промпта {key} восстановлен в слот {self.slot_id} "
+                                    f"за {time.perf_counter() - start:.2f}с")
+                        return "restored"
+
+                if session_started is not None and session_started.is_set():
+                    return self._skip_late(key)
+                prompt_tokens = await self._prefill(prompt)
+                self.stats["prefilled"] += 1
+                logger.info(f"✅ Префикс промпта {key} вычислен в слоте {self.slot_id} "
+                            f"за {time.perf_counter() - start:.2f}с ({prompt_tokens} токенов)")
+
+                if self.slot_save and await self._slot_action("save", key):
+                    self.stats["saved"] += 1
+                    self.stats["pruned"] += await asyncio.to_thread(self._prune_slot_files)
+                await self._remember_state(key)
+                return "prefilled"
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.warning(f"Prompt warmup failed: {e}")
+                return "failed"
+
+    def _skip_busy(self, key: str) -> str:
+        self.stats["busy"] += 1
+        logger.info(f"Слот {self.slot_id} занят запросом, прогрев префикса {key} пропущен")
+        return "busy"
+
+    def _skip_late(self, key: str) -> str:
+        self.stats["late"] += 1
+        logger.info(f"Разговор уже начался, прогрев префикса {key} пропущен")
+        return "late"
+
+    async def _get_slot(self) -> Optional[Dict[str, Any]]:
+        """Состояние слота из GET /slots; None, если сервер его не отдаёт (--no-slots)"""
+        response = await self._client.get(f"{self.server_url}/slots")
+        if response.status_code != 200:
+            return None
+        for slot in response.json():
+            if slot.get("id") == self.slot_id:
+                return slot
+        return None
+
+    async def _remember_state(self, key: str):
+        slot = await self._get_slot()
+        state = self._slot_state(slot) if slot is not None else None
+        if state is not None:
+            self._warmed_state[key] = state
+
+    async def _prefill(self, prompt: str) -> Optional[int]:
+        """Вычисляет KV-кэш системного промпта в слоте (генерируется один токен)"""
+        response = await self._client.post(self.chat_url, json={
+            "model": self.model,
+            "messages": [{"role": "system", "content": prompt}],
+            "max_tokens": 1,
+            "temperature": 0.0,
+            "stream": False,
+            "cache_prompt": True,
+            "id_slot": self.slot_id,
+        })
+        response.raise_for_status()
+        return response.json().get("timings", {}).get("prompt_n")
+
+    async def _slot_action(self, action: str, key: str) -> bool:
+        """Сохранение/восстановление состояния слота; False, если действие не выполнено"""
+        response = await self._client.post(
+            f"{self.server_url}/slots/{self.slot_id}",
+            params={"action": action},
+            json={"filename": self._slot_filename(key)},
+        )
+        if response.status_code == 501:
+            # llama-server запущен без --slot-save-path
+            logger.warning("llama.cpp не поддерживает сохранение слотов, прогрев без save/restore")
+            self.slot_save = False
+            return False
+        if response.status_code != 200:
+            if action != "restore":
+                logger.warning(f"Не удалось выполнить {action} слота {self.slot_id}: {response.text}")
+            return False
+        return True
+
+    def _touch_slot_file(self, key: str):
+        """Восстановленный файл становится последним использованным (см. _prune_slot_files)"""
+        try:
+            os.utime(os.path.join(self.slot_save_dir, self._slot_filename(key)))
+        except OSError:
+            pass
+
+    def _prune_slot_files(self) -> int:
+        """Удаляет файлы слотов сверх slot_save_keep последних использованных; возвращает число удалённых"""
+        paths = glob.glob(os.path.join(self.slot_save_dir, f"{self.SLOT_FILE_PREFIX}*.bin"))
+        if len(paths) <= self.slot_save_keep:
+            return 0
+        entries = []
+        for path in paths:
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        entries.sort(reverse=True)
+        removed = 0
+        for _, path in entries[self.slot_save_keep:]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
@@ -1,24 +1,31 @@
 import asyncio
+import fcntl
 import logging
 import os
 import sys
-from typing import Any, Dict
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncClient
 
 # Добавляем путь к elaina_tts
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'elaina_tts'))
 
 from livekit import rtc
 from livekit.agents import metrics, MetricsCollectedEvent
-from livekit.agents.llm import ChatMessage
 from livekit.plugins import openai, silero
-from elaina_tts.elaina_tts import ElainaTTS
+from elaina_tts.elaina_tts import ElainaTTS, PhraseCache, elaina_model_hash, load_elaina_model
+
+from .llm_warmup import LLMWarmupManager
 
 logger = logging.getLogger("elaina-inbound-worker")
 logger.setLevel(logging.INFO)
 
 
-def setup_vad(config: Dict[str, Any]):
-    """Настройка Voice Activity Detection"""
+def load_vad(config: Dict[str, Any]):
+    """Загрузка Silero VAD (ONNX-сессия; один раз на процесс воркера, из prewarm)"""
     return silero.VAD.load(
         min_speech_duration=config["min_speech_duration"],
         min_silence_duration=config["min_silence_duration"],
@@ -26,8 +33,45 @@ def setup_vad(config: Dict[str, Any]):
     )
 
 
-def setup_stt(config: Dict[str, Any]):
-    """Настройка Speech-to-Text"""
+def setup_vad(config: Dict[str, Any], vad=None):
+    """Настройка Voice Activity Detection
+
+    vad — общий для процесса объект из JobProcess.userdata; без него модель загружается заново
+    """
+    return vad if vad is not None else load_vad(config)
+
+
+def create_http_client(config: Dict[str, Any], timeout: float = 30.0) -> AsyncClient:
+    """OpenAI-совместимый клиент с пулом keep-alive соединений (один раз на процесс воркера, из prewarm)
+
+    Соединения с локальными whisper (11435) и llama.cpp (11434) переиспользуются между звонками,
+    поэтому первый запрос звонка не тратит время на установку соединения
+    """
+    return AsyncClient(
+        base_url=config["base_url"],
+        api_key=config.get("api_key") or "no-key-needed",
+        # Повторы выполняет сам плагин livekit
+        max_retries=0,
+        http_client=httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=300.0),
+        ),
+    )
+
+
+def create_http_clients(stt_config: Dict[str, Any], llm_config: Dict[str, Any]) -> Dict[str, AsyncClient]:
+    """Пулы HTTP-клиентов для STT и LLM"""
+    return {
+        "stt": create_http_client(stt_config),
+        "llm": create_http_client(llm_config, timeout=llm_config.get("timeout", 30.0)),
+    }
+
+
+def setup_stt(config: Dict[str, Any], client: Optional[AsyncClient] = None):
+    """Настройка Speech-to-Text
+
+    client — общий для процесса клиент из create_http_clients; без него плагин создаёт свой
+    """
     # Получаем URL и проверяем, является ли он локальным
     base_url = config.get("base_url", "")
     logger.info(f"Setting up STT with config: base_url={base_url}, model={config.get('model')}")
@@ -41,6 +85,7 @@ def setup_stt(config: Dict[str, Any]):
             model=config.get("model", "Systran/faster-whisper-small"),  # Используем значение из конфига, а не getenv напрямую
             api_key=config.get("api_key", "no-key-needed"),  # Используем стандартный ключ для локальных сервисов
             language=config.get("language", "ru"),
+            client=client,
         )
     else:
         logger.info(f"Using external STT service: {base_url}")
@@ -50,20 +95,106 @@ def setup_stt(config: Dict[str, Any]):
             model=config["model"],
             api_key=config["api_key"],
             language=config["language"],
+            client=client,
         )
 
 
-def setup_tts(config: Dict[str, Any]):
-    """Настройка Text-to-Speech"""
+def load_tts_model():
+    """Загрузка модели TTS (один раз на процесс воркера, из prewarm)"""
+    return load_elaina_model()
+
+
+def setup_tts_phrase_cache(config: Dict[str, Any]):
+    """Создание кэша синтезированных фраз (один раз на процесс воркера, из prewarm)"""
+    if not config.get("cache_enabled", False):
+        return None
+    return PhraseCache(
+        model_hash=elaina_model_hash(),
+        cache_dir=config.get("cache_dir") or None,
+        max_memory_bytes=config.get("cache_memory_mb", 64) * 1024 * 1024,
+        max_disk_bytes=config.get("cache_disk_mb", 512) * 1024 * 1024,
+    )
+
+
+def start_tts_warmup(config: Dict[str, Any], tts) -> Optional[threading.Event]:
+    """Фоновый прогрев кэша фраз TTS, не задерживающий готовность процесса воркера
+
+    Каталог кэша на диске общий для процессов воркера, поэтому прогревает его только процесс,
+    захвативший файловую блокировку; остальные получат готовые фразы с диска.
+    Прогрев уступает модель синтезу звонков; возвращаемое событие останавливает его
+    (устанавливается, когда процесс принимает звонок).
+    """
+    cache_dir = config.get("cache_dir")
+    lock_file = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        lock_file = open(os.path.join(cache_dir, ".warmup.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            logger.info("Прогрев кэша фраз TTS уже выполняет другой процесс воркера")
+            return None
+
+    stop_event = threading.Event()
+
+    def _warm_up():
+        start = time.perf_counter()
+        try:
+            rendered = tts.warm_up(get_tts_warmup_phrases(config), time_budget=config.get("cache_warmup_budget"),
+                                   stop_event=stop_event)
+            logger.info(f"Прогрев кэша фраз TTS: синтезировано {rendered} новых фраз "
+                        f"за {time.perf_counter() - start:.2f}с")
+        except Exception as e:
+            logger.warning(f"Прогрев кэша фраз TTS не удался: {e}")
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    thread = threading.Thread(target=_warm_up, name="tts-warmup", daemon=True)
+    thread.start()
+    return stop_event
+
+
+def get_tts_warmup_phrases(config: Dict[str, Any]) -> list[str]:
+    """Фразы для предварительного синтеза: приветствия известных клиентов и фразы из файла"""
+    from .prompt_processor import format_greeting
+    from .sip_data_handler import get_known_client_names
+
+    phrases = [format_greeting(name) for name in get_known_client_names(config.get("cache_warmup_names"))]
+
+    warmup_file = config.get("cache_warmup_file")
+    if warmup_file:
+        try:
+            with open(warmup_file, 'r', encoding='utf-8') as f:
+                phrases.extend(line.strip() for line in f if line.strip())
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать файл фраз для прогрева TTS {warmup_file}: {e}")
+
+    return phrases
+
+
+def setup_tts(config: Dict[str, Any], model=None, phrase_cache=None):
+    """Настройка Text-to-Speech
+
+    model и phrase_cache — общие для процесса объекты из JobProcess.userdata; ElainaTTS
+    становится лёгкой обёрткой над ними без повторной загрузки elaina.pt
+    """
     return ElainaTTS(
         speaker=config["speaker"],
         sample_rate=config["sample_rate"],
-        num_channels=config["num_channels"]
+        num_channels=config["num_channels"],
+        streaming=config.get("streaming", True),
+        model=model,
+        phrase_cache=phrase_cache,
     )
 
 
-def setup_llm(config: Dict[str, Any]):
-    """Настройка Large Language Model"""
+def setup_llm(config: Dict[str, Any], client: Optional[AsyncClient] = None):
+    """Настройка Large Language Model
+
+    client — общий для процесса клиент из create_http_clients; без него плагин создаёт свой
+    """
     from livekit.plugins.openai import LLM
     
     # Проверяем, является ли URL локальным, и используем соответствующие настройки
@@ -79,6 +210,7 @@ def setup_llm(config: Dict[str, Any]):
             api_key=config.get("api_key", "no-key-needed"),
             timeout=config.get("timeout", 30.0),  # Используем увеличенный таймаут для локальной модели
             max_retries=config["max_retries"],
+            client=client,
         )
     else:
         logger.info(f"Using external LLM service: {base_url}")
@@ -89,6 +221,7 @@ def setup_llm(config: Dict[str, Any]):
             api_key=config["api_key"],
             timeout=config["timeout"],
             max_retries=config["max_retries"],
+            client=client,
         )
 
 
@@ -124,25 +257,12 @@ def setup_metrics_handler(session):
             logger.info(f"[LLM] Общая генерация: {ev.metrics.duration:.2f}с")
         elif metric_type == "TTSMetrics":
             logger.info(f"[TTS] Время до начала звука (TTFB): {ev.metrics.ttfb:.2f}с")
+            tts_cache_stats = session.tts.cache_stats() if hasattr(session.tts, "cache_stats") else {}
+            if tts_cache_stats:
+                logger.info(f"[TTS] Кэш фраз: попаданий {tts_cache_stats['memory_hits'] + tts_cache_stats['disk_hits']}, "
+                            f"промахов {tts_cache_stats['misses']} (hit rate {tts_cache_stats['hit_rate']:.0%})")
 
 
-async def warmup_llm(llm, phone_number: str, client_name: str):
-    """Прогрев модели LLM"""
-    try:
-        from .prompt_processor import load_and_process_prompt
-        warmup_prompt = load_and_process_prompt(phone_number, client_name)
-        logger.info("🔥 Начинаю реальный прогрев LLM...")
-        # Запускаем чат
-        chat_stream = llm.chat(
-            history=[ChatMessage(role="system", content=[{"type": "text", "text": warmup_prompt}]),
-                     ChatMessage(role="user", content=[{"type": "text", "text": "Привет"}])], # Добавляем имитацию юзера
-            temperature=0.7
-        )
-        # ВАЖНО: нужно прочитать хотя бы один фрагмент из потока, 
-        # чтобы llama_cpp начала вычисления
-        async for chunk in chat_stream:
-            # Нам не нужен текст, нам нужен сам факт обработки
-            break 
-        logger.info("✅ Prompt warmup completed (кэш создан)")
-    except Exception as e:
-        logger.warning(f"Prompt warmup failed: {e}")
\ No newline at end of file
+def setup_llm_warmup(config: Dict[str, Any]) -> LLMWarmupManager:
+    """Менеджер прогрева префикса промпта в llama.cpp (один раз на процесс воркера, из prewarm)"""
+    return LLMWarmupManager(config)
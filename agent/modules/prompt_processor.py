@@ -1,50 +1,143 @@
 import os
+import time
 import logging
+from string import Formatter
+from typing import Dict, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Фраза приветствия входящего звонка (озвучивается сразу после подключения участника)
+GREETING_TEMPLATE = '<prosody rate="175%"> Здравствуйте {client_name}, медицинский центр СМИТРА. </prosody> <prosody rate="175%"> Меня зовут Елена, слушаю вас? </prosody>'
+
+
+def format_greeting(client_name: str) -> str:
+    """Формирует фразу приветствия для клиента"""
+    return GREETING_TEMPLATE.format(client_name=client_name)
+
+
+# Файлы шаблонов промптов: имя -> (файл в каталоге агента, заголовок, после которого начинается промпт)
+PROMPT_FILES = {
+    'inbound': ('elaina-inbound-mango.md', '## Системный промпт для агента Елена'),
+}
+PROMPT_DIR = os.path.dirname(os.path.dirname(__file__))
+
+
+class PromptTemplate:
+    """Шаблон промпта, разобранный один раз: литеральные куски и имена подстановок"""
+
+    def __init__(self, text: str):
+        self.text = text
+        parts = list(Formatter().parse(text))
+        self.fields = frozenset(field for _, field, _, _ in parts if field)
+        # Простые подстановки {name} собираются join-ом без повторного разбора строки;
+        # спецификаторы формата, индексы и атрибуты обрабатывает str.format
+        self._simple = all(
+            field is None or (field.isidentifier() and not spec and not conversion)
+            for _, field, spec, conversion in parts
+        )
+        self._parts = [(literal, field) for literal, field, _, _ in parts]
+        self._static = ''.join(literal for literal, _ in self._parts) if not self.fields else None
+
+    def render(self, **values) -> str:
+        """Подставляет значения; отсутствующее значение — KeyError, как у str.format"""
+        if self._static is not None:
+            return self._static
+        if not self._simple:
+            return self.text.format(**values)
+        return ''.join(
+            literal if field is None else literal + str(values[field])
+            for literal, field in self._parts
+        )
+
+
+class PromptTemplateRegistry:
+    """
+    Реестр шаблонов промптов: каждый файл читается и разбирается один раз и перечитывается
+    только при изменении mtime (проверяется не чаще раза в check_interval секунд), так что
+    создание промпта на звонок — поиск в словаре и подстановка.
+    """
+
+    def __init__(self, prompt_files: Dict[str, Tuple[str, str]] = PROMPT_FILES, base_dir: str = PROMPT_DIR,
+                 check_interval: float = 2.0):
+        self.prompt_files = dict(prompt_files)
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        # имя -> (шаблон, mtime файла, время последней проверки mtime)
+        self._templates: Dict[str, Tuple[PromptTemplate, float, float]] = {}
+        self._stats = {'loads': 0, 'reloads': 0, 'hits': 0}
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.base_dir, self.prompt_files[name][0])
+
+    def _load(self, name: str, mtime: float) -> PromptTemplate:
+        prompt_file_path = self._path(name)
+        header = self.prompt_files[name][1]
+        logger.info(f"Загрузка шаблона промпта '{name}' из: {prompt_file_path}")
+
+        try:
+            with open(prompt_file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            logger.error(f"Файл шаблона промпта не найден: {prompt_file_path}")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при чтении шаблона промпта: {e}")
+            raise
+
+        # Извлекаем только содержимое после заголовка; если заголовок не найден — весь контент
+        lines = content.split('\n')
+        for i, line in enumerate(lines):
+            if header and line.startswith(header):
+                content = '\n'.join(lines[i + 1:])
+                break
+
+        template = PromptTemplate(content.strip())
+        self._templates[name] = (template, mtime, time.monotonic())
+        return template
+
+    def get(self, name: str = 'inbound') -> PromptTemplate:
+        """Шаблон по имени; файл перечитывается, если изменился с момента загрузки"""
+        entry = self._templates.get(name)
+        if entry is None:
+            self._stats['loads'] += 1
+            return self._load(name, os.stat(self._path(name)).st_mtime)
+
+        template, mtime, checked_at = entry
+        now = time.monotonic()
+        if now - checked_at >= self.check_interval:
+            current_mtime = os.stat(self._path(name)).st_mtime
+            if current_mtime != mtime:
+                self._stats['reloads'] += 1
+                logger.info(f"Шаблон промпта '{name}' изменился на диске, перечитываю")
+                return self._load(name, current_mtime)
+            self._templates[name] = (template, mtime, now)
+
+        self._stats['hits'] += 1
+        return template
+
+    def render(self, name: str = 'inbound', **values) -> str:
+        return self.get(name).render(**values)
+
+    def preload(self):
+        """Загружает все зарегистрированные шаблоны (вызывается из prewarm воркера)"""
+        for name in self.prompt_files:
+            self.get(name)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self._stats, templates=len(self._templates))
+
+
+prompt_registry = PromptTemplateRegistry()
+
 
 def load_prompt_template():
-    """Загружает шаблон промпта из markdown файла"""
-    
-    # Определяем путь к файлу с промптом
-    prompt_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'elaina-inbound-mango.md')
-    logger.info(f"Попытка загрузки шаблона промпта из: {prompt_file_path}")
-    
-    # Читаем содержимое файла
-    try:
-        with open(prompt_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            logger.info(f"Шаблон промпта успешно загружен из: {prompt_file_path}")
-    except FileNotFoundError:
-        logger.error(f"Файл шаблона промпта не найден: {prompt_file_path}")
-        raise
-    except Exception as e:
-        logger.error(f"Ошибка при чтении шаблона промпта: {e}")
-        raise
-        
-    # Извлекаем только содержимое после заголовка первого уровня
-    lines = content.split('\n')
-    start_idx = -1
-    for i, line in enumerate(lines):
-        if line.startswith('## Системный промпт для агента Елена'):
-            start_idx = i + 1
-            break
-    
-    if start_idx != -1:
-        # Возвращаем всё содержимое после заголовка
-        return '\n'.join(lines[start_idx:]).strip()
-    else:
-        # Если заголовок не найден, возвращаем весь контент
-        return content.strip()
+    """Возвращает текст шаблона промпта (из реестра, без повторного чтения файла)"""
+    return prompt_registry.get('inbound').text
 
 
 def load_and_process_prompt(phone_number: str, client_name: str):
-    """Загружает и обрабатывает шаблон промпта с подстановкой переменных"""
-    prompt_template = load_prompt_template()
-    # Подставляем переменные в промпт
-    processed_prompt = prompt_template.format(phone_number=phone_number, client_name=client_name)
-    return processed_prompt
+    """Возвращает шаблон промпта с подстановкой переменных"""
+    return prompt_registry.render('inbound', phone_number=phone_number, client_name=client_name)
 
 
 def validate_prompt_content(content: str) -> bool:
@@ -58,9 +151,9 @@ def validate_prompt_content(content: str) -> bool:
 
 def get_system_prompt_with_context(phone_number: str, client_name: str) -> str:
     """Получает системный промпт с контекстом клиента"""
-    template = load_prompt_template()
-    if validate_prompt_content(template):
-        return template.format(phone_number=phone_number, client_name=client_name)
+    template = prompt_registry.get('inbound')
+    if {'phone_number', 'client_name'} <= template.fields:
+        return template.render(phone_number=phone_number, client_name=client_name)
     else:
         # Если шаблон некорректен, возвращаем базовый вариант
         return f"""Номер телефона клиента: {phone_number}.
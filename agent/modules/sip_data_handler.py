@@ -1,8 +1,11 @@
+import asyncio
 import json
 import logging
 import re
 from typing import Dict, Optional
 
+from .client_directory import get_client_directory
+
 logger = logging.getLogger("elaina-inbound-worker")
 logger.setLevel(logging.INFO)
 
@@ -41,18 +44,28 @@ def extract_phone_number_from_participant_identity(identity: str) -> Optional[st
 
 
 def identify_client_by_phone(phone_number: str) -> str:
-    """Определяет имя клиента по номеру телефона"""
-    phone_to_name = {
-        "79133888778": "Денис Сергеевич",
-        "79955701443": "Денис",
-        "79137296699": "Павел",
-        "79831379240": "Артем"
-    }
-    return phone_to_name.get(phone_number, "Иван")
+    """Определяет имя клиента по номеру телефона (блокирующий поиск, для синхронного кода)"""
+    return get_client_directory().lookup_sync(phone_number)
 
 
-def process_sip_call_data(metadata: str, room_name: str, participant_identity: str) -> tuple[str, str]:
-    """Обрабатывает все данные SIP-вызова и возвращает номер телефона и имя клиента"""
+async def lookup_client_name(phone_number: str, timeout: Optional[float] = None) -> str:
+    """Асинхронно определяет имя клиента; если поиск не уложился в timeout — имя по умолчанию"""
+    directory = get_client_directory()
+    try:
+        return await asyncio.wait_for(directory.lookup(phone_number), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Поиск клиента по номеру {phone_number} не уложился в {timeout}с")
+        return directory.default_name
+
+
+def get_known_client_names(limit: Optional[int] = None) -> list[str]:
+    """Возвращает имена известных клиентов (самые частые первыми, включая имя по умолчанию)"""
+    directory = get_client_directory()
+    return list(dict.fromkeys([*directory.known_names(limit), directory.default_name]))
+
+
+def determine_phone_number(metadata: str, room_name: str, participant_identity: str) -> str:
+    """Определяет номер телефона звонящего по метаданным, названию комнаты и идентификатору участника"""
     # Парсим метаданные
     sip_data = parse_sip_metadata(metadata)
     
@@ -72,6 +85,12 @@ def process_sip_call_data(metadata: str, room_name: str, participant_identity: s
             phone_number = identity_phone
     
     logger.info(f"Phone number determined: {phone_number}")
+    return phone_number
+
+
+def process_sip_call_data(metadata: str, room_name: str, participant_identity: str) -> tuple[str, str]:
+    """Обрабатывает все данные SIP-вызова и возвращает номер телефона и имя клиента"""
+    phone_number = determine_phone_number(metadata, room_name, participant_identity)
     
     # Определяем имя клиента по номеру телефона
     client_name = identify_client_by_phone(phone_number)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули агента импортируются как в точках входа: from modules.xxx import ...
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
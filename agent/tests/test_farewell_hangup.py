@@ -0,0 +1,67 @@
+import asyncio
+
+from modules.farewell_detector import DEFAULT_FAREWELL_PHRASES, FarewellDetector, FarewellHangup
+
+GRACE = 0.05
+
+
+def _run(scenario):
+    """Выполняет сценарий с FarewellHangup; возвращает число завершений вызова"""
+    ended = []
+
+    async def end_call():
+        ended.append(True)
+
+    async def main():
+        hangup = FarewellHangup(FarewellDetector(DEFAULT_FAREWELL_PHRASES), end_call, grace=GRACE)
+        await scenario(hangup)
+        await asyncio.sleep(GRACE * 3)
+
+    asyncio.run(main())
+    return len(ended)
+
+
+def test_final_farewell_ends_call():
+    async def scenario(hangup):
+        hangup.on_transcript("Спасибо, до свидания!", is_final=True)
+
+    assert _run(scenario) == 1
+
+
+def test_interim_farewell_then_other_final_keeps_call():
+    async def scenario(hangup):
+        hangup.on_user_speaking()
+        hangup.on_transcript("пока", is_final=False)
+        assert hangup.armed
+        hangup.on_user_speech_ended()
+        hangup.on_transcript("Пока что подождите", is_final=True)
+        assert not hangup.armed
+
+    assert _run(scenario) == 0
+
+
+def test_interim_farewell_without_final_ends_call_after_speech():
+    async def scenario(hangup):
+        hangup.on_transcript("ну всё, пока", is_final=False)
+        hangup.on_user_speech_ended()
+
+    assert _run(scenario) == 1
+
+
+def test_interim_farewell_waits_for_end_of_speech():
+    async def scenario(hangup):
+        hangup.on_transcript("пока", is_final=False)
+        await asyncio.sleep(GRACE * 2)
+        hangup.on_transcript("пока что", is_final=False)
+
+    assert _run(scenario) == 0
+
+
+def test_speech_resumed_cancels_timer():
+    async def scenario(hangup):
+        hangup.on_transcript("до свидания", is_final=False)
+        hangup.on_user_speech_ended()
+        hangup.on_user_speaking()
+        hangup.on_transcript("до свидания не говорите", is_final=False)
+
+    assert _run(scenario) == 0
@@ -1,10 +1,336 @@
 import os
+import re
 import asyncio
+import hashlib
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
 import torch
 import numpy as np
 from livekit.agents import tts
 from livekit import rtc
 
+# Конец предложения: знаки препинания (и закрывающие кавычки/скобки/теги вроде </prosody>) перед пробелом
+_SENTENCE_END_RE = re.compile(r'[.!?…]+["»)]*(?:\s*</[^>]+>)*\s+(?!</)')
+# Граница придаточного/перечисления, по которой можно резать длинное предложение
+_CLAUSE_END_RE = re.compile(r'[,;:—]\s+')
+
+
+class _TextSegmenter:
+    """Накапливает токены LLM и отдает готовые к синтезу фрагменты по границам предложений/фраз"""
+
+    def __init__(self, min_chars: int = 20, max_chars: int = 150):
+        self._min_chars = min_chars
+        self._max_chars = max_chars
+        self._buffer = ""
+
+    def push(self, text: str) -> list[str]:
+        """Добавляет текст и возвращает все завершенные фрагменты"""
+        self._buffer += text
+        segments = []
+        while (cut := self._find_cut()) is not None:
+            segment, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:]
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def flush(self) -> list[str]:
+        """Отдает остаток буфера (конец ответа или явный flush)"""
+        segment, self._buffer = self._buffer.strip(), ""
+        return [segment] if segment else []
+
+    def _find_cut(self):
+        # Предпочитаем конец предложения, но не режем слишком короткие фразы ("Да.", "Хорошо.")
+        for match in _SENTENCE_END_RE.finditer(self._buffer):
+            if len(self._buffer[:match.end()].strip()) >= self._min_chars:
+                return match.end()
+
+        # Длинное предложение без точки режем по последней запятой/двоеточию, иначе по пробелу
+        if len(self._buffer) >= self._max_chars:
+            cuts = [m.end() for m in _CLAUSE_END_RE.finditer(self._buffer) if m.end() >= self._min_chars]
+            if cuts:
+                return cuts[-1]
+            last_space = self._buffer.rfind(" ")
+            if last_space >= self._min_chars:
+                return last_space + 1
+        return None
+
+# Загруженные модели процесса (путь к файлу -> модель), чтобы не импортировать elaina.pt на каждый звонок
+_loaded_models = {}
+# Хэши содержимого файлов моделей (путь к файлу -> sha256), входят в ключ кэша фраз
+_model_hashes = {}
+
+
+class _ModelGuard:
+    """Доступ к общей модели процесса: синтез звонков и фоновый прогрев не идут одновременно
+
+    Модель не потокобезопасна, а параллельный синтез делит между задачами один бюджет потоков
+    torch (set_num_threads). Синтез звонков (live) имеет приоритет: прогрев перед каждой фразой
+    ждёт, пока синтезов звонков в работе нет.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._live = 0
+        self.idle = threading.Event()
+        self.idle.set()
+
+    @contextmanager
+    def live(self):
+        with self._count_lock:
+            self._live += 1
+            self.idle.clear()
+        try:
+            with self.lock:
+                yield
+        finally:
+            with self._count_lock:
+                self._live -= 1
+                if self._live == 0:
+                    self.idle.set()
+
+
+# Общая модель -> её _ModelGuard
+_model_guards = weakref.WeakKeyDictionary()
+_model_guards_lock = threading.Lock()
+
+
+def _model_guard(model) -> _ModelGuard:
+    with _model_guards_lock:
+        guard = _model_guards.get(model)
+        if guard is None:
+            guard = _model_guards[model] = _ModelGuard()
+        return guard
+
+
+def _default_model_path() -> str:
+    # Определяем путь к модели в той же папке, где этот скрипт
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "elaina.pt")
+
+
+def load_elaina_model(model_path: str = None, set_num_threads: int = 2):
+    """Загружает модель elaina.pt один раз на процесс и возвращает общий экземпляр"""
+    if model_path is None:
+        model_path = _default_model_path()
+
+    model = _loaded_models.get(model_path)
+    if model is not None:
+        return model
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Файл модели не найден: {model_path}")
+
+    # Оптимизация потоков для снижения нагрузки на CPU
+    torch.set_num_threads(set_num_threads)
+    device = torch.device("cpu")
+    package = torch.package.PackageImporter(model_path)
+    model = package.load_pickle("tts_models", "model")
+    model.to(device)
+
+    # Загрузка через JIT (решает проблему с импортами package)
+    #model = torch.jit.load(model_path, map_location=device)
+    #model.eval()
+
+    _loaded_models[model_path] = model
+    print(f"TTS: Модель загружена из {model_path}")
+    return model
+
+
+def elaina_model_hash(model_path: str = None) -> str:
+    """Возвращает sha256 файла модели (считается один раз на процесс)"""
+    if model_path is None:
+        model_path = _default_model_path()
+
+    model_hash = _model_hashes.get(model_path)
+    if model_hash is None:
+        digest = hashlib.sha256()
+        with open(model_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        model_hash = digest.hexdigest()
+        _model_hashes[model_path] = model_hash
+    return model_hash
+
+
+class PhraseCache:
+    """Кэш синтезированных фраз: LRU в памяти + сырые PCM-файлы на диске
+
+    Ключ — хэш от (текст, спикер, частота дискретизации, хэш модели), поэтому смена
+    голоса или файла модели автоматически дает новые ключи.
+
+    На диск сразу пишутся только фразы прогрева (put(..., persist=True)); остальные
+    фразы (ответы LLM) живут в памяти и сохраняются на диск, только если повторились.
+    Размер дискового кэша ограничен max_disk_bytes: при превышении удаляются файлы
+    с самым старым временем последнего использования (mtime).
+    """
+
+    def __init__(self, model_hash: str, cache_dir: str = None, max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self._model_hash = model_hash
+        self._cache_dir = cache_dir
+        self._max_memory_bytes = max_memory_bytes
+        self._max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Ключи фраз, которые есть только в памяти (на диск попадут при повторном использовании)
+        self._memory_only = set()
+        # Кэш общий для всех звонков процесса, синтез идет в потоках asyncio.to_thread
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+
+        if self._cache_dir:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    def make_key(self, text: str, speaker: str, sample_rate: int) -> str:
+        raw = f"{self._model_hash}\x00{speaker}\x00{sample_rate}\x00{text}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, key[:2], f"{key}.pcm")
+
+    def _disk_entries(self):
+        """(mtime, путь, размер) всех PCM-файлов дискового кэша"""
+        entries = []
+        for subdir in os.scandir(self._cache_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith(".pcm"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key: str, count: bool = True):
+        """Возвращает PCM по ключу или None (count=False — не учитывать в статистике)"""
+        with self._lock:
+            pcm_bytes = self._memory.get(key)
+            if pcm_bytes is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += count
+                # Фраза повторилась — теперь её стоит сохранить на диск
+                recurring = count and key in self._memory_only
+                self._memory_only.discard(key)
+        if pcm_bytes is not None:
+            if recurring:
+                self._write_disk(key, pcm_bytes)
+            return pcm_bytes
+
+        if self._cache_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as f:
+                    pcm_bytes = f.read()
+                # mtime — время последнего использования для вытеснения с диска
+                os.utime(path)
+            except FileNotFoundError:
+                pcm_bytes = None
+            if pcm_bytes is not None:
+                with self._lock:
+                    self.disk_hits += count
+                self._remember(key, pcm_bytes)
+                return pcm_bytes
+
+        with self._lock:
+            self.misses += count
+        return None
+
+    def put(self, key: str, pcm_bytes: bytes, persist: bool = False):
+        """Сохраняет PCM в памяти; на диске — сразу при persist=True, иначе при повторном использовании"""
+        self._remember(key, pcm_bytes)
+
+        if persist:
+            with self._lock:
+                self._memory_only.discard(key)
+            self._write_disk(key, pcm_bytes)
+        elif self._cache_dir:
+            with self._lock:
+                if key in self._memory:
+                    self._memory_only.add(key)
+
+    def _write_disk(self, key: str, pcm_bytes: bytes):
+        if not self._cache_dir or len(pcm_bytes) > self._max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем через временный файл, чтобы параллельные воркеры не прочитали недописанный PCM
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pcm_bytes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"TTS: Не удалось сохранить фразу в кэш на диске: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._disk_bytes += len(pcm_bytes)
+            over_limit = self._disk_bytes > self._max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Удаляет давно не использованные файлы, пока кэш не станет меньше 90% лимита"""
+        # Пересчитываем по диску: в тот же каталог могут писать другие процессы воркера
+        entries = sorted(self._disk_entries())
+        disk_bytes = sum(size for _, _, size in entries)
+        target = self._max_disk_bytes * 0.9
+        evicted = 0
+        for _, path, size in entries:
+            if disk_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            disk_bytes -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = disk_bytes
+            self.disk_evictions += evicted
+
+    def _remember(self, key: str, pcm_bytes: bytes):
+        if len(pcm_bytes) > self._max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = pcm_bytes
+            self._memory_bytes += len(pcm_bytes)
+            while self._memory_bytes > self._max_memory_bytes:
+                evicted_key, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self._memory_only.discard(evicted_key)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes if self._cache_dir else 0,
+                "disk_evictions": self.disk_evictions,
+            }
+
+
 class ElainaTTS(tts.TTS):
     def __init__(
         self,
@@ -12,50 +338,124 @@ class ElainaTTS(tts.TTS):
         sample_rate: int = 48000,
         num_channels: int = 1,
         set_num_threads: int = 2,
+        streaming: bool = True,
+        min_segment_chars: int = 20,
+        max_segment_chars: int = 150,
+        model=None,
+        phrase_cache: PhraseCache = None,
     ):
         super().__init__(
-            capabilities=tts.TTSCapabilities(streaming=False),
+            capabilities=tts.TTSCapabilities(streaming=streaming),
             sample_rate=sample_rate,
             num_channels=num_channels
         )
         self._speaker = speaker
         self._sample_rate = sample_rate
         self._num_channels = num_channels
-        
-        model_name = "elaina.pt"
-        # Определяем путь к модели в той же папке, где этот скрипт
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(current_dir, model_name)
-
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Файл модели не найден: {model_path}")
-
-        # Оптимизация потоков для снижения нагрузки на CPU
-        torch.set_num_threads(set_num_threads)
-        device = torch.device("cpu")
-        package = torch.package.PackageImporter(model_path)
-        self._model = package.load_pickle("tts_models", "model")
-        self._model.to(device)
-        
-        # Загрузка через JIT (решает проблему с импортами package)
-        #self.model = torch.jit.load(model_path, map_location=device)
-        #self.model.eval()
-
-        # Другой вариант
-        #self._model = importer.load_pickle("tts_models", "model")
-        #self._model.to(torch.device("cpu"))
-        #self._model.eval()
+        self._min_segment_chars = min_segment_chars
+        self._max_segment_chars = max_segment_chars
+        # Модель общая для всего процесса: загружается в prewarm или при первом вызове
+        self._model = model if model is not None else load_elaina_model(set_num_threads=set_num_threads)
+        self._model_guard = _model_guard(self._model)
+        # Кэш повторяющихся фраз (приветствия, прощания), тоже общий для процесса
+        self._phrase_cache = phrase_cache
 
     # Метод для смены спикера в процессе работы
     def update_options(self, speaker: str):
         self._speaker = speaker
 
+    def _render_pcm(self, text: str) -> bytes:
+        """Синтезирует текст в 16-битный PCM (блокирующий вызов, выполняется в отдельном потоке)"""
+        with self._model_guard.live():
+            return self._apply_tts(text)
+
+    def _apply_tts(self, text: str) -> bytes:
+        # Вызывается только под self._model_guard.lock
+        tensor = self._model.apply_tts(
+            text=text,
+            speaker=self._speaker,
+            sample_rate=self._sample_rate
+        )
+        audio_data = (tensor.numpy() * 32767).astype(np.int16)
+        return audio_data.tobytes()
+
+    def _synthesize_pcm(self, text: str) -> bytes:
+        """Возвращает PCM из кэша фраз, а при промахе синтезирует и кэширует"""
+        if self._phrase_cache is None:
+            return self._render_pcm(text)
+
+        key = self._phrase_cache.make_key(text, self._speaker, self._sample_rate)
+        pcm_bytes = self._phrase_cache.get(key)
+        if pcm_bytes is not None:
+            print(f"TTS: Фраза из кэша: '{text[:50]}...'")
+            return pcm_bytes
+
+        pcm_bytes = self._render_pcm(text)
+        self._phrase_cache.put(key, pcm_bytes)
+        return pcm_bytes
+
+    def warm_up(self, texts: list[str], time_budget: float = None, stop_event: threading.Event = None) -> int:
+        """Заранее синтезирует фразы в кэш на диске (блокирующий вызов)
+
+        В потоковом режиме текст озвучивается по фрагментам, поэтому кэшируются и
+        фрагменты, на которые его разрежет сегментатор. time_budget (секунды) ограничивает
+        время прогрева, stop_event останавливает его (например, когда начался звонок):
+        оставшиеся фразы будут синтезированы при первом использовании. Перед каждой фразой
+        прогрев ждёт, пока завершится синтез звонков, и занимает модель только на одну фразу.
+        Возвращает число синтезированных фраз.
+        """
+        if self._phrase_cache is None:
+            return 0
+
+        phrases = []
+        for text in texts:
+            phrases.append(text)
+            if self.capabilities.streaming:
+                segmenter = _TextSegmenter(self._min_segment_chars, self._max_segment_chars)
+                phrases.extend(segmenter.push(text) + segmenter.flush())
+
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        rendered = 0
+        guard = self._model_guard
+        for phrase in dict.fromkeys(phrases):
+            key = self._phrase_cache.make_key(phrase, self._speaker, self._sample_rate)
+            if self._phrase_cache.get(key, count=False) is not None:
+                continue
+
+            # Уступаем модель синтезу звонков
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    print("TTS: Прогрев кэша остановлен: начался звонок")
+                    return rendered
+                if deadline is not None and time.monotonic() > deadline:
+                    print(f"TTS: Прогрев кэша остановлен по лимиту времени {time_budget}с")
+                    return rendered
+                if guard.idle.wait(timeout=0.1):
+                    with guard.lock:
+                        if guard.idle.is_set():
+                            pcm_bytes = self._apply_tts(phrase)
+                            break
+
+            self._phrase_cache.put(key, pcm_bytes, persist=True)
+            rendered += 1
+        return rendered
+
+    def cache_stats(self) -> dict:
+        """Счетчики попаданий/промахов кэша фраз"""
+        return self._phrase_cache.get_stats() if self._phrase_cache is not None else {}
+
     def synthesize(self, text: str, *, conn_options=None, **kwargs) -> tts.ChunkedStream:
         from livekit.agents import APIConnectOptions
         if conn_options is None:
             conn_options = APIConnectOptions(max_retry=0)
         return ElainaStream(tts=self, input_text=text, conn_options=conn_options)
 
+    def stream(self, *, conn_options=None) -> tts.SynthesizeStream:
+        from livekit.agents import APIConnectOptions
+        if conn_options is None:
+            conn_options = APIConnectOptions(max_retry=0)
+        return ElainaSynthesizeStream(tts=self, conn_options=conn_options)
+
 class ElainaStream(tts.ChunkedStream):
     def __init__(self, *, tts: ElainaTTS, input_text: str, conn_options):
         # Инициализируем базовый класс
@@ -76,17 +476,8 @@ class ElainaStream(tts.ChunkedStream):
             stream=False,
         )
         
-        def _render():
-            tensor = self._tts._model.apply_tts(
-                text=self._input_text,
-                speaker=self._tts._speaker,
-                sample_rate=self._tts._sample_rate
-            )
-            audio_data = (tensor.numpy() * 32767).astype(np.int16)
-            return audio_data.tobytes()
-
         # Генерируем аудио в отдельном потоке
-        pcm_bytes = await asyncio.to_thread(_render)
+        pcm_bytes = await asyncio.to_thread(self._tts._synthesize_pcm, self._input_text)
         
         print(f"Синтезировано {len(pcm_bytes)} байт аудио")
 
@@ -94,3 +485,59 @@ class ElainaStream(tts.ChunkedStream):
         output_emitter.push(pcm_bytes)
         output_emitter.flush()  # Убедиться, что фрейм отправлен
         print("Отправлен аудиофрейм")
+
+
+class ElainaSynthesizeStream(tts.SynthesizeStream):
+    """Потоковый синтез: текст от LLM режется на предложения/фразы, каждая озвучивается сразу"""
+
+    def __init__(self, *, tts: ElainaTTS, conn_options):
+        super().__init__(tts=tts, conn_options=conn_options)
+        self._tts = tts
+
+    async def _run(self, output_emitter: "tts.AudioEmitter") -> None:
+        request_id = "req_" + str(id(self))[-8:]
+        output_emitter.initialize(
+            request_id=request_id,
+            sample_rate=self._tts._sample_rate,
+            num_channels=self._tts._num_channels,
+            mime_type="audio/pcm",
+            stream=True,
+        )
+        output_emitter.start_segment(segment_id=request_id)
+
+        segmenter = _TextSegmenter(self._tts._min_segment_chars, self._tts._max_segment_chars)
+        segments_ch: asyncio.Queue = asyncio.Queue()
+
+        async def _forward_input():
+            # Собираем токены LLM и передаем готовые фрагменты на синтез, не дожидаясь конца ответа
+            async for data in self._input_ch:
+                if isinstance(data, self._FlushSentinel):
+                    ready = segmenter.flush()
+                else:
+                    self._mark_started()  # Отсчет TTFB (TTSMetrics.ttfb) от первого полученного токена
+                    ready = segmenter.push(data)
+                for segment in ready:
+                    segments_ch.put_nowait(segment)
+            for segment in segmenter.flush():
+                segments_ch.put_nowait(segment)
+            segments_ch.put_nowait(None)
+
+        async def _synthesize():
+            # Пока модель озвучивает фрагмент в потоке, _forward_input продолжает принимать текст
+            while (segment := await segments_ch.get()) is not None:
+                print(f"TTS: Синтез фрагмента: '{segment[:50]}...'")
+                pcm_bytes = await asyncio.to_thread(self._tts._synthesize_pcm, segment)
+                output_emitter.push(pcm_bytes)
+                output_emitter.flush()
+
+        tasks = [
+            asyncio.create_task(_forward_input()),
+            asyncio.create_task(_synthesize()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        output_emitter.end_segment()
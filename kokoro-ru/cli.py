@@ -56,6 +56,13 @@ Examples:
         help='Batch size for training (default: 8)'
     )
 
+    parser.add_argument(
+        '--max-frames-per-batch',
+        type=int,
+        default=None,
+        help='Pack batches up to this many padded mel frames instead of a fixed batch size (default: off)'
+    )
+
     parser.add_argument(
         '--epochs', '-e',
         type=int,
@@ -77,6 +84,19 @@ Examples:
         help='Save checkpoint every N epochs (default: 2)'
     )
 
+    parser.add_argument(
+        '--no-manifest',
+        action='store_true',
+        help='Do not read or write the cached sample manifest; re-scan the whole corpus'
+    )
+
+    parser.add_argument(
+        '--features',
+        type=str,
+        default=None,
+        help='Directory with precomputed features from feature_store.py (default: compute on the fly)'
+    )
+
     return parser.parse_args()
 
 
@@ -86,6 +106,7 @@ def create_config_from_args(args) -> TrainingConfig:
         data_dir=args.corpus,
         output_dir=args.output,
         batch_size=args.batch_size,
+        max_frames_per_batch=args.max_frames_per_batch,
         learning_rate=args.learning_rate,
         num_epochs=args.epochs,
         sample_rate=22050,
@@ -99,5 +120,7 @@ def create_config_from_args(args) -> TrainingConfig:
         use_mixed_precision=True,
         num_workers=0,  # Important for MPS
         pin_memory=False,  # Important for MPS
-        resume_checkpoint=args.resume
+        resume_checkpoint=args.resume,
+        use_sample_manifest=not args.no_manifest,
+        feature_store_dir=args.features
     )
@@ -17,6 +17,8 @@ class TrainingConfig:
     output_dir: str = "output_models"
     num_epochs: int = 100
     batch_size: int = 16
+    # Token-budget batching: pack batches up to this many (padded) mel frames instead of batch_size samples
+    max_frames_per_batch: Optional[int] = None
     learning_rate: float = 1e-4
     device: str = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
 
@@ -53,6 +55,21 @@ class TrainingConfig:
     num_workers: int = 2
     pin_memory: bool = False
 
+    # Cache audio lengths and phoneme indices between runs (keyed by path, size and mtime)
+    use_sample_manifest: bool = True
+    sample_manifest_path: Optional[str] = None  # Defaults to <data_dir>/sample_manifest.json
+
+    # Worker processes for phonemizing new/changed transcripts when scanning the corpus
+    phonemize_workers: int = 4
+    # Optional .npz from `russian_phoneme_processor.py --batch` with precomputed phoneme indices
+    phoneme_indices_path: Optional[str] = None
+
+    # Stress dictionary for the phoneme processor: TSV, or a lexicon compiled with stress_lexicon.py
+    stress_dict_path: Optional[str] = None
+
+    # Read log-mels, phoneme indices and durations from memory-mapped shards (see feature_store.py)
+    feature_store_dir: Optional[str] = None
+
     # Checkpointing
     save_every: int = 2
     resume_checkpoint: str = 'auto'
@@ -3,10 +3,13 @@
 Dataset implementation for Ruslan corpus
 """
 
+import os
+import json
+import math
 import torch
 import torchaudio
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from torch.utils.data import Dataset, Sampler
 from torch.nn.utils.rnn import pad_sequence
 import logging
@@ -15,10 +18,14 @@ import numpy as np
 from tqdm import tqdm
 
 from config import TrainingConfig
-from russian_phoneme_processor import RussianPhonemeProcessor
+from feature_store import FeatureStore
+from russian_phoneme_processor import RussianPhonemeProcessor, load_indices_batch
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_FILENAME = "sample_manifest.json"
+MANIFEST_VERSION = 1
+
 
 class RuslanDataset(Dataset):
     """Dataset class for Ruslan corpus - optimized for MPS"""
@@ -26,7 +33,7 @@ class RuslanDataset(Dataset):
     def __init__(self, data_dir: str, config: TrainingConfig):
         self.data_dir = Path(data_dir)
         self.config = config
-        self.phoneme_processor = RussianPhonemeProcessor()
+        self.phoneme_processor = RussianPhonemeProcessor(stress_dict_path=self.config.stress_dict_path)
 
         # Validate MelSpectrogram parameters
         if self.config.win_length > self.config.n_fft:
@@ -57,8 +64,19 @@ class RuslanDataset(Dataset):
             # return_fast=False
         )
 
-        # Load metadata and pre-calculate lengths for batching
-        self.samples = self._load_samples()
+        # Resamplers are cached per source sample rate instead of rebuilt on every access
+        self._resamplers: Dict[int, torchaudio.transforms.Resample] = {}
+
+        # Load metadata and pre-calculate lengths for batching.
+        # With a feature store, lengths come from its index and no audio is touched.
+        self.feature_store = None
+        if self.config.feature_store_dir:
+            self.feature_store = FeatureStore(self.config.feature_store_dir)
+            self.feature_store.check_compatible(self.config, self.processor_fingerprint())
+            self.samples = self.feature_store.get_samples()
+            logger.info(f"Using precomputed features from {self.config.feature_store_dir}")
+        else:
+            self.samples = self._load_samples()
         logger.info(f"Loaded {len(self.samples)} samples from corpus at {data_dir}")
         logger.info(f"Using phoneme processor: {self.phoneme_processor}")
 
@@ -72,9 +90,97 @@ class RuslanDataset(Dataset):
     def _load_samples(self) -> List[Dict]:
         """
         Load samples from corpus directory and pre-calculate lengths.
+
+        Audio lengths are derived from file headers (no decoding) and, together
+        with the phoneme indices, persisted in a manifest keyed by path, size and
+        mtime, so that restarts only re-scan files that changed.
         """
+        manifest_path = self._get_manifest_path()
+        manifest = self._load_manifest(manifest_path) if manifest_path else {}
+        updated_manifest = {}
+        reused, scanned = 0, 0
+
+        precomputed = self._load_precomputed_indices()
+
+        corpus_entries = []
+        for audio_file_stem, text, audio_path in self._iter_corpus_entries():
+            try:
+                stat = audio_path.stat()
+            except OSError:
+                continue
+
+            key = str(audio_path)
+            entry = manifest.get(key)
+            if (entry is not None and entry.get('size') == stat.st_size
+                    and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('text') == text):
+                reused += 1
+            else:
+                # Pre-calculate audio length from the header only
+                try:
+                    info = torchaudio.info(str(audio_path))
+                except Exception as e:
+                    logger.warning(f"Could not read audio header {audio_path}: {e}. Skipping.")
+                    continue
+
+                entry = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'text': text,
+                    'num_frames': info.num_frames,
+                    'sample_rate': info.sample_rate,
+                    # Filled in by the batch phonemization below unless precomputed
+                    'phoneme_indices': precomputed.get(audio_file_stem),
+                }
+                scanned += 1
+            updated_manifest[key] = entry
+            corpus_entries.append((audio_file_stem, audio_path, entry))
+
+        # Phonemize all new or changed transcripts in one (parallel) batch
+        pending = [entry for _, _, entry in corpus_entries if entry['phoneme_indices'] is None]
+        if pending:
+            indices, offsets = self.phoneme_processor.text_to_indices_batch(
+                [entry['text'] for entry in pending], workers=self.config.phonemize_workers
+            )
+            for i, entry in enumerate(pending):
+                entry['phoneme_indices'] = indices[offsets[i]:offsets[i + 1]].tolist()
+
         samples = []
+        for audio_file_stem, audio_path, entry in corpus_entries:
+            # Estimate mel frames: (waveform_length - n_fft) // hop_length + 1
+            audio_length_frames = self._num_mel_frames(entry['num_frames'], entry['sample_rate'])
+            phoneme_indices = entry['phoneme_indices']
+            phoneme_length = len(phoneme_indices)
+
+            # Clip extremely long sequences to prevent memory issues during training
+            if audio_length_frames > self.config.max_seq_length:
+                logger.warning(f"Clipping {audio_file_stem}. Audio frames: {audio_length_frames} > max_seq_length: {self.config.max_seq_length}")
+                original_audio_len_frames = audio_length_frames
+                audio_length_frames = self.config.max_seq_length
+                # Also adjust phoneme length if it's too long, proportionally
+                if phoneme_length > 0:
+                    phoneme_length = int(phoneme_length * (self.config.max_seq_length / original_audio_len_frames))
+                    phoneme_length = max(1, phoneme_length) # Ensure at least 1 phoneme if original was > 0
+
+            samples.append({
+                'audio_path': str(audio_path),
+                'text': entry['text'],
+                'audio_file': audio_file_stem,
+                'audio_length': audio_length_frames, # in mel frames
+                'phoneme_length': phoneme_length,
+                'phoneme_indices': phoneme_indices
+            })
+
+        logger.info(f"Sample manifest: {reused} entries reused, {scanned} files scanned")
+        if manifest_path and (scanned > 0 or len(updated_manifest) != len(manifest)):
+            self._save_manifest(manifest_path, updated_manifest)
+
+        # Sort samples by their combined length (or just audio_length) for efficient batching
+        # Sorting by audio length is generally most impactful for Mel-spectrograms
+        samples.sort(key=lambda x: x['audio_length'])
+        return samples
 
+    def _iter_corpus_entries(self) -> Iterator[Tuple[str, str, Path]]:
+        """Yield (audio_file_stem, text, audio_path) for every usable corpus entry."""
         metadata_file = self.data_dir / "metadata_RUSLAN_22200.csv"
         if metadata_file.exists():
             logger.info(f"Loading metadata from {metadata_file}")
@@ -88,63 +194,11 @@ class RuslanDataset(Dataset):
                     parts = line.strip().split('|')
                     if len(parts) >= 2:
                         audio_file_stem = parts[0]
-                        text = parts[1]
-
                         audio_path = self.data_dir / "wavs" / f"{audio_file_stem}.wav"
                         if audio_path.exists():
-                            # Pre-calculate audio length (in mel frames)
-                            try:
-                                waveform, sr = torchaudio.load(audio_path)
-                                if sr != self.config.sample_rate:
-                                    resampler = torchaudio.transforms.Resample(sr, self.config.sample_rate)
-                                    waveform = resampler(waveform)
-
-                                # Ensure waveform is at least win_length for STFT
-                                if waveform.shape[1] < self.config.win_length:
-                                    # Pad short audio with zeros
-                                    padding_needed = self.config.win_length - waveform.shape[1]
-                                    waveform = torch.nn.functional.pad(waveform, (0, padding_needed))
-                                    # logger.debug(f"Padded short audio {audio_file_stem}. New length: {waveform.shape[1]}")
-
-                                # Estimate mel frames (audio_length // hop_length)
-                                # Add 1 because the number of frames is usually (waveform_length - win_length) / hop_length + 1
-                                audio_length_frames = (waveform.shape[1] - self.config.n_fft) // self.config.hop_length + 1
-                                if audio_length_frames < 1: # Handle cases where padding wasn't enough for even one frame
-                                    audio_length_frames = 1
-
-                            except Exception as e:
-                                logger.warning(f"Could not load or process audio {audio_path}: {e}. Skipping.")
-                                continue
-
-                            # Pre-calculate phoneme length
-                            phoneme_indices = self.phoneme_processor.text_to_indices(text)
-                            phoneme_length = len(phoneme_indices)
-
-                            # Clip extremely long sequences to prevent memory issues during training
-                            if audio_length_frames > self.config.max_seq_length:
-                                logger.warning(f"Clipping {audio_file_stem}. Audio frames: {audio_length_frames} > max_seq_length: {self.config.max_seq_length}")
-                                audio_length_frames = self.config.max_seq_length
-                                # Also adjust phoneme length if it's too long, proportionally
-                                if phoneme_length > 0:
-                                    # Estimate a new phoneme length based on the clipped audio length
-                                    original_audio_len_samples = waveform.shape[1]
-                                    original_audio_len_frames = (original_audio_len_samples - self.config.n_fft) // self.config.hop_length + 1
-
-                                    if original_audio_len_frames > 0: # Avoid division by zero
-                                        # Proportionally scale phoneme length
-                                        phoneme_length = int(phoneme_length * (self.config.max_seq_length / original_audio_len_frames))
-                                    phoneme_length = max(1, phoneme_length) # Ensure at least 1 phoneme if original was > 0
-
-                            samples.append({
-                                'audio_path': str(audio_path),
-                                'text': text,
-                                'audio_file': audio_file_stem,
-                                'audio_length': audio_length_frames, # in mel frames
-                                'phoneme_length': phoneme_length
-                            })
+                            yield audio_file_stem, parts[1], audio_path
         else:
-            logger.warning(f"Metadata file not found: {metadata_file}. Falling back to directory scan. "
-                           "Note: Lengths will be estimated on the fly for scanned files, which might be slower.")
+            logger.warning(f"Metadata file not found: {metadata_file}. Falling back to directory scan.")
             wav_dir = self.data_dir / "wavs"
             txt_dir = self.data_dir / "texts"
 
@@ -156,70 +210,103 @@ class RuslanDataset(Dataset):
                     if txt_file.exists():
                         with open(txt_file, 'r', encoding='utf-8') as f:
                             text = f.read().strip()
+                        yield wav_file.stem, text, wav_file
 
-                        # Pre-calculate audio length (in mel frames)
-                        try:
-                            waveform, sr = torchaudio.load(wav_file)
-                            if sr != self.config.sample_rate:
-                                resampler = torchaudio.transforms.Resample(sr, self.config.sample_rate)
-                                waveform = resampler(waveform)
-
-                            # Ensure waveform is at least win_length for STFT
-                            if waveform.shape[1] < self.config.win_length:
-                                padding_needed = self.config.win_length - waveform.shape[1]
-                                waveform = torch.nn.functional.pad(waveform, (0, padding_needed))
-                                # logger.debug(f"Padded short audio {wav_file.stem}. New length: {waveform.shape[1]}")
-
-                            audio_length_frames = (waveform.shape[1] - self.config.n_fft) // self.config.hop_length + 1
-                            if audio_length_frames < 1:
-                                audio_length_frames = 1
-
-                        except Exception as e:
-                            logger.warning(f"Could not load or process audio {wav_file}: {e}. Skipping.")
-                            continue
-
-                        # Pre-calculate phoneme length
-                        phoneme_indices = self.phoneme_processor.text_to_indices(text)
-                        phoneme_length = len(phoneme_indices)
-
-                        # Clip extremely long sequences
-                        if audio_length_frames > self.config.max_seq_length:
-                             logger.warning(f"Clipping {wav_file.stem}. Audio frames: {audio_length_frames} > max_seq_length: {self.config.max_seq_length}")
-                             audio_length_frames = self.config.max_seq_length
-                             if phoneme_length > 0:
-                                original_audio_len_samples = waveform.shape[1]
-                                original_audio_len_frames = (original_audio_len_samples - self.config.n_fft) // self.config.hop_length + 1
-                                if original_audio_len_frames > 0:
-                                    phoneme_length = int(phoneme_length * (self.config.max_seq_length / original_audio_len_frames))
-                                phoneme_length = max(1, phoneme_length)
-
-
-                        samples.append({
-                            'audio_path': str(wav_file),
-                            'text': text,
-                            'audio_file': wav_file.stem,
-                            'audio_length': audio_length_frames,
-                            'phoneme_length': phoneme_length
-                        })
-
-        # Sort samples by their combined length (or just audio_length) for efficient batching
-        # Sorting by audio length is generally most impactful for Mel-spectrograms
-        samples.sort(key=lambda x: x['audio_length'])
-        return samples
+    def _load_precomputed_indices(self) -> Dict[str, List[int]]:
+        """
+        Phoneme indices per utterance id from `russian_phoneme_processor.py --batch`
+        (config.phoneme_indices_path), if they were built by a processor with the same
+        vocabulary and stress dictionary.
+        """
+        if not self.config.phoneme_indices_path:
+            return {}
+
+        try:
+            ids, indices, offsets = load_indices_batch(self.config.phoneme_indices_path, self.phoneme_processor)
+        except ValueError as e:
+            logger.warning(f"Ignoring {self.config.phoneme_indices_path}: {e}. "
+                           f"Rebuild it with --batch --stress-dict matching stress_dict_path.")
+            return {}
+
+        logger.info(f"Using precomputed phoneme indices for {len(ids)} utterances from {self.config.phoneme_indices_path}")
+        return {utt_id: indices[offsets[i]:offsets[i + 1]].tolist() for i, utt_id in enumerate(ids)}
+
+    def _num_mel_frames(self, num_frames: int, sample_rate: int) -> int:
+        """Number of mel frames __getitem__ will produce for an audio file, computed from its header."""
+        num_samples = num_frames
+        if sample_rate != self.config.sample_rate:
+            # Same output length as torchaudio.transforms.Resample
+            num_samples = math.ceil(num_frames * self.config.sample_rate / sample_rate)
+
+        # Short audio is padded up to win_length for STFT
+        num_samples = max(num_samples, self.config.win_length)
+        return max(1, (num_samples - self.config.n_fft) // self.config.hop_length + 1)
+
+    def _get_manifest_path(self) -> Optional[Path]:
+        """Resolve where the sample manifest lives, or None if it is disabled."""
+        if not self.config.use_sample_manifest:
+            return None
+        if self.config.sample_manifest_path:
+            return Path(self.config.sample_manifest_path)
+        if os.access(self.data_dir, os.W_OK):
+            return self.data_dir / MANIFEST_FILENAME
+        return Path(self.config.output_dir) / MANIFEST_FILENAME
+
+    def processor_fingerprint(self) -> str:
+        """Fingerprint of the phoneme vocabulary and stress data; cached indices are invalid if it changes."""
+        return self.phoneme_processor.fingerprint()
+
+    def _load_manifest(self, manifest_path: Path) -> Dict[str, Dict]:
+        """Load cached per-file entries, discarding them if the format or phoneme vocabulary changed."""
+        if not manifest_path.exists():
+            return {}
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read sample manifest {manifest_path}: {e}. Rebuilding.")
+            return {}
+
+        if data.get('version') != MANIFEST_VERSION or data.get('processor') != self.processor_fingerprint():
+            logger.info(f"Sample manifest {manifest_path} is stale, rebuilding")
+            return {}
+        return data.get('entries', {})
+
+    def _save_manifest(self, manifest_path: Path, entries: Dict[str, Dict]):
+        """Atomically write the manifest so an interrupted run never leaves a truncated file."""
+        data = {
+            'version': MANIFEST_VERSION,
+            'processor': self.processor_fingerprint(),
+            'entries': entries,
+        }
+        try:
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = manifest_path.with_suffix(manifest_path.suffix + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, manifest_path)
+            logger.info(f"Saved sample manifest with {len(entries)} entries to {manifest_path}")
+        except OSError as e:
+            logger.warning(f"Could not save sample manifest {manifest_path}: {e}")
 
     def __len__(self) -> int:
         return len(self.samples)
 
-    def __getitem__(self, idx: int) -> Dict:
-        sample = self.samples[idx]
+    def _get_resampler(self, orig_sr: int) -> torchaudio.transforms.Resample:
+        resampler = self._resamplers.get(orig_sr)
+        if resampler is None:
+            resampler = torchaudio.transforms.Resample(orig_sr, self.config.sample_rate)
+            self._resamplers[orig_sr] = resampler
+        return resampler
 
+    def compute_mel(self, audio_path: str) -> torch.Tensor:
+        """Load an audio file and return its clipped log-mel spectrogram (n_mels, T)."""
         # Load audio
-        audio, sr = torchaudio.load(sample['audio_path'])
+        audio, sr = torchaudio.load(audio_path)
 
         # Resample if necessary
         if sr != self.config.sample_rate:
-            resampler = torchaudio.transforms.Resample(sr, self.config.sample_rate)
-            audio = resampler(audio)
+            audio = self._get_resampler(sr)(audio)
 
         # Convert to mono if stereo
         if audio.shape[0] > 1:
@@ -245,27 +332,20 @@ class RuslanDataset(Dataset):
         max_frames = self.config.max_seq_length
         if mel_spec.shape[1] > max_frames:
             mel_spec = mel_spec[:, :max_frames]
+        return mel_spec
 
-        # Process text to phonemes using the dedicated processor
-        phoneme_indices = self.phoneme_processor.text_to_indices(sample['text'])
-        phoneme_indices_tensor = torch.tensor(phoneme_indices, dtype=torch.long)
-
-        # --- Generate Phoneme Durations (PLACEHOLDER/DUMMY) ---
-        num_mel_frames = mel_spec.shape[1]
-        num_phonemes = phoneme_indices_tensor.shape[0]
+    def __getitem__(self, idx: int) -> Dict:
+        sample = self.samples[idx]
 
-        if num_phonemes == 0:
-            phoneme_durations = torch.zeros_like(phoneme_indices_tensor, dtype=torch.long)
+        if self.feature_store is not None:
+            # Zero-copy slices of the memory-mapped shards
+            mel_spec, phoneme_indices_tensor, phoneme_durations = self.feature_store.read(sample['store_index'])
         else:
-            avg_duration = num_mel_frames / num_phonemes
-            phoneme_durations = torch.full((num_phonemes,), int(avg_duration), dtype=torch.long)
+            mel_spec = self.compute_mel(sample['audio_path'])
 
-            remainder = num_mel_frames - torch.sum(phoneme_durations).item()
-            # Distribute remainder frames to early phonemes
-            for i in range(remainder):
-                if i < num_phonemes: # Ensure we don't go out of bounds
-                    phoneme_durations[i] += 1
-            phoneme_durations = torch.clamp(phoneme_durations, min=1)
+            # Phoneme indices were computed once while loading (or taken from the manifest)
+            phoneme_indices_tensor = torch.tensor(sample['phoneme_indices'], dtype=torch.long)
+            phoneme_durations = placeholder_durations(phoneme_indices_tensor.shape[0], mel_spec.shape[1])
 
         # --- Generate Stop Token Targets ---
         stop_token_targets = torch.zeros(mel_spec.shape[1], dtype=torch.float32)
@@ -283,6 +363,24 @@ class RuslanDataset(Dataset):
             'phoneme_length': phoneme_indices_tensor.shape[0] # Actual length
         }
 
+
+def placeholder_durations(num_phonemes: int, num_mel_frames: int) -> torch.Tensor:
+    """
+    Generate Phoneme Durations (PLACEHOLDER/DUMMY): spread the mel frames
+    uniformly over the phonemes, giving the remainder to early phonemes.
+    """
+    if num_phonemes == 0:
+        return torch.zeros(0, dtype=torch.long)
+
+    avg_duration = num_mel_frames / num_phonemes
+    phoneme_durations = torch.full((num_phonemes,), int(avg_duration), dtype=torch.long)
+
+    remainder = num_mel_frames - torch.sum(phoneme_durations).item()
+    # Distribute remainder frames to early phonemes
+    phoneme_durations[:min(remainder, num_phonemes)] += 1
+    return torch.clamp(phoneme_durations, min=1)
+
+
 def collate_fn(batch: List[Dict]) -> Dict:
     """Collate function for DataLoader - optimized for MPS"""
     # Transpose mel_spec from (n_mels, time) to (time, n_mels) for batch_first=True padding
@@ -321,18 +419,52 @@ class LengthBasedBatchSampler(Sampler):
     Samples mini-batches of indices for training.
     The samples are grouped by lengths to minimize padding.
     Assumes the dataset is already sorted by length.
+
+    Two batching modes are supported:
+    - fixed size: `batch_size` samples per batch (default)
+    - frame budget: if `max_frames_per_batch` is set, batches are packed so that
+      batch_size * longest_sample stays within the budget, giving many short clips
+      or few long ones per step. `drop_last` is ignored in this mode.
+
+    Batches are rebuilt for every epoch; call `set_epoch` before iterating.
     """
-    def __init__(self, dataset: Dataset, batch_size: int, drop_last: bool = False, shuffle: bool = True):
+    def __init__(self, dataset: Dataset, batch_size: int, drop_last: bool = False, shuffle: bool = True,
+                 max_frames_per_batch: Optional[int] = None, length_jitter: float = 0.1, seed: int = 0):
         self.dataset = dataset
         self.batch_size = batch_size
         self.drop_last = drop_last
         self.shuffle = shuffle
+        self.max_frames_per_batch = max_frames_per_batch
+        self.length_jitter = length_jitter
+        self.seed = seed
+        self.epoch = 0
+
+        self.lengths = [sample['audio_length'] for sample in dataset.samples]
 
         # Create buckets of indices based on length
         # Since the dataset is pre-sorted by audio_length, we can just group
         self.batches = self._create_batches()
 
+    def set_epoch(self, epoch: int):
+        """Reshuffle the batches for a new epoch (deterministic given seed and epoch)."""
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self.batches = self._create_batches()
+
     def _create_batches(self) -> List[List[int]]:
+        rng = random.Random(self.seed + self.epoch)
+        if self.max_frames_per_batch:
+            batches = self._create_frame_budget_batches(rng)
+        else:
+            batches = self._create_fixed_size_batches(rng)
+
+        # Shuffle the order of batches
+        if self.shuffle:
+            rng.shuffle(batches)
+
+        return batches
+
+    def _create_fixed_size_batches(self, rng: random.Random) -> List[List[int]]:
         batches = []
         indices = list(range(len(self.dataset)))
 
@@ -345,11 +477,11 @@ class LengthBasedBatchSampler(Sampler):
             shuffled_indices = []
             for i in range(num_windows):
                 window = indices[i * window_size : (i + 1) * window_size]
-                random.shuffle(window)
+                rng.shuffle(window)
                 shuffled_indices.extend(window)
             # Add remaining indices
             remaining_indices = indices[num_windows * window_size:]
-            random.shuffle(remaining_indices)
+            rng.shuffle(remaining_indices)
             shuffled_indices.extend(remaining_indices)
             indices = shuffled_indices
 
@@ -364,12 +496,63 @@ class LengthBasedBatchSampler(Sampler):
         if len(current_batch) > 0 and not self.drop_last:
             batches.append(current_batch)
 
-        # Shuffle the order of batches
-        if self.shuffle:
-            random.shuffle(batches)
+        return batches
+
+    def _create_frame_budget_batches(self, rng: random.Random) -> List[List[int]]:
+        indices = list(range(len(self.dataset)))
 
+        if self.shuffle and self.length_jitter > 0:
+            # Sort by a randomly perturbed length so that batch composition changes
+            # between epochs while neighbours stay close in length.
+            keys = [length * (1.0 + rng.uniform(-self.length_jitter, self.length_jitter)) for length in self.lengths]
+            indices.sort(key=lambda i: keys[i])
+        else:
+            indices.sort(key=lambda i: self.lengths[i])
+
+        batches = []
+        current_batch = []
+        current_max = 0
+        oversized = 0
+        for idx in indices:
+            length = self.lengths[idx]
+            new_max = max(current_max, length)
+            # Padded cost of the batch if this sample is added
+            if current_batch and (len(current_batch) + 1) * new_max > self.max_frames_per_batch:
+                batches.append(current_batch)
+                current_batch, new_max = [], length
+            if length > self.max_frames_per_batch:
+                oversized += 1
+            current_batch.append(idx)
+            current_max = new_max
+
+        if current_batch:
+            batches.append(current_batch)
+
+        if oversized:
+            logger.warning(f"{oversized} samples exceed max_frames_per_batch={self.max_frames_per_batch} "
+                           "and are placed in single-sample batches")
         return batches
 
+    def get_padding_stats(self) -> Dict[str, float]:
+        """Padding statistics (in mel frames) for the batches of the current epoch."""
+        if not self.batches:
+            return {}
+
+        batch_sizes = [len(batch) for batch in self.batches]
+        real_frames = [sum(self.lengths[i] for i in batch) for batch in self.batches]
+        padded_frames = [len(batch) * max(self.lengths[i] for i in batch) for batch in self.batches]
+        total_real, total_padded = sum(real_frames), sum(padded_frames)
+
+        return {
+            'num_batches': len(self.batches),
+            'mean_batch_size': float(np.mean(batch_sizes)),
+            'min_batch_size': min(batch_sizes),
+            'max_batch_size': max(batch_sizes),
+            'mean_padded_frames': float(np.mean(padded_frames)),
+            'max_padded_frames': max(padded_frames),
+            'padding_waste': 1.0 - total_real / total_padded if total_padded else 0.0,
+        }
+
     def __iter__(self):
         # Iterate over the prepared batches
         for batch in self.batches:
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Precomputed feature store for Kokoro training
+
+Log-mel spectrograms, phoneme indices and durations are extracted once and
+written into flat binary shards. During training the shards are memory-mapped,
+so DataLoader workers only slice arrays instead of decoding audio and running
+the STFT on every access.
+
+Usage:
+  python feature_store.py --corpus ./ruslan_corpus --output ./ruslan_features
+  python training.py --corpus ./ruslan_corpus --features ./ruslan_features
+"""
+
+import os
+import json
+import argparse
+import logging
+import numpy as np
+import torch
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import TrainingConfig
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+STORE_VERSION = 1
+
+# Config fields that change the extracted features; a store is only valid for matching values
+FEATURE_CONFIG_KEYS = (
+    'sample_rate', 'n_mels', 'n_fft', 'hop_length', 'win_length', 'f_min', 'f_max', 'max_seq_length'
+)
+
+MEL_DTYPE = np.float32
+INDEX_DTYPE = np.int32
+
+
+def _shard_paths(store_dir: Path, shard_id: int) -> Tuple[Path, Path, Path]:
+    """Paths of the mel, phoneme-index and duration files of a shard."""
+    stem = store_dir / f"shard_{shard_id:05d}"
+    return stem.with_suffix('.mel'), stem.with_suffix('.phon'), stem.with_suffix('.dur')
+
+
+class FeatureStoreWriter:
+    """Appends extracted features to shard files and writes the index on close"""
+
+    def __init__(self, store_dir: str, config: TrainingConfig, processor_fingerprint: str,
+                 samples_per_shard: int = 2000):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.config = config
+        self.processor_fingerprint = processor_fingerprint
+        self.samples_per_shard = samples_per_shard
+
+        self.entries: List[Dict] = []
+        self.shard_id = -1
+        self.shard_count = 0
+        self.mel_offset = 0
+        self.phon_offset = 0
+        self._files = None
+
+    def _open_next_shard(self):
+        self._close_files()
+        self.shard_id += 1
+        self.shard_count = 0
+        self.mel_offset = 0
+        self.phon_offset = 0
+        self._files = [open(path, 'wb') for path in _shard_paths(self.store_dir, self.shard_id)]
+
+    def _close_files(self):
+        if self._files:
+            for f in self._files:
+                f.close()
+        self._files = None
+
+    def add(self, item: Dict):
+        """Append one dataset item (as returned by RuslanDataset.__getitem__)."""
+        if self._files is None or self.shard_count >= self.samples_per_shard:
+            self._open_next_shard()
+
+        # Stored time-major so every sample is one contiguous block of rows
+        mel = item['mel_spec'].transpose(0, 1).contiguous().numpy().astype(MEL_DTYPE, copy=False)
+        phonemes = item['phoneme_indices'].numpy().astype(INDEX_DTYPE)
+        durations = item['phoneme_durations'].numpy().astype(INDEX_DTYPE)
+
+        mel_file, phon_file, dur_file = self._files
+        mel_file.write(mel.tobytes())
+        phon_file.write(phonemes.tobytes())
+        dur_file.write(durations.tobytes())
+
+        self.entries.append({
+            'shard': self.shard_id,
+            'mel_offset': self.mel_offset,
+            'mel_length': int(mel.shape[0]),
+            'phon_offset': self.phon_offset,
+            'phoneme_length': int(phonemes.shape[0]),
+            'text': item['text'],
+            'audio_file': item['audio_file'],
+        })
+        self.mel_offset += mel.shape[0]
+        self.phon_offset += phonemes.shape[0]
+        self.shard_count += 1
+
+    def close(self):
+        """Flush the shards and write the index describing them."""
+        self._close_files()
+        index = {
+            'version': STORE_VERSION,
+            'n_mels': self.config.n_mels,
+            'num_shards': self.shard_id + 1,
+            'processor': self.processor_fingerprint,
+            'config': {key: getattr(self.config, key) for key in FEATURE_CONFIG_KEYS},
+            'entries': self.entries,
+        }
+        tmp_path = self.store_dir / (INDEX_FILENAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.store_dir / INDEX_FILENAME)
+        logger.info(f"Wrote {len(self.entries)} samples in {self.shard_id + 1} shards to {self.store_dir}")
+
+
+class FeatureStore:
+    """Read-only, memory-mapped view over a feature store directory"""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = Path(store_dir)
+        index_path = self.store_dir / INDEX_FILENAME
+        if not index_path.exists():
+            raise FileNotFoundError(
+                f"Feature store index not found: {index_path}. "
+                "Run `python feature_store.py --corpus <corpus> --output <dir>` first."
+            )
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported feature store version {index.get('version')} in {index_path}")
+
+        self.n_mels = index['n_mels']
+        self.processor_fingerprint = index['processor']
+        self.feature_config = index['config']
+        self.entries = index['entries']
+
+        # Memory maps are opened lazily so that every DataLoader worker maps its own view
+        self._shards: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def check_compatible(self, config: TrainingConfig, processor_fingerprint: Optional[str] = None):
+        """Raise ValueError if the store was extracted with different audio or phoneme settings."""
+        mismatched = [
+            f"{key}: store={self.feature_config.get(key)} config={getattr(config, key)}"
+            for key in FEATURE_CONFIG_KEYS
+            if self.feature_config.get(key) != getattr(config, key)
+        ]
+        if mismatched:
+            raise ValueError(
+                f"Feature store {self.store_dir} does not match the training config ({', '.join(mismatched)}). "
+                "Re-run feature extraction."
+            )
+        if processor_fingerprint is not None and processor_fingerprint != self.processor_fingerprint:
+            raise ValueError(
+                f"Feature store {self.store_dir} was built with a different phoneme vocabulary. "
+                "Re-run feature extraction."
+            )
+
+    def get_samples(self) -> List[Dict]:
+        """Sample descriptors in the format used by RuslanDataset, sorted by length."""
+        samples = [{
+            'audio_path': None,
+            'text': entry['text'],
+            'audio_file': entry['audio_file'],
+            'audio_length': entry['mel_length'],
+            'phoneme_length': entry['phoneme_length'],
+            'store_index': i,
+        } for i, entry in enumerate(self.entries)]
+        samples.sort(key=lambda x: x['audio_length'])
+        return samples
+
+    def _open_array(self, path: Path, dtype, shape_tail: Tuple[int, ...] = ()) -> np.ndarray:
+        row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape_tail, dtype=np.int64))
+        num_rows = path.stat().st_size // row_bytes
+        if num_rows == 0:
+            return np.empty((0,) + shape_tail, dtype=dtype)
+        # Copy-on-write keeps reads zero-copy while giving torch a writable buffer
+        return np.memmap(path, dtype=dtype, mode='c', shape=(num_rows,) + shape_tail)
+
+    def _get_shard(self, shard_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            mel_path, phon_path, dur_path = _shard_paths(self.store_dir, shard_id)
+            shard = (
+                self._open_array(mel_path, MEL_DTYPE, (self.n_mels,)),
+                self._open_array(phon_path, INDEX_DTYPE),
+                self._open_array(dur_path, INDEX_DTYPE),
+            )
+            self._shards[shard_id] = shard
+        return shard
+
+    def read(self, store_index: int) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Return (mel_spec (n_mels, T), phoneme_indices, phoneme_durations) for one sample."""
+        entry = self.entries[store_index]
+        mels, phonemes, durations = self._get_shard(entry['shard'])
+
+        mel_start, mel_end = entry['mel_offset'], entry['mel_offset'] + entry['mel_length']
+        phon_start, phon_end = entry['phon_offset'], entry['phon_offset'] + entry['phoneme_length']
+
+        mel_spec = torch.from_numpy(mels[mel_start:mel_end]).transpose(0, 1)
+        phoneme_indices = torch.from_numpy(phonemes[phon_start:phon_end]).long()
+        phoneme_durations = torch.from_numpy(durations[phon_start:phon_end]).long()
+        return mel_spec, phoneme_indices, phoneme_durations
+
+
+def extract_features(data_dir: str, output_dir: str, config: TrainingConfig,
+                     samples_per_shard: int = 2000, num_workers: int = 0):
+    """Run the regular dataset pipeline once over the corpus and store its outputs."""
+    from torch.utils.data import DataLoader
+    from tqdm import tqdm
+    from dataset import RuslanDataset
+
+    dataset = RuslanDataset(data_dir, config)
+    writer = FeatureStoreWriter(output_dir, config, dataset.processor_fingerprint(), samples_per_shard)
+
+    # batch_size=None yields single items; workers only parallelize the audio/STFT work
+    loader = DataLoader(dataset, batch_size=None, shuffle=False, num_workers=num_workers)
+    try:
+        for item in tqdm(loader, total=len(dataset), desc="Extracting features"):
+            writer.add(item)
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract log-mel features for Kokoro training into memory-mapped shards")
+    parser.add_argument('--corpus', '-c', type=str, default='./ruslan_corpus',
+                        help='Path to the corpus directory (default: ./ruslan_corpus)')
+    parser.add_argument('--output', '-o', type=str, required=True,
+                        help='Directory to write the feature shards to')
+    parser.add_argument('--samples-per-shard', type=int, default=2000,
+                        help='Number of utterances per shard file (default: 2000)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='DataLoader workers used for extraction (default: CPU count)')
+    parser.add_argument('--no-manifest', action='store_true',
+                        help='Do not read or write the cached sample manifest')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    config = TrainingConfig(
+        data_dir=args.corpus,
+        output_dir=args.output,
+        auto_optimize_checkpointing=False,
+        use_sample_manifest=not args.no_manifest,
+    )
+    extract_features(args.corpus, args.output, config, args.samples_per_shard, args.workers)
+
+
+if __name__ == "__main__":
+    main()
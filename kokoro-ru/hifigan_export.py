@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Inference-optimized HiFi-GAN export
+
+Folds weight norm into the conv weights and writes a frozen TorchScript graph and
+an ONNX model of the generator, together with the metadata needed to use them
+(hop length, receptive field) without the Python model definition. Exported
+vocoders are loaded by VocoderManager with vocoder_type="hifigan_exported".
+
+Usage:
+  python hifigan_export.py export --model generator.pth --output ./vocoder_export
+  python hifigan_export.py benchmark --model generator.pth --export ./vocoder_export
+"""
+
+import json
+import time
+import argparse
+import logging
+import torch
+import torch.nn as nn
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+from hifigan_vocoder import HiFiGANConfig, HiFiGANGenerator, load_hifigan_model
+
+logger = logging.getLogger(__name__)
+
+TORCHSCRIPT_FILENAME = "generator.ts"
+ONNX_FILENAME = "generator.onnx"
+EXPORT_INFO_FILENAME = "export_info.json"
+
+
+def export_hifigan(generator: HiFiGANGenerator, output_dir: Union[str, Path], sampling_rate: int = 22050,
+                   n_mels: int = 80, example_frames: int = 200, export_onnx: bool = True,
+                   opset_version: int = 17, device: str = "cpu") -> Dict[str, Path]:
+    """
+    Export `generator` (left unchanged) as frozen TorchScript and optionally ONNX.
+
+    The graph is traced for a (batch, n_mels, frames) input with dynamic batch and frame
+    dimensions. TorchScript is frozen for `device`; ONNX is device-independent.
+    Returns the paths of the written files.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    generator = generator.folded_copy().to(device)
+
+    example = torch.randn(1, n_mels, example_frames, device=device)
+    paths = {}
+
+    with torch.no_grad():
+        traced = torch.jit.trace(generator, example)
+        frozen = torch.jit.freeze(traced)
+    paths['torchscript'] = output_dir / TORCHSCRIPT_FILENAME
+    frozen.save(str(paths['torchscript']))
+    logger.info(f"Wrote TorchScript vocoder to {paths['torchscript']}")
+
+    if export_onnx:
+        paths['onnx'] = output_dir / ONNX_FILENAME
+        with torch.no_grad():
+            torch.onnx.export(
+                generator, example, str(paths['onnx']),
+                input_names=['mel'], output_names=['audio'],
+                dynamic_axes={'mel': {0: 'batch', 2: 'frames'}, 'audio': {0: 'batch', 2: 'samples'}},
+                opset_version=opset_version
+            )
+        logger.info(f"Wrote ONNX vocoder to {paths['onnx']}")
+
+    info = {
+        'n_mels': n_mels,
+        'sampling_rate': sampling_rate,
+        'samples_per_frame': generator.samples_per_frame,
+        'receptive_field_frames': generator.receptive_field_frames,
+        'torchscript_device': device,
+    }
+    paths['info'] = output_dir / EXPORT_INFO_FILENAME
+    with open(paths['info'], 'w') as f:
+        json.dump(info, f, indent=2)
+
+    return paths
+
+
+class ExportedHiFiGAN(nn.Module):
+    """
+    An exported generator (TorchScript or ONNX) behind the HiFiGANGenerator interface:
+    same input layouts, `samples_per_frame` and `receptive_field_frames`, so it works with
+    VocoderManager batching and HiFiGANStream.
+    """
+
+    def __init__(self, export_path: Union[str, Path], device: str = "cpu"):
+        super().__init__()
+        export_path = Path(export_path)
+        if export_path.is_dir():
+            # Prefer TorchScript, it runs on the torch device without copies
+            candidates = [export_path / TORCHSCRIPT_FILENAME, export_path / ONNX_FILENAME]
+            existing = [path for path in candidates if path.exists()]
+            if not existing:
+                raise FileNotFoundError(f"No exported vocoder found in {export_path}")
+            export_path = existing[0]
+
+        with open(export_path.parent / EXPORT_INFO_FILENAME, 'r') as f:
+            info = json.load(f)
+        self.n_mels = info['n_mels']
+        self.sampling_rate = info['sampling_rate']
+        self.samples_per_frame = info['samples_per_frame']
+        self.receptive_field_frames = info['receptive_field_frames']
+        self.export_path = export_path
+        self.device = device
+
+        self.session = None
+        self.module = None
+        if export_path.suffix == '.onnx':
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError("onnxruntime is required for ONNX vocoders: pip install onnxruntime")
+            providers = ['CPUExecutionProvider']
+            if device.startswith('cuda') and 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+                providers.insert(0, 'CUDAExecutionProvider')
+            self.session = onnxruntime.InferenceSession(str(export_path), providers=providers)
+        else:
+            if info.get('torchscript_device', 'cpu') != device.split(':')[0]:
+                logger.warning(f"TorchScript vocoder was frozen for {info.get('torchscript_device')}, "
+                               f"loading it on {device}")
+            self.module = torch.jit.load(str(export_path), map_location=device)
+
+        logger.info(f"Loaded exported HiFi-GAN from: {export_path}")
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # Same input layouts as HiFiGANGenerator.forward; the exported graph expects [batch, n_mels, time]
+        if x.dim() == 3 and x.size(1) != self.n_mels and x.size(2) == self.n_mels:
+            x = x.transpose(1, 2)
+        elif x.dim() == 2:
+            x = x.unsqueeze(0).transpose(1, 2)
+
+        if self.session is not None:
+            mel = x.detach().to('cpu', torch.float32).contiguous().numpy()
+            audio = self.session.run(None, {'mel': mel})[0]
+            return torch.from_numpy(audio).to(x.device)
+
+        with torch.no_grad():
+            return self.module(x.contiguous())
+
+
+def benchmark_hifigan_export(generator: HiFiGANGenerator, export_dir: Union[str, Path],
+                             num_frames: int = 400, num_runs: int = 5, sampling_rate: int = 22050) -> dict:
+    """
+    Compare exported vocoders against the eager module (moved to the CPU).
+
+    Every backend gets the same random log-mel input; `max_abs_diff` is measured against
+    the eager output and `rtf` is synthesis time divided by audio duration (best of `num_runs`).
+    """
+    export_dir = Path(export_dir)
+    generator = generator.cpu().eval()
+    mel = torch.randn(1, 80, num_frames) - 5.0
+    audio_seconds = num_frames * generator.samples_per_frame / sampling_rate
+
+    backends = {'eager': generator}
+    if generator.has_weight_norm:
+        backends['eager_folded'] = generator.folded_copy()
+    for filename, name in ((TORCHSCRIPT_FILENAME, 'torchscript'), (ONNX_FILENAME, 'onnx')):
+        if (export_dir / filename).exists():
+            try:
+                backends[name] = ExportedHiFiGAN(export_dir / filename, device="cpu")
+            except ImportError as e:
+                logger.warning(f"Skipping {name}: {e}")
+
+    results = {}
+    reference = None
+    for name, vocoder in backends.items():
+        with torch.no_grad():
+            audio = vocoder(mel)  # warm-up (TorchScript profiling runs, ONNX session init)
+            timings = []
+            for _ in range(num_runs):
+                start = time.perf_counter()
+                audio = vocoder(mel)
+                timings.append(time.perf_counter() - start)
+
+        if reference is None:
+            reference = audio
+        results[name] = {
+            'max_abs_diff': float((audio - reference).abs().max()),
+            'seconds': min(timings),
+            'rtf': min(timings) / audio_seconds,
+        }
+
+    for name, result in results.items():
+        logger.info(f"{name:>12}: RTF {result['rtf']:.4f} ({result['seconds'] * 1000:.1f} ms for "
+                    f"{audio_seconds:.2f}s of audio), max abs diff vs eager {result['max_abs_diff']:.2e}")
+    return results
+
+
+def _load_for_export(model_path: str, config_path: Optional[str]) -> Tuple[HiFiGANGenerator, dict]:
+    model_path = Path(model_path)
+    if model_path.is_dir():
+        config_path = config_path or model_path / "config.json"
+        model_path = model_path / "generator.pth"
+    config_path = Path(config_path) if config_path else model_path.parent / "config.json"
+    config = HiFiGANConfig.load_config(config_path) if config_path.exists() else HiFiGANConfig.get_default_config()
+    # Keep weight norm so the benchmark can also time the module as it is loaded for training
+    generator = load_hifigan_model(model_path, config_path, "cpu", fold_weight_norm=False)
+    return generator, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export HiFi-GAN to frozen TorchScript / ONNX and benchmark it")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export a generator checkpoint')
+    export_parser.add_argument('--model', type=str, required=True,
+                               help='Generator checkpoint (.pth) or directory with generator.pth and config.json')
+    export_parser.add_argument('--config', type=str, default=None, help='HiFi-GAN config.json (default: next to the model)')
+    export_parser.add_argument('--output', '-o', type=str, required=True, help='Directory to write the exported vocoder to')
+    export_parser.add_argument('--device', type=str, default='cpu', help='Device the TorchScript graph is frozen for (default: cpu)')
+    export_parser.add_argument('--no-onnx', action='store_true', help='Only write TorchScript')
+    export_parser.add_argument('--opset', type=int, default=17, help='ONNX opset version (default: 17)')
+    export_parser.add_argument('--no-verify', action='store_true', help='Skip the parity check and RTF benchmark')
+    export_parser.add_argument('--tolerance', type=float, default=1e-4,
+                               help='Maximum allowed abs difference against the eager module (default: 1e-4)')
+
+    bench_parser = subparsers.add_parser('benchmark', help='Compare an export against the eager module')
+    bench_parser.add_argument('--model', type=str, required=True, help='Generator checkpoint or directory')
+    bench_parser.add_argument('--config', type=str, default=None, help='HiFi-GAN config.json (default: next to the model)')
+    bench_parser.add_argument('--export', type=str, required=True, help='Directory written by the export command')
+    bench_parser.add_argument('--frames', type=int, default=400, help='Mel frames per benchmark run (default: 400)')
+    bench_parser.add_argument('--runs', type=int, default=5, help='Timed runs per backend (default: 5)')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    generator, config = _load_for_export(args.model, args.config)
+    sampling_rate = config.get('sampling_rate', 22050)
+
+    if args.command == 'export':
+        export_hifigan(generator, args.output, sampling_rate=sampling_rate, n_mels=config.get('num_mels', 80),
+                       export_onnx=not args.no_onnx, opset_version=args.opset, device=args.device)
+        if args.no_verify:
+            return
+        results = benchmark_hifigan_export(generator, args.output, sampling_rate=sampling_rate)
+        failed = [name for name, result in results.items() if result['max_abs_diff'] > args.tolerance]
+        if failed:
+            raise SystemExit(f"Parity check failed for {', '.join(failed)} (tolerance {args.tolerance})")
+        logger.info("Parity check passed")
+    else:
+        benchmark_hifigan_export(generator, args.export, args.frames, args.runs, sampling_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,9 @@ try:
 except ImportError:
     # Fallback for older PyTorch versions
     from torch.nn.utils import weight_norm, remove_weight_norm
+from torch.nn.utils import parametrize
 import json
+import math
 import logging
 from pathlib import Path
 from typing import Optional, Dict, Any
@@ -21,6 +23,14 @@ from typing import Optional, Dict, Any
 logger = logging.getLogger(__name__)
 
 
+def _fold_weight_norm(module: nn.Module):
+    """Replace a weight-normalized weight by its plain value (parametrization or legacy hook)."""
+    if parametrize.is_parametrized(module, "weight"):
+        parametrize.remove_parametrizations(module, "weight", leave_parametrized=True)
+    else:
+        remove_weight_norm(module)
+
+
 class AttrDict(dict):
     """Dictionary that allows attribute access"""
     def __init__(self, *args, **kwargs):
@@ -71,9 +81,9 @@ class ResBlock(nn.Module):
 
     def remove_weight_norm(self):
         for l in self.convs1:
-            remove_weight_norm(l)
+            _fold_weight_norm(l)
         for l in self.convs2:
-            remove_weight_norm(l)
+            _fold_weight_norm(l)
 
 
 class HiFiGANGenerator(nn.Module):
@@ -81,6 +91,7 @@ class HiFiGANGenerator(nn.Module):
 
     def __init__(self, h: AttrDict):
         super(HiFiGANGenerator, self).__init__()
+        self.h = h
         self.num_kernels = len(h.resblock_kernel_sizes)
         self.num_upsamples = len(h.upsample_rates)
         self.conv_pre = weight_norm(nn.Conv1d(80, h.upsample_initial_channel, 7, 1, padding=3))
@@ -133,12 +144,60 @@ class HiFiGANGenerator(nn.Module):
         return x
 
     def remove_weight_norm(self):
-        remove_weight_norm(self.conv_pre)
+        """Fold weight norm into plain conv weights; required once before inference or export."""
+        _fold_weight_norm(self.conv_pre)
         for l in self.ups:
-            remove_weight_norm(l)
+            _fold_weight_norm(l)
         for l in self.resblocks:
             l.remove_weight_norm()
-        remove_weight_norm(self.conv_post)
+        _fold_weight_norm(self.conv_post)
+
+    def folded_copy(self) -> "HiFiGANGenerator":
+        """Inference copy with weight norm folded, leaving this module unchanged."""
+        # Not copy.deepcopy: the copy would share the parametrized conv classes, and folding
+        # it removes their `weight` property from this module as well
+        generator = HiFiGANGenerator(self.h).to(self.conv_post.bias.device)
+        if not self.has_weight_norm:
+            generator.remove_weight_norm()
+        generator.load_state_dict(self.state_dict())
+        if generator.has_weight_norm:
+            generator.remove_weight_norm()
+        return generator.eval()
+
+    @property
+    def has_weight_norm(self) -> bool:
+        return parametrize.is_parametrized(self.conv_pre, "weight") or hasattr(self.conv_pre, "weight_g")
+
+    @property
+    def samples_per_frame(self) -> int:
+        """Output samples per mel frame (the hop length)."""
+        return math.prod(up.stride[0] for up in self.ups)
+
+    @property
+    def receptive_field_frames(self) -> int:
+        """
+        One-sided receptive field in mel frames: how many frames of context on each
+        side influence the audio of a frame.
+        """
+        def conv_radius(conv) -> float:
+            return (conv.kernel_size[0] - 1) * conv.dilation[0] / 2
+
+        radius = conv_radius(self.conv_pre)
+        samples_per_frame = 1
+        for i, up in enumerate(self.ups):
+            # A transposed conv output depends on ceil(kernel / stride) inputs at the stage input rate
+            radius += math.ceil(up.kernel_size[0] / up.stride[0]) / samples_per_frame
+            samples_per_frame *= up.stride[0]
+
+            # Resblocks of a stage run in parallel; their convs are sequential within a block
+            stage_blocks = self.resblocks[i * self.num_kernels:(i + 1) * self.num_kernels]
+            block_radius = max(
+                sum(conv_radius(c) for c in list(block.convs1) + list(block.convs2)) for block in stage_blocks
+            )
+            radius += block_radius / samples_per_frame
+
+        radius += conv_radius(self.conv_post) / samples_per_frame
+        return math.ceil(radius)
 
 
 class HiFiGANConfig:
@@ -190,7 +249,8 @@ class HiFiGANConfig:
 def load_hifigan_model(
     model_path: Path, 
     config_path: Optional[Path] = None,
-    device: str = "cpu"
+    device: str = "cpu",
+    fold_weight_norm: bool = True
 ) -> HiFiGANGenerator:
     """
     Load HiFi-GAN model from checkpoint
@@ -199,6 +259,8 @@ def load_hifigan_model(
         model_path: Path to the model checkpoint
         config_path: Optional path to config file (uses default if not provided)
         device: Device to load model on
+        fold_weight_norm: Fold weight norm into the conv weights for inference
+            (keep it for fine-tuning)
         
     Returns:
         Loaded HiFiGANGenerator model
@@ -235,6 +297,9 @@ def load_hifigan_model(
         else:
             raise e
 
+    if fold_weight_norm:
+        generator.remove_weight_norm()
+
     generator.eval()
     generator.to(device)
     
@@ -8,10 +8,12 @@ import torch
 import argparse
 import pickle
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 import logging
+from torch.nn.utils.rnn import pad_sequence
 
 # Import our training configuration, model and phoneme processor
+from config import TrainingConfig
 from model import KokoroModel
 from russian_phoneme_processor import RussianPhonemeProcessor
 from vocoder_manager import VocoderManager
@@ -49,8 +51,8 @@ class KokoroTTS:
         # Load model
         self.model = self._load_model()
 
-        # Initialize vocoder
-        self.vocoder_manager = VocoderManager(vocoder_type, vocoder_path, self.device)
+        # Initialize vocoder (with the training audio settings when the checkpoint has them)
+        self.vocoder_manager = VocoderManager(vocoder_type, vocoder_path, self.device, config=self.training_config)
 
     def _load_phoneme_processor(self) -> RussianPhonemeProcessor:
         """Loads the phoneme processor from the model directory."""
@@ -105,6 +107,9 @@ class KokoroTTS:
         if checkpoint is None:
             raise RuntimeError(f"Failed to load checkpoint from {model_path} with any attempted method. It might be corrupted or incompatible.")
 
+        config = checkpoint.get('config') if isinstance(checkpoint, dict) else None
+        self.training_config = config if isinstance(config, TrainingConfig) else None
+
         # Extract model state dictionary
         state_dict_to_load = None
         if 'model_state_dict' in checkpoint:
@@ -180,20 +185,8 @@ class KokoroTTS:
         logger.info(f"Converting text: '{text}'")
 
         try:
-            # Step 1: Process text into phoneme sequence
-            raw_processor_output = self.phoneme_processor.process_text(text)
-            phoneme_sequence = PhonemeProcessorUtils.flatten_phoneme_output(raw_processor_output)
-
-            if not phoneme_sequence:
-                logger.error(f"Phoneme processor produced no phonemes for text: '{text}'. Conversion aborted.")
-                raise ValueError("No phonemes generated from the input text.")
-
-            logger.info(f"Phonemes: {' '.join(phoneme_sequence)}")
-
-            # Step 2: Convert phonemes to numerical indices
-            phoneme_indices = PhonemeProcessorUtils.phonemes_to_indices(
-                phoneme_sequence, self.phoneme_processor.phoneme_to_id
-            )
+            # Step 1-2: Process text into phoneme sequence and convert to numerical indices
+            phoneme_indices = self._text_to_phoneme_indices(text)
             logger.debug(f"Phoneme indices (first 20): {phoneme_indices[:20]}...")
 
             # Convert to tensor and add batch dimension
@@ -226,19 +219,100 @@ class KokoroTTS:
             logger.error(f"Error in text_to_speech: {e}")
             raise
 
-    def batch_text_to_speech(self, texts: List[str], output_dir: str):
-        """Converts multiple texts to speech, saving each to the specified output directory."""
+    def stream_text_to_speech(self, text: str, chunk_frames: int = 20) -> Iterator[torch.Tensor]:
+        """
+        Yields audio chunks (1D tensors) for `text` while it is still being decoded.
+
+        Mel frames are decoded in chunks of `chunk_frames` and vocoded with overlapping
+        HiFi-GAN windows, so the first audio is available after roughly `chunk_frames`
+        frames instead of after the whole utterance. With Griffin-Lim, which cannot be
+        streamed, the audio is yielded once the mel is complete.
+        """
+        if not text:
+            logger.warning("Received empty text for conversion. Returning empty audio.")
+            return
+
+        phoneme_indices = self._text_to_phoneme_indices(text)
+        phoneme_tensor = torch.tensor(phoneme_indices, dtype=torch.long).unsqueeze(0).to(self.device)
+
+        # Same generation parameters as text_to_speech
+        mel_chunks = self.model.forward_inference_stream(
+            phoneme_indices=phoneme_tensor,
+            chunk_frames=chunk_frames,
+            max_len=400,
+            stop_threshold=0.01
+        )
+
+        if not self.vocoder_manager.uses_hifigan:
+            mel_spec = torch.cat(list(mel_chunks), dim=1).squeeze(0).cpu()
+            yield self.vocoder_manager.mel_to_audio(mel_spec)
+            return
+
+        yield from self.vocoder_manager.stream_mel_to_audio(mel_chunk.squeeze(0) for mel_chunk in mel_chunks)
+
+    def _text_to_phoneme_indices(self, text: str) -> List[int]:
+        """Process text into phoneme indices, raising ValueError if no phonemes are produced."""
+        raw_processor_output = self.phoneme_processor.process_text(text)
+        phoneme_sequence = PhonemeProcessorUtils.flatten_phoneme_output(raw_processor_output)
+
+        if not phoneme_sequence:
+            logger.error(f"Phoneme processor produced no phonemes for text: '{text}'. Conversion aborted.")
+            raise ValueError("No phonemes generated from the input text.")
+
+        logger.info(f"Phonemes: {' '.join(phoneme_sequence)}")
+
+        return PhonemeProcessorUtils.phonemes_to_indices(
+            phoneme_sequence, self.phoneme_processor.phoneme_to_id
+        )
+
+    def batch_text_to_speech(self, texts: List[str], output_dir: str, batch_size: int = 8):
+        """
+        Converts multiple texts to speech, saving each to the specified output directory.
+
+        Texts are phonemized, sorted by length to keep padding low and synthesized
+        `batch_size` at a time: one padded decoder batch and one vocoder pass per batch.
+        """
         output_dir_path = Path(output_dir)
         output_dir_path.mkdir(parents=True, exist_ok=True)
 
+        items = []
         for i, text in enumerate(texts):
-            output_path = output_dir_path / f"output_{i:03d}.wav"
             try:
-                self.text_to_speech(text, str(output_path))
-                logger.info(f"Successfully converted text {i+1} to {output_path}")
+                items.append((i, text, self._text_to_phoneme_indices(text)))
             except Exception as e:
                 logger.error(f"Failed to convert text '{text}' (item {i+1}): {e}")
 
+        # Similar lengths in a batch means less padding in the encoder and vocoder
+        items.sort(key=lambda item: len(item[2]))
+
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            try:
+                phoneme_tensor = pad_sequence(
+                    [torch.tensor(indices, dtype=torch.long) for _, _, indices in batch],
+                    batch_first=True, padding_value=0
+                ).to(self.device)
+
+                with torch.no_grad():
+                    # Same generation parameters as text_to_speech
+                    mel_batch, mel_lengths = self.model.forward_inference_batch(
+                        phoneme_indices=phoneme_tensor,
+                        max_len=400,
+                        stop_threshold=0.01
+                    )
+
+                audios = self.vocoder_manager.mel_batch_to_audio(mel_batch.cpu(), mel_lengths.cpu())
+            except Exception as e:
+                logger.error(f"Failed to convert batch of {len(batch)} texts: {e}")
+                continue
+
+            for (i, text, _), audio in zip(batch, audios):
+                output_path = output_dir_path / f"output_{i:03d}.wav"
+                if self.audio_utils.save_audio(audio, str(output_path)):
+                    logger.info(f"Successfully converted text {i+1} to {output_path}")
+                else:
+                    logger.error(f"Failed to save audio for text '{text}' (item {i+1})")
+
 def parse_arguments():
     """Parses command line arguments for the TTS inference script."""
     parser = argparse.ArgumentParser(
@@ -305,15 +379,24 @@ Examples:
     parser.add_argument(
         '--vocoder',
         type=str,
-        choices=['hifigan', 'griffin_lim'],
+        choices=['hifigan', 'hifigan_exported', 'griffin_lim'],
         default='hifigan',
-        help='Type of vocoder to use: "hifigan" (neural) or "griffin_lim" (algorithmic). Default is hifigan.'
+        help='Type of vocoder to use: "hifigan" (neural), "hifigan_exported" (TorchScript/ONNX from hifigan_export.py) '
+             'or "griffin_lim" (algorithmic). Default is hifigan.'
     )
 
     parser.add_argument(
         '--vocoder-path',
         type=str,
-        help='Path to a custom HiFi-GAN vocoder model checkpoint (.pt or .pth) if not using the default or if a specific one is required.'
+        help='Path to a custom HiFi-GAN vocoder model checkpoint (.pt or .pth) if not using the default or if a specific one is required. '
+             'For hifigan_exported: the export directory or its .ts/.onnx file.'
+    )
+
+    parser.add_argument(
+        '--batch-size', '-b',
+        type=int,
+        default=8,
+        help='Number of texts synthesized together when converting a --text-file (default: 8).'
     )
 
     return parser.parse_args()
@@ -401,7 +484,7 @@ def main():
                 output_dir_for_batch = Path("./batch_outputs") # Default to a directory if not specified properly
                 logger.info(f"Output for batch text will be saved to '{output_dir_for_batch}'")
 
-            tts.batch_text_to_speech(texts_from_file, str(output_dir_for_batch))
+            tts.batch_text_to_speech(texts_from_file, str(output_dir_for_batch), batch_size=args.batch_size)
             logger.info(f"Batch conversion complete. Audio files saved to {output_dir_for_batch}")
 
         except FileNotFoundError:
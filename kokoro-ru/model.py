@@ -1,7 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from typing import Optional, Tuple, Union
+from typing import Dict, Iterator, Optional, Tuple, Union
 from torch.utils.checkpoint import checkpoint
 import logging
 import torch.profiler
@@ -21,6 +21,8 @@ class KokoroModel(nn.Module):
     Optimized for MPS (Metal Performance Shaders) acceleration with GPU profiling
     """
 
+    CAUSAL_MASK_CACHE_STEP = 256
+
     def __init__(self, vocab_size: int, mel_dim: int = 80, hidden_dim: int = 512,
                  n_encoder_layers: int = 6, n_heads: int = 8, encoder_ff_dim: int = 2048,
                  encoder_dropout: float = 0.1, n_decoder_layers: int = 6, decoder_ff_dim: int = 2048,
@@ -38,6 +40,8 @@ class KokoroModel(nn.Module):
         self.mel_dim = mel_dim
         self.hidden_dim = hidden_dim
         self.max_decoder_seq_len = max_decoder_seq_len
+        # Causal self-attention masks per device, see _generate_square_subsequent_mask
+        self._causal_mask_cache: Dict[str, torch.Tensor] = {}
 
         # Gradient checkpointing configuration
         self.gradient_checkpointing = gradient_checkpointing
@@ -267,7 +271,11 @@ class KokoroModel(nn.Module):
 
     def _length_regulate(self, encoder_outputs, durations, text_padding_mask):
         """
-        Fixed length regulation with proper tensor dimension handling.
+        Batched length regulation: each encoder frame is repeated by its duration.
+
+        Durations are cumulatively summed into a single gather index, so there is no per-sample
+        Python loop. Padded tokens get zero duration and the tail of shorter sequences is
+        zero-filled and marked as padding (True) in the returned mask.
         """
         with torch.profiler.record_function("length_regulate"):
             # Log before length regulation (no checkpointing here)
@@ -277,80 +285,39 @@ class KokoroModel(nn.Module):
             batch_size, max_text_len, hidden_dim = encoder_outputs.shape
             device = encoder_outputs.device
 
-            # Ensure durations are positive and properly clamped
-            durations = torch.clamp(durations, min=1.0)
-
-            expanded_encoder_outputs_list = []
-            encoder_output_padding_mask_list = []
-            max_expanded_len = 0
-
-            for i in range(batch_size):
-                current_encoder_output = encoder_outputs[i]  # (L_text, D)
-                current_durations = durations[i]             # (L_text,)
-                current_text_padding_mask = text_padding_mask[i].to(torch.bool)  # (L_text,)
+            # Ensure durations are positive and properly clamped, padded tokens are not expanded
+            durations = torch.clamp(durations, min=1.0).long()
+            durations = durations.masked_fill(text_padding_mask.to(torch.bool), 0)
 
-                # Select non-padded elements
-                non_padded_indices = ~current_text_padding_mask
-
-                if not torch.any(non_padded_indices):
-                    logger.warning(f"Batch {i}: All tokens are padding, creating empty sequence")
-                    expanded_encoder_output = torch.empty(0, hidden_dim, device=device)
-                    expanded_padding_mask = torch.empty(0, dtype=torch.bool, device=device)
-                else:
-                    filtered_encoder_output = current_encoder_output[non_padded_indices]
-                    filtered_durations = current_durations[non_padded_indices]
-
-                    filtered_durations = torch.clamp(filtered_durations, min=1).long()
-
-                    try:
-                        expanded_encoder_output = torch.repeat_interleave(
-                            filtered_encoder_output, filtered_durations, dim=0
-                        )
-                        expanded_padding_mask = torch.zeros(
-                            expanded_encoder_output.shape[0], dtype=torch.bool, device=device
-                        )
-                    except Exception as e:
-                        logger.error(f"Error in repeat_interleave for batch {i}: {e}")
-                        expanded_encoder_output = torch.empty(0, hidden_dim, device=device)
-                        expanded_padding_mask = torch.empty(0, dtype=torch.bool, device=device)
-
-                expanded_encoder_outputs_list.append(expanded_encoder_output)
-                encoder_output_padding_mask_list.append(expanded_padding_mask)
-                max_expanded_len = max(max_expanded_len, expanded_encoder_output.shape[0])
+            expanded_lengths = durations.sum(dim=1)  # (B,)
+            max_expanded_len = int(expanded_lengths.max().item()) if batch_size > 0 else 0
 
             if max_expanded_len == 0:
                 logger.warning("All sequences resulted in empty expansion, creating dummy output for stability.")
-                max_expanded_len = 1
-                dummy_output = torch.zeros(1, hidden_dim, device=device, dtype=encoder_outputs.dtype)
-                dummy_mask = torch.ones(1, dtype=torch.bool, device=device)
-                expanded_encoder_outputs_list = [dummy_output] * batch_size
-                encoder_output_padding_mask_list = [dummy_mask] * batch_size
-
-            # Pad all sequences to the same length
-            final_expanded_outputs = []
-            final_padding_masks = []
-
-            for i in range(batch_size):
-                current_output = expanded_encoder_outputs_list[i]
-                current_mask = encoder_output_padding_mask_list[i]
-                current_len = current_output.shape[0]
-
-                padding_needed = max_expanded_len - current_len
-
-                if padding_needed > 0:
-                    padding_tensor = torch.zeros(
-                        padding_needed, hidden_dim, device=device, dtype=current_output.dtype
-                    )
-                    current_output = torch.cat([current_output, padding_tensor], dim=0)
-
-                    padding_mask_fill = torch.ones(padding_needed, dtype=torch.bool, device=device)
-                    current_mask = torch.cat([current_mask, padding_mask_fill], dim=0)
-
-                final_expanded_outputs.append(current_output)
-                final_padding_masks.append(current_mask)
-
-            expanded_encoder_outputs = torch.stack(final_expanded_outputs, dim=0)
-            encoder_output_padding_mask = torch.stack(final_padding_masks, dim=0)
+                expanded_encoder_outputs = torch.zeros(
+                    batch_size, 1, hidden_dim, device=device, dtype=encoder_outputs.dtype
+                )
+                encoder_output_padding_mask = torch.ones(batch_size, 1, dtype=torch.bool, device=device)
+                return expanded_encoder_outputs, encoder_output_padding_mask
+
+            # For output frame t, the source token is the number of cumulative durations <= t
+            cumulative_durations = torch.cumsum(durations, dim=1)  # (B, L_text)
+            frame_positions = torch.arange(max_expanded_len, device=device)  # (T,)
+            token_indices = torch.searchsorted(
+                cumulative_durations,
+                frame_positions.unsqueeze(0).expand(batch_size, -1).contiguous(),
+                right=True
+            )  # (B, T)
+
+            encoder_output_padding_mask = frame_positions.unsqueeze(0) >= expanded_lengths.unsqueeze(1)  # (B, T)
+
+            # Padding frames point at an appended all-zero token, so one row gather builds the output
+            padded_encoder_outputs = F.pad(encoder_outputs, (0, 0, 0, 1))  # (B, L_text + 1, D)
+            token_indices = token_indices.masked_fill(encoder_output_padding_mask, max_text_len)
+            flat_indices = token_indices + (torch.arange(batch_size, device=device) * (max_text_len + 1)).unsqueeze(1)
+            expanded_encoder_outputs = padded_encoder_outputs.reshape(-1, hidden_dim).index_select(
+                0, flat_indices.reshape(-1)
+            ).view(batch_size, max_expanded_len, hidden_dim)
 
             # Log after length regulation (no checkpointing here)
             if self.enable_profiling:
@@ -360,11 +327,57 @@ class KokoroModel(nn.Module):
 
             return expanded_encoder_outputs, encoder_output_padding_mask
 
-    @staticmethod
-    def _generate_square_subsequent_mask(sz: int, device: torch.device) -> torch.Tensor:
-        """Generates an upper-triangular matrix of -inf, used for masked self-attention."""
-        mask = torch.triu(torch.ones(sz, sz, device=device) * float('-inf'), diagonal=1)
-        return mask
+    def _length_regulate_reference(self, encoder_outputs, durations, text_padding_mask):
+        """
+        Per-sample (Python loop) length regulation.
+        Kept as the reference for benchmark_length_regulation parity checks.
+        """
+        batch_size, _, hidden_dim = encoder_outputs.shape
+        device = encoder_outputs.device
+        durations = torch.clamp(durations, min=1.0)
+
+        expanded_list = []
+        for i in range(batch_size):
+            non_padded_indices = ~text_padding_mask[i].to(torch.bool)
+            expanded_list.append(torch.repeat_interleave(
+                encoder_outputs[i][non_padded_indices],
+                torch.clamp(durations[i][non_padded_indices], min=1).long(),
+                dim=0
+            ))
+
+        max_expanded_len = max(max(expanded.shape[0] for expanded in expanded_list), 1)
+
+        final_expanded_outputs = []
+        final_padding_masks = []
+        for expanded in expanded_list:
+            padding_needed = max_expanded_len - expanded.shape[0]
+            final_expanded_outputs.append(torch.cat([
+                expanded,
+                torch.zeros(padding_needed, hidden_dim, device=device, dtype=encoder_outputs.dtype)
+            ], dim=0))
+            final_padding_masks.append(torch.cat([
+                torch.zeros(expanded.shape[0], dtype=torch.bool, device=device),
+                torch.ones(padding_needed, dtype=torch.bool, device=device)
+            ], dim=0))
+
+        return torch.stack(final_expanded_outputs, dim=0), torch.stack(final_padding_masks, dim=0)
+
+    def _generate_square_subsequent_mask(self, sz: int, device: torch.device) -> torch.Tensor:
+        """
+        Upper-triangular matrix of -inf, used for masked self-attention.
+
+        Sliced from a per-device mask that grows in steps of CAUSAL_MASK_CACHE_STEP frames
+        up to max_decoder_seq_len, so training steps and uncached decoding steps do not
+        allocate a new (sz, sz) matrix.
+        """
+        key = str(device)
+        mask = self._causal_mask_cache.get(key)
+        if mask is None or mask.shape[0] < sz:
+            step = self.CAUSAL_MASK_CACHE_STEP
+            size = max(min(self.max_decoder_seq_len, (sz + step - 1) // step * step), sz)
+            mask = torch.triu(torch.full((size, size), float('-inf'), device=device), diagonal=1)
+            self._causal_mask_cache[key] = mask
+        return mask[:sz, :sz]
 
     def forward_training(
         self,
@@ -507,15 +520,62 @@ class KokoroModel(nn.Module):
                     logger.error(f"GPU Memory at error: {self.profiler.get_memory_summary()}")
                 raise e
 
+    def _decode_step(self, t: int, decoder_input_mel: torch.Tensor, memory: torch.Tensor,
+                     memory_key_padding_mask: Optional[torch.Tensor] = None,
+                     decoder_cache: Optional[list] = None,
+                     decoder_inputs: Optional[list] = None) -> torch.Tensor:
+        """
+        Run one autoregressive decoder step and return the decoder output for the newest frame (B, 1, D).
+
+        With decoder_cache (from self.decoder.init_cache()) only the newest frame is projected and
+        passed through the decoder, attending to the cached keys/values of earlier frames.
+        Otherwise the frame is appended to decoder_inputs and the whole history is recomputed.
+        """
+        if decoder_cache is not None:
+            mel_projected_t = self.mel_projection_in(decoder_input_mel)
+            decoder_input_with_pe = self.encoder_positional_encoding(mel_projected_t, seq_offset=t)
+            return self.decoder(
+                tgt=decoder_input_with_pe,
+                memory=memory,
+                tgt_mask=None,
+                memory_key_padding_mask=memory_key_padding_mask,
+                tgt_key_padding_mask=None,
+                cache=decoder_cache
+            )
+
+        decoder_inputs.append(decoder_input_mel)
+        decoder_input_seq = self.mel_projection_in(torch.cat(decoder_inputs, dim=1))
+        decoder_input_seq_with_pe = self.encoder_positional_encoding(decoder_input_seq, seq_offset=0)
+
+        current_seq_len = decoder_input_seq.shape[1]
+        tgt_mask = self._generate_square_subsequent_mask(current_seq_len, memory.device)
+
+        decoder_outputs = self.decoder(
+            tgt=decoder_input_seq_with_pe,
+            memory=memory,
+            tgt_mask=tgt_mask,
+            memory_key_padding_mask=memory_key_padding_mask,
+            tgt_key_padding_mask=None
+        )
+        return decoder_outputs[:, -1:, :]
+
     def forward_inference(self, phoneme_indices: torch.Tensor, max_len: int = 4000,
                          stop_threshold: float = 0.5,
-                         text_padding_mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+                         text_padding_mask: Optional[torch.Tensor] = None,
+                         use_kv_cache: bool = True) -> torch.Tensor:
         """
         Inference mode (gradient checkpointing automatically disabled)
+
+        Args:
+            use_kv_cache: Decode incrementally with per-layer self-attention key/value caches,
+                processing only the newest frame at each step. Cross-attention keys/values of the
+                encoder memory are projected once per utterance and reused. If False, the whole
+                frame history is re-run through the decoder at every step (quadratic in utterance length).
         """
         with torch.profiler.record_function("forward_inference"):
             if phoneme_indices.size(0) > 1:
-                logger.warning("Inference with stop token is most reliable with batch_size=1.")
+                logger.warning("Inference with stop token is most reliable with batch_size=1; "
+                               "use forward_inference_batch for several utterances.")
 
             batch_size = phoneme_indices.size(0)
             device = phoneme_indices.device
@@ -563,6 +623,8 @@ class KokoroModel(nn.Module):
                     # Initialize generation
                     generated_mels = []
                     decoder_input_mel = torch.zeros(batch_size, 1, self.mel_dim, device=device)
+                    decoder_cache = self.decoder.init_cache() if use_kv_cache else None
+                    decoder_inputs = []
 
                     # Generation loop (no checkpointing needed in eval mode)
                     generation_start_time = time.time()
@@ -571,31 +633,11 @@ class KokoroModel(nn.Module):
 
                         with torch.profiler.record_function(f"inference_decode_step_{t}"):
                             try:
-                                mel_projected_t = self.mel_projection_in(decoder_input_mel)
-
-                                if t == 0:
-                                    decoder_input_seq = mel_projected_t
-                                else:
-                                    previous_mels = torch.cat(generated_mels, dim=1)
-                                    previous_projected = self.mel_projection_in(previous_mels)
-                                    decoder_input_seq = torch.cat([previous_projected, mel_projected_t], dim=1)
-
-                                decoder_input_seq_with_pe = self.encoder_positional_encoding(
-                                    decoder_input_seq, seq_offset=0
+                                decoder_out_t = self._decode_step(
+                                    t, decoder_input_mel, expanded_encoder_outputs,
+                                    encoder_output_padding_mask,
+                                    decoder_cache=decoder_cache, decoder_inputs=decoder_inputs
                                 )
-
-                                current_seq_len = decoder_input_seq.shape[1]
-                                tgt_mask = self._generate_square_subsequent_mask(current_seq_len, device)
-
-                                decoder_outputs = self.decoder(
-                                    tgt=decoder_input_seq_with_pe,
-                                    memory=expanded_encoder_outputs,
-                                    tgt_mask=tgt_mask,
-                                    memory_key_padding_mask=encoder_output_padding_mask,
-                                    tgt_key_padding_mask=None
-                                )
-
-                                decoder_out_t = decoder_outputs[:, -1:, :]
                                 mel_pred_t = self.mel_projection_out(decoder_out_t)
                                 generated_mels.append(mel_pred_t)
 
@@ -648,6 +690,147 @@ class KokoroModel(nn.Module):
                         logger.error(f"GPU Memory at error: {self.profiler.get_memory_summary()}")
                     return torch.empty(batch_size, 0, self.mel_dim, device=device)
 
+    def forward_inference_stream(self, phoneme_indices: torch.Tensor, chunk_frames: int = 20,
+                                 max_len: int = 4000, stop_threshold: float = 0.5,
+                                 text_padding_mask: Optional[torch.Tensor] = None) -> Iterator[torch.Tensor]:
+        """
+        Streaming variant of forward_inference (batch_size=1, KV cache): yields mel chunks
+        (1, <=chunk_frames, n_mels) as they are decoded, so vocoding can start before the
+        utterance is finished. The concatenated chunks equal the forward_inference output.
+        """
+        self.eval()
+
+        # Grad mode is thread-local, so no_grad must not stay active across the yields
+        with torch.no_grad():
+            if text_padding_mask is None:
+                text_padding_mask = (phoneme_indices == 0).to(torch.bool)
+            else:
+                text_padding_mask = text_padding_mask.to(torch.bool)
+
+            text_encoded = self.encode_text(phoneme_indices, mask=text_padding_mask)
+            predicted_log_durations = self._predict_durations(text_encoded)
+            durations_for_length_regulate = torch.clamp(torch.exp(predicted_log_durations), min=1.0).long()
+            memory, memory_padding_mask = self._length_regulate(
+                text_encoded, durations_for_length_regulate, text_padding_mask
+            )
+
+        # Same generation bounds as forward_inference
+        expected_length = memory.shape[1]
+        min_expected_length = max(10, expected_length // 3)
+        max_expected_length = min(max_len, expected_length * 2, 800)
+
+        decoder_input_mel = torch.zeros(1, 1, self.mel_dim, device=phoneme_indices.device)
+        decoder_cache = self.decoder.init_cache()
+        pending = []
+
+        for t in range(max_expected_length):
+            with torch.no_grad():
+                decoder_out_t = self._decode_step(
+                    t, decoder_input_mel, memory, memory_padding_mask, decoder_cache=decoder_cache
+                )
+                mel_pred_t = self.mel_projection_out(decoder_out_t)
+                stop_probability = torch.sigmoid(self.stop_token_predictor(decoder_out_t)).item()
+            pending.append(mel_pred_t)
+
+            stop = t >= min_expected_length and (
+                stop_probability > stop_threshold or (t >= expected_length and stop_probability > 0.1)
+            )
+            if stop:
+                logger.info(f"Stopping at frame {t} (stop_prob: {stop_probability:.4f})")
+                break
+
+            if len(pending) >= chunk_frames:
+                yield torch.cat(pending, dim=1)
+                pending = []
+            decoder_input_mel = mel_pred_t
+
+        if pending:
+            yield torch.cat(pending, dim=1)
+
+    def forward_inference_batch(self, phoneme_indices: torch.Tensor, max_len: int = 4000,
+                                stop_threshold: float = 0.5,
+                                text_padding_mask: Optional[torch.Tensor] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Batched inference for several utterances of different lengths.
+
+        Same generation rules as forward_inference, applied per sample: every sequence has its own
+        length bounds and stop decision. Finished sequences are removed from the decoder batch
+        (and its key/value cache), so they stop costing compute.
+
+        Args:
+            phoneme_indices: (B, L) zero-padded phoneme indices
+        Returns:
+            mel_output: (B, T_max, n_mels), frames past each sample's length are zero
+            mel_lengths: (B,) number of generated frames per sample
+        """
+        with torch.profiler.record_function("forward_inference_batch"):
+            batch_size = phoneme_indices.size(0)
+            device = phoneme_indices.device
+
+            self.eval()
+
+            with torch.no_grad():
+                if text_padding_mask is None:
+                    text_padding_mask = (phoneme_indices == 0).to(torch.bool)
+                else:
+                    text_padding_mask = text_padding_mask.to(torch.bool)
+
+                text_encoded = self.encode_text(phoneme_indices, mask=text_padding_mask)
+                predicted_log_durations = self._predict_durations(text_encoded)
+                durations_for_length_regulate = torch.clamp(torch.exp(predicted_log_durations), min=1.0).long()
+                memory, memory_padding_mask = self._length_regulate(
+                    text_encoded, durations_for_length_regulate, text_padding_mask
+                )
+
+                # Per-sample generation bounds (see forward_inference)
+                expected_lengths = (~memory_padding_mask).sum(dim=1)
+                min_lengths = torch.clamp(expected_lengths // 3, min=10)
+                max_lengths = torch.clamp(torch.clamp(expected_lengths * 2, max=800), max=max_len)
+                max_steps = int(max_lengths.max().item())
+
+                mel_output = torch.zeros(batch_size, max_steps, self.mel_dim, device=device)
+                mel_lengths = max_lengths.clone()
+
+                # Rows of the decoder batch -> original sample indices
+                active = torch.arange(batch_size, device=device)
+                decoder_input_mel = torch.zeros(batch_size, 1, self.mel_dim, device=device)
+                decoder_cache = self.decoder.init_cache()
+
+                generation_start_time = time.time()
+                for t in range(max_steps):
+                    decoder_out_t = self._decode_step(
+                        t, decoder_input_mel, memory, memory_padding_mask, decoder_cache=decoder_cache
+                    )
+                    mel_pred_t = self.mel_projection_out(decoder_out_t)
+                    mel_output[active, t] = mel_pred_t[:, 0]
+
+                    stop_probability = torch.sigmoid(self.stop_token_predictor(decoder_out_t)).view(-1)
+                    past_min = t >= min_lengths[active]
+                    stop = (t + 1 >= max_lengths[active])
+                    stop |= past_min & (stop_probability > stop_threshold)
+                    stop |= past_min & (t >= expected_lengths[active]) & (stop_probability > 0.1)
+
+                    if stop.any():
+                        mel_lengths[active[stop]] = t + 1
+                        keep = (~stop).nonzero(as_tuple=True)[0]
+                        if keep.numel() == 0:
+                            break
+                        active = active[keep]
+                        memory = memory.index_select(0, keep)
+                        memory_padding_mask = memory_padding_mask.index_select(0, keep)
+                        mel_pred_t = mel_pred_t.index_select(0, keep)
+                        self.decoder.reorder_cache(decoder_cache, keep)
+
+                    decoder_input_mel = mel_pred_t
+
+                generation_time = time.time() - generation_start_time
+                total_frames = int(mel_lengths.sum().item())
+                logger.info(f"Generated {total_frames} mel frames for {batch_size} utterances in {generation_time:.2f}s "
+                            f"({total_frames / max(generation_time, 1e-9):.1f} frames/s)")
+
+                mel_output = mel_output[:, :int(mel_lengths.max().item())]
+                return mel_output, mel_lengths
+
     def forward(
         self,
         phoneme_indices: torch.Tensor,
@@ -1003,6 +1186,128 @@ class KokoroModel(nn.Module):
 
         return results
 
+    def benchmark_incremental_decoding(self, frame_counts: Tuple[int, ...] = (100, 400, 800),
+                                       text_len: int = 50, compare_full_recompute: bool = True) -> dict:
+        """
+        Benchmark autoregressive decoding speed with and without the key/value cache on CPU
+
+        Args:
+            frame_counts: Utterance lengths (in mel frames) to decode; stop tokens are ignored
+            text_len: Number of random phonemes in the synthetic input
+            compare_full_recompute: Also time the full-history recompute loop and check that
+                both paths produce the same mels
+
+        Returns:
+            Dictionary with frames/s per utterance length and decoding mode
+        """
+        original_device = next(self.parameters()).device
+        self.to('cpu')
+        self.eval()
+
+        results = {}
+        with torch.no_grad():
+            sample_phonemes = torch.randint(1, self.vocab_size, (1, text_len))
+            text_padding_mask = torch.zeros(1, text_len, dtype=torch.bool)
+            text_encoded = self.encode_text(sample_phonemes, mask=text_padding_mask)
+            durations = torch.full((1, text_len), 4, dtype=torch.long)
+            memory, memory_mask = self._length_regulate(text_encoded, durations, text_padding_mask)
+
+            def run_decoder(num_frames: int, use_kv_cache: bool):
+                decoder_cache = self.decoder.init_cache() if use_kv_cache else None
+                decoder_inputs = []
+                decoder_input_mel = torch.zeros(1, 1, self.mel_dim)
+                mels = []
+                start_time = time.time()
+                for t in range(num_frames):
+                    decoder_out_t = self._decode_step(
+                        t, decoder_input_mel, memory, memory_mask,
+                        decoder_cache=decoder_cache, decoder_inputs=decoder_inputs
+                    )
+                    decoder_input_mel = self.mel_projection_out(decoder_out_t)
+                    mels.append(decoder_input_mel)
+                return torch.cat(mels, dim=1), time.time() - start_time
+
+            for num_frames in frame_counts:
+                cached_mels, cached_time = run_decoder(num_frames, use_kv_cache=True)
+                entry = {'kv_cache_frames_per_sec': num_frames / cached_time}
+
+                if compare_full_recompute:
+                    full_mels, full_time = run_decoder(num_frames, use_kv_cache=False)
+                    entry['full_recompute_frames_per_sec'] = num_frames / full_time
+                    entry['speedup'] = full_time / cached_time
+                    entry['max_abs_diff'] = (cached_mels - full_mels).abs().max().item()
+
+                results[num_frames] = entry
+
+        self.to(original_device)
+
+        logger.info("Incremental Decoding Benchmark Results (CPU):")
+        for num_frames, entry in results.items():
+            line = f"  {num_frames} frames: KV cache {entry['kv_cache_frames_per_sec']:.1f} frames/s"
+            if compare_full_recompute:
+                line += (f", full recompute {entry['full_recompute_frames_per_sec']:.1f} frames/s"
+                         f" (x{entry['speedup']:.1f}, max abs diff {entry['max_abs_diff']:.2e})")
+            logger.info(line)
+
+        return results
+
+    def benchmark_length_regulation(self, batch_sizes: Tuple[int, ...] = (1, 16, 64),
+                                    text_len: int = 200, max_duration: int = 12,
+                                    num_iterations: int = 20) -> dict:
+        """
+        Micro-benchmark of the batched length regulator against the per-sample reference loop
+
+        Args:
+            batch_sizes: Batch sizes to benchmark
+            text_len: Maximum phoneme sequence length (samples get random lengths up to this)
+            max_duration: Maximum per-phoneme duration in frames
+            num_iterations: Number of iterations to average over
+
+        Returns:
+            Dictionary with average time per call for both implementations and an output parity check
+        """
+        device = next(self.parameters()).device
+        results = {}
+
+        with torch.no_grad():
+            for batch_size in batch_sizes:
+                encoder_outputs = torch.randn(batch_size, text_len, self.hidden_dim, device=device)
+                durations = torch.randint(1, max_duration + 1, (batch_size, text_len), device=device).float()
+                lengths = torch.randint(text_len // 2, text_len + 1, (batch_size,), device=device)
+                text_padding_mask = torch.arange(text_len, device=device).unsqueeze(0) >= lengths.unsqueeze(1)
+
+                timings = {}
+                outputs = {}
+                for name, fn in (('batched', self._length_regulate),
+                                 ('reference_loop', self._length_regulate_reference)):
+                    outputs[name] = fn(encoder_outputs, durations, text_padding_mask)
+                    if device.type == 'cuda':
+                        torch.cuda.synchronize()
+                    start_time = time.time()
+                    for _ in range(num_iterations):
+                        fn(encoder_outputs, durations, text_padding_mask)
+                    if device.type == 'cuda':
+                        torch.cuda.synchronize()
+                    timings[name] = (time.time() - start_time) / num_iterations
+
+                results[batch_size] = {
+                    'batched_ms': timings['batched'] * 1000,
+                    'reference_loop_ms': timings['reference_loop'] * 1000,
+                    'speedup': timings['reference_loop'] / timings['batched'] if timings['batched'] > 0 else 0,
+                    'outputs_match': (
+                        torch.equal(outputs['batched'][0], outputs['reference_loop'][0]) and
+                        torch.equal(outputs['batched'][1], outputs['reference_loop'][1])
+                    )
+                }
+
+        logger.info("Length Regulation Benchmark Results:")
+        for batch_size, entry in results.items():
+            logger.info(f"  batch {batch_size}: batched {entry['batched_ms']:.2f} ms, "
+                        f"loop {entry['reference_loop_ms']:.2f} ms (x{entry['speedup']:.1f}), "
+                        f"outputs match: {entry['outputs_match']}")
+
+        return results
+
     def get_logging_strategy_info(self) -> dict:
         """Get information about current logging strategy based on checkpointing state"""
         strategy_info = {
@@ -1,9 +1,16 @@
+import os
 import re
+import json
+import hashlib
 import unicodedata
 from typing import Dict, List, Optional, Set, Tuple, Union
 from dataclasses import dataclass
-from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import logging
+import numpy as np
+
+from stress_lexicon import StressLexicon, is_compiled_lexicon
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -32,13 +39,24 @@ class RussianPhonemeProcessor:
     # Class constants to avoid repeated dict creation
     STRESS_MARKS = ['\u0301', '\u0300', '\u0341']  # Acute, grave, combining acute
     VOWEL_LETTERS = {'а', 'о', 'у', 'ы', 'э', 'я', 'ё', 'ю', 'и', 'е'}
+    _IPA_DROP_TOKENS = frozenset(STRESS_MARKS + ['ˈ', 'ˌ', 'ʲ'])  # Never emitted as standalone phonemes
+
+    # normalize_text keeps only these characters ('ё' is always stressed, so it becomes 'е' + stress
+    # mark for consistent handling; 'й' decomposes to 'и' + breve under NFD and the breve is dropped)
+    _NORMALIZE_DROP_RE = re.compile('[^абвгдежзиклмнопрстуфхцчшщъыьэюя ' + ''.join(STRESS_MARKS) + ']+')
+
+    DEFAULT_WORD_CACHE_SIZE = 100000
 
-    def __init__(self, stress_dict_path: Optional[str] = None):
+    def __init__(self, stress_dict_path: Optional[str] = None, word_cache_size: int = DEFAULT_WORD_CACHE_SIZE):
         """
         Initialize the processor.
 
         Args:
-            stress_dict_path: Optional path to external stress dictionary
+            stress_dict_path: Optional path to external stress dictionary, either a TSV
+                (word<TAB>stress) or a lexicon compiled with stress_lexicon.py, which is
+                memory-mapped and consulted lazily instead of being parsed
+            word_cache_size: Maximum number of words kept in the word -> (phonemes, stress) cache
+                (least recently used entries are evicted; 0 disables caching)
         """
         # Vowel mappings (default, before reduction)
         self.vowels = {
@@ -77,6 +95,12 @@ class RussianPhonemeProcessor:
         }
 
         # Load stress patterns
+        self.stress_lexicon: Optional[StressLexicon] = None
+        if stress_dict_path and is_compiled_lexicon(stress_dict_path):
+            self.stress_lexicon = StressLexicon(stress_dict_path)
+            stress_dict_path = None
+        # TSV dictionary merged into stress_patterns (None with a compiled lexicon)
+        self.stress_dict_path = stress_dict_path
         self.stress_patterns = self._load_stress_patterns(stress_dict_path)
 
         # Pronunciation exceptions (these are full IPA strings)
@@ -90,11 +114,27 @@ class RussianPhonemeProcessor:
             'здравствуйте': 'zdrastvujtʲe' # Explicitly added based on expected output
         }
 
+        # Longest-match IPA tokenizer (used by _build_vocab and exception lookups)
+        self._ipa_token_re = self._build_ipa_tokenizer()
+
         # Build vocabulary after all mappings are set
         self.phoneme_to_id = self._build_vocab()
 
-        # Cache for processed words to improve performance
-        self._word_cache: Dict[str, Tuple[List[str], StressInfo]] = {}
+        # Per-instance LRU cache for processed words to improve performance
+        self.word_cache_size = word_cache_size
+        self._word_cache: "OrderedDict[str, Tuple[List[str], StressInfo]]" = OrderedDict()
+        self._word_cache_hits = 0
+        self._word_cache_misses = 0
+
+    def __setstate__(self, state: Dict):
+        """Fill in attributes missing from processors pickled by older versions."""
+        self.__dict__.update(state)
+        self.__dict__.setdefault('word_cache_size', self.DEFAULT_WORD_CACHE_SIZE)
+        self._word_cache = OrderedDict(self.__dict__.get('_word_cache', {}))
+        self.__dict__.setdefault('_word_cache_hits', 0)
+        self.__dict__.setdefault('_word_cache_misses', 0)
+        self.__dict__.setdefault('stress_lexicon', None)
+        self.__dict__.setdefault('stress_dict_path', None)
 
     def _load_stress_patterns(self, dict_path: Optional[str] = None) -> Dict[str, int]:
         """
@@ -145,26 +185,58 @@ class RussianPhonemeProcessor:
 
         return patterns
 
-    @lru_cache(maxsize=1000)
+    def _lookup_stress(self, word: str) -> Optional[int]:
+        """
+        Stressed syllable of a clean lowercase word from the compiled lexicon or the built-in patterns.
+        The lexicon takes precedence, like a TSV dictionary, whose entries override the built-in ones.
+        """
+        if self.stress_lexicon is not None:
+            syllable_pos = self.stress_lexicon.get_stress(word)
+            if syllable_pos is not None:
+                return syllable_pos
+        return self.stress_patterns.get(word)
+
+    def _lookup_ipa(self, word: str) -> Optional[str]:
+        """Full IPA pronunciation of a clean lowercase word from the exceptions or the compiled lexicon."""
+        ipa_string = self.exceptions.get(word)
+        if ipa_string is None and self.stress_lexicon is not None:
+            entry = self.stress_lexicon.lookup(word)
+            if entry is not None:
+                ipa_string = entry[1]
+        return ipa_string
+
     def normalize_text(self, text: str) -> str:
         """
         Normalize Russian text for phoneme processing.
-        Cached for performance on repeated texts.
+
+        Single pass over C-level string operations: lowercase, 'ё'/'й' replacement,
+        NFD only when the text still contains composed characters, one compiled regex
+        dropping everything but Cyrillic letters, spaces and stress marks, then whitespace
+        collapsing. Output is identical to _normalize_text_reference.
         """
         if not text:
             return ""
 
-        # Convert to lowercase
-        text = text.lower()
+        # Lowercase, then 'ё' -> 'е' + stress mark and 'й' -> 'и' (its NFD breve is dropped below).
+        # Two str.replace calls are much faster than str.translate with a dict on Cyrillic text.
+        text = text.lower().replace('ё', 'е\u0301').replace('й', 'и')
 
-        # Handle 'ё' - it's always stressed 'о' but we convert it to 'е' with stress mark for consistent handling
-        text = text.replace('ё', 'е́')
+        # Normalize Unicode only if needed: separate base characters from combining marks
+        if not unicodedata.is_normalized('NFD', text):
+            text = unicodedata.normalize('NFD', text)
+
+        # Keep only Cyrillic letters, spaces and stress marks; normalize whitespace
+        return ' '.join(self._NORMALIZE_DROP_RE.sub('', text).split())
 
-        # Normalize Unicode: separate base characters from combining marks
+    def _normalize_text_reference(self, text: str) -> str:
+        """Original character-by-character normalizer; kept for validation/benchmarking."""
+        if not text:
+            return ""
+
+        text = text.lower()
+        text = text.replace('ё', 'е́')
         text = unicodedata.normalize('NFD', text)
 
-        # Remove combining marks that are NOT stress marks
-        # Keep only Cyrillic letters, allowed punctuation (space), and stress marks
         allowed_chars_set = set('абвгдежзийклмнопрстуфхцчшщъыьэюя ')
         clean_text_chars = []
         for char in text:
@@ -172,19 +244,36 @@ class RussianPhonemeProcessor:
                 clean_text_chars.append(char)
             elif char in self.STRESS_MARKS:
                 clean_text_chars.append(char)
-            # else: skip other non-allowed combining marks or punctuation
 
         text = ''.join(clean_text_chars)
-
-        # Remove any remaining punctuation that wasn't filtered by the NFD and allowed_chars logic
-        # and wasn't a stress mark. Using a more targeted regex.
         text = re.sub(r'[^\w\s' + ''.join(re.escape(m) for m in self.STRESS_MARKS) + r']', ' ', text)
-
-        # Normalize whitespace (multiple spaces to single space, trim)
         text = re.sub(r'\s+', ' ', text).strip()
 
         return text
 
+    def benchmark_normalize_text(self, texts: List[str], num_iterations: int = 5) -> Dict:
+        """Compare normalize_text with the reference implementation (speed and output equality)."""
+        import time
+
+        mismatches = sum(self.normalize_text(text) != self._normalize_text_reference(text) for text in texts)
+
+        def time_normalizer(normalize) -> float:
+            start = time.perf_counter()
+            for _ in range(num_iterations):
+                for text in texts:
+                    normalize(text)
+            return (time.perf_counter() - start) / num_iterations
+
+        reference_s = time_normalizer(self._normalize_text_reference)
+        fast_s = time_normalizer(self.normalize_text)
+        return {
+            'num_texts': len(texts),
+            'mismatches': mismatches,
+            'reference_s': reference_s,
+            'fast_s': fast_s,
+            'speedup': reference_s / max(fast_s, 1e-12),
+        }
+
     def detect_stress(self, word: str) -> StressInfo:
         """
         Detect stress position in a Russian word.
@@ -220,8 +309,8 @@ class RussianPhonemeProcessor:
 
         # Attempt 2: Check dictionary after removing all marks
         word_for_dict_lookup = re.sub(r'[\u0300-\u036f]', '', word).lower()
-        if word_for_dict_lookup in self.stress_patterns:
-            syllable_pos = self.stress_patterns[word_for_dict_lookup]
+        syllable_pos = self._lookup_stress(word_for_dict_lookup)
+        if syllable_pos is not None:
             vowel_index = self._vowel_index_from_syllable(word_for_dict_lookup, syllable_pos)
             return StressInfo(
                 position=syllable_pos,
@@ -515,25 +604,40 @@ class RussianPhonemeProcessor:
         return self.vowels[char] # Default vowel mapping
 
 
-    @lru_cache(maxsize=500)
     def process_word(self, word: str) -> Tuple[List[str], StressInfo]:
         """Process a single word and return phonemes with stress info (cached)"""
+        cached = self._word_cache.get(word)
+        if cached is not None:
+            self._word_cache_hits += 1
+            self._word_cache.move_to_end(word)
+            return cached
+
+        self._word_cache_misses += 1
+        result = self._process_word_uncached(word)
+        if self.word_cache_size > 0:
+            self._word_cache[word] = result
+            if len(self._word_cache) > self.word_cache_size:
+                self._word_cache.popitem(last=False)
+        return result
+
+    def _process_word_uncached(self, word: str) -> Tuple[List[str], StressInfo]:
+        """Process a single word and return phonemes with stress info"""
         if not word:
             return [], StressInfo(0, 0, False)
 
         # Remove explicit stress marks for consistent processing internally
         word_for_lookup = re.sub(r'[\u0300-\u036f]', '', word).lower()
 
-        # Check for full word exceptions first on the cleaned word
-        if word_for_lookup in self.exceptions:
-            ipa_string = self.exceptions[word_for_lookup]
+        # Check for full word exceptions (or lexicon IPA) first on the cleaned word
+        ipa_string = self._lookup_ipa(word_for_lookup)
+        if ipa_string is not None:
             tokenized_ipa = self._tokenize_ipa_string(ipa_string)
 
             # For exceptions, try to get stress info from the stress_patterns dictionary
             # if available, otherwise default. This provides more accurate stress info
             # for words handled by exceptions.
-            if word_for_lookup in self.stress_patterns:
-                syllable_pos = self.stress_patterns[word_for_lookup]
+            syllable_pos = self._lookup_stress(word_for_lookup)
+            if syllable_pos is not None:
                 vowel_index = self._vowel_index_from_syllable(word_for_lookup, syllable_pos)
                 stress_info = StressInfo(
                     position=syllable_pos,
@@ -577,56 +681,64 @@ class RussianPhonemeProcessor:
             logger.error(f"Error processing word '{word}': {e}")
             return [], StressInfo(0, 0, False)
 
+    # Multi-character phonemes beyond the palatalized consonants
+    MULTI_CHAR_IPA = [
+        'ts', 'tʃ', 'ʃtʃ', 'dʑ', 'dz', 'tɕ', 'dʑ', # Affricates and their palatalized/voiced forms
+        'ɐ', 'ə', 'ɪ', 'ɨ', # Reduced vowels
+        'ja', 'jo', 'ju', 'je', # Iotated vowels (base forms)
+        'stf' # Specific clusters like 'здравствуйте' part
+    ]
+
+    def _build_ipa_tokenizer(self) -> "re.Pattern":
+        """
+        Compile the IPA tokenizer: one alternation of all multi-character phonemes,
+        longest first, with a single-character fallback. Python's regex alternation
+        is ordered, so this is the same longest-match rule as scanning the list.
+        """
+        multi_char_phonemes = sorted(
+            list(self.palatalized.values()) + self.MULTI_CHAR_IPA,
+            key=len,
+            reverse=True # Match longest sequence first
+        )
+        alternatives = [re.escape(ph) for ph in dict.fromkeys(multi_char_phonemes)]
+        return re.compile('|'.join(alternatives + ['.']), re.DOTALL)
+
     def _tokenize_ipa_string(self, ipa_string: str) -> List[str]:
         """
         Tokenize an IPA string into individual phonemes.
-        Improved version with better multi-character phoneme handling.
+        Uses the precompiled longest-match tokenizer (built once per processor).
         """
         if not ipa_string:
             return []
 
-        phonemes = []
-        i = 0
+        token_re = self.__dict__.get('_ipa_token_re')
+        if token_re is None:
+            # Processors unpickled from before the tokenizer was precompiled
+            token_re = self._ipa_token_re = self._build_ipa_tokenizer()
 
-        # Define multi-character phonemes (longest first).
-        # Include all possible palatalized consonants, affricates, and reduced vowels.
-        multi_char_phonemes = sorted(
-            list(self.palatalized.values()) + # e.g., 'bʲ', 'dʲ'
-            ['ts', 'tʃ', 'ʃtʃ', 'dʑ', 'dz', 'tɕ', 'dʑ', # Affricates and their palatalized/voiced forms
-             'ɐ', 'ə', 'ɪ', 'ɨ', # Reduced vowels
-             'ja', 'jo', 'ju', 'je', # Iotated vowels (base forms)
-             'stf' # Specific clusters like 'здравствуйте' part
-            ],
-            key=len,
-            reverse=True # Match longest sequence first
-        )
+        # Remove isolated stress marks and 'ʲ' if they were tokenized alone.
+        # Stress marks are typically applied *after* phoneme sequence is determined for TTS.
+        return [p for p in token_re.findall(ipa_string) if p not in self._IPA_DROP_TOKENS]
 
-        # Single characters (for fallback)
-        single_chars = set('pbvmfnlrkgxdʒʃʐzvstchwiaeouɨɐəɪˈˌ') # Common IPA single chars including vowels and stress marks
+    def _tokenize_ipa_string_reference(self, ipa_string: str) -> List[str]:
+        """Original per-position scan over all multi-character phonemes; kept for benchmarking/validation."""
+        if not ipa_string:
+            return []
+
+        phonemes = []
+        i = 0
+        multi_char_phonemes = sorted(list(self.palatalized.values()) + self.MULTI_CHAR_IPA, key=len, reverse=True)
 
         while i < len(ipa_string):
-            matched = False
-            # Try to match longest possible phoneme first
             for mc_ph in multi_char_phonemes:
                 if ipa_string.startswith(mc_ph, i):
                     phonemes.append(mc_ph)
                     i += len(mc_ph)
-                    matched = True
                     break
+            else:
+                phonemes.append(ipa_string[i])
+                i += 1
 
-            if not matched:
-                # If not a multi-character phoneme, try single character
-                char = ipa_string[i]
-                # Basic check: if it's a known single IPA char or a diacritic
-                if char in single_chars or unicodedata.category(char) == 'Mn': # Mn for combining marks
-                    phonemes.append(char)
-                    i += 1
-                else: # Fallback for unknown characters (e.g., if a new char is introduced)
-                    phonemes.append(char)
-                    i += 1
-
-        # Post-processing: remove isolated stress marks and 'ʲ' if they were accidentally tokenized alone
-        # Stress marks are typically applied *after* phoneme sequence is determined for TTS.
         return [p for p in phonemes if p and p not in self.STRESS_MARKS and p != 'ˈ' and p != 'ˌ' and p != 'ʲ']
 
     def process_text(self, text: str) -> List[Tuple[str, List[str], StressInfo]]:
@@ -734,8 +846,121 @@ class RussianPhonemeProcessor:
                     logger.warning(f"Unknown phoneme '{phoneme}' encountered in word '{word}'. Skipping.")
         return indices
 
-    def to_dict(self) -> Dict:
-        """Serialize processor state to dictionary (for saving/loading)"""
+    def text_to_indices_batch(self, texts: List[str], workers: Optional[int] = None,
+                              chunk_size: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert many texts to phoneme indices, optionally in parallel worker processes.
+
+        Returns a CSR-style pair: a flat int32 array of all indices and int64 offsets of
+        length len(texts) + 1, so the indices of text i are indices[offsets[i]:offsets[i + 1]].
+
+        Args:
+            workers: Number of worker processes (None or 1 runs in this process)
+            chunk_size: Texts sent to a worker per task
+        """
+        chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+        if workers is None or workers <= 1 or len(chunks) <= 1:
+            results = [self._text_to_indices_chunk(chunk) for chunk in chunks]
+        else:
+            # Each worker gets its own copy of this processor (including its warm word cache)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                     initargs=(self,)) as executor:
+                results = list(executor.map(_phonemize_chunk, chunks))
+
+        lengths = np.zeros(len(texts) + 1, dtype=np.int64)
+        if results:
+            lengths[1:] = np.concatenate([chunk_lengths for _, chunk_lengths in results])
+            indices = np.concatenate([chunk_indices for chunk_indices, _ in results])
+        else:
+            indices = np.zeros(0, dtype=np.int32)
+        return indices, np.cumsum(lengths)
+
+    def _text_to_indices_chunk(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Flat int32 indices and per-text lengths for a chunk of texts."""
+        per_text = [self.text_to_indices(text) for text in texts]
+        lengths = np.fromiter((len(indices) for indices in per_text), dtype=np.int64, count=len(per_text))
+        flat = np.fromiter((idx for indices in per_text for idx in indices), dtype=np.int32, count=int(lengths.sum()))
+        return flat, lengths
+
+    def benchmark_text_to_indices(self, texts: List[str], num_iterations: int = 3) -> Dict:
+        """
+        Benchmark the compiled IPA tokenizer against the original scan, both on the IPA
+        strings produced for `texts` and end-to-end in text_to_indices (cold caches).
+        """
+        import time
+
+        ipa_strings = [self.to_ipa(phonemes) for text in texts for _, phonemes, _ in self.process_text(text)]
+        ipa_strings += list(self.exceptions.values())
+
+        mismatches = sum(
+            self._tokenize_ipa_string(ipa) != self._tokenize_ipa_string_reference(ipa) for ipa in ipa_strings
+        )
+
+        def time_tokenizer(tokenize) -> float:
+            start = time.perf_counter()
+            for _ in range(num_iterations):
+                for ipa in ipa_strings:
+                    tokenize(ipa)
+            return (time.perf_counter() - start) / num_iterations
+
+        def time_text_to_indices() -> float:
+            start = time.perf_counter()
+            for _ in range(num_iterations):
+                self.clear_cache()
+                for text in texts:
+                    self.text_to_indices(text)
+            return (time.perf_counter() - start) / num_iterations
+
+        results = {
+            'num_texts': len(texts),
+            'num_ipa_strings': len(ipa_strings),
+            'tokenizer_mismatches': mismatches,
+            'tokenizer_reference_s': time_tokenizer(self._tokenize_ipa_string_reference),
+            'tokenizer_compiled_s': time_tokenizer(self._tokenize_ipa_string),
+        }
+
+        # End-to-end, temporarily routing text_to_indices through the reference tokenizer
+        self._tokenize_ipa_string = self._tokenize_ipa_string_reference
+        try:
+            results['text_to_indices_reference_s'] = time_text_to_indices()
+        finally:
+            del self._tokenize_ipa_string
+        results['text_to_indices_compiled_s'] = time_text_to_indices()
+
+        results['tokenizer_speedup'] = results['tokenizer_reference_s'] / max(results['tokenizer_compiled_s'], 1e-12)
+        results['text_to_indices_speedup'] = (results['text_to_indices_reference_s']
+                                              / max(results['text_to_indices_compiled_s'], 1e-12))
+        return results
+
+    def fingerprint(self) -> str:
+        """
+        Fingerprint of the phoneme vocabulary and stress data (TSV dictionary and compiled
+        lexicon, by path, size and mtime); phoneme indices cached by another processor are
+        invalid if it differs.
+        """
+        vocab = json.dumps(self.phoneme_to_id, sort_keys=True, ensure_ascii=False)
+        payload = f"{vocab}|{len(self.stress_patterns)}"
+        if self.stress_lexicon is not None:
+            lexicon_stat = os.stat(self.stress_lexicon.path)
+            payload += f"|{self.stress_lexicon.path}|{lexicon_stat.st_size}|{lexicon_stat.st_mtime_ns}"
+        if self.stress_dict_path and os.path.exists(self.stress_dict_path):
+            dict_stat = os.stat(self.stress_dict_path)
+            payload += f"|tsv:{os.path.abspath(self.stress_dict_path)}|{dict_stat.st_size}|{dict_stat.st_mtime_ns}"
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def to_dict(self, include_word_cache: bool = True) -> Dict:
+        """
+        Serialize processor state to dictionary (for saving/loading).
+        With include_word_cache the processed-word cache is saved too (most recently used last),
+        so a loaded processor starts with a warm lexicon.
+        """
+        word_cache = {}
+        if include_word_cache:
+            word_cache = {
+                word: (phonemes, (stress.position, stress.vowel_index, stress.is_marked))
+                for word, (phonemes, stress) in self._word_cache.items()
+            }
         return {
             "vowels": self.vowels,
             "consonants": self.consonants,
@@ -746,14 +971,18 @@ class RussianPhonemeProcessor:
             "voiceless_consonants": list(self.voiceless_consonants),
             "voicing_map": self.voicing_map,
             "stress_patterns": self.stress_patterns,
+            "stress_lexicon_path": self.stress_lexicon.path if self.stress_lexicon is not None else None,
+            "stress_dict_path": self.stress_dict_path,
             "exceptions": self.exceptions,
-            "phoneme_to_id": self.phoneme_to_id # Include the built vocabulary
+            "phoneme_to_id": self.phoneme_to_id, # Include the built vocabulary
+            "word_cache_size": self.word_cache_size,
+            "word_cache": word_cache
         }
 
     @classmethod
     def from_dict(cls, data: Dict) -> "RussianPhonemeProcessor":
         """Recreate processor from a dictionary (for saving/loading)"""
-        instance = cls()
+        instance = cls(word_cache_size=data.get("word_cache_size", cls.DEFAULT_WORD_CACHE_SIZE))
         # Restore all attributes, ensuring sets are converted from lists
         instance.vowels = data.get("vowels", {})
         instance.consonants = data.get("consonants", {})
@@ -764,25 +993,86 @@ class RussianPhonemeProcessor:
         instance.voiceless_consonants = set(data.get("voiceless_consonants", []))
         instance.voicing_map = data.get("voicing_map", {})
         instance.stress_patterns = data.get("stress_patterns", {})
+        instance.stress_dict_path = data.get("stress_dict_path")
+        lexicon_path = data.get("stress_lexicon_path")
+        if lexicon_path:
+            if is_compiled_lexicon(lexicon_path):
+                instance.stress_lexicon = StressLexicon(lexicon_path)
+            else:
+                logger.warning(f"Compiled stress lexicon not found: {lexicon_path}")
         instance.exceptions = data.get("exceptions", {})
         instance.phoneme_to_id = data.get("phoneme_to_id", {})
+        instance._ipa_token_re = instance._build_ipa_tokenizer()
+        for word, (phonemes, stress) in data.get("word_cache", {}).items():
+            instance._word_cache[word] = (list(phonemes), StressInfo(*stress))
+        while len(instance._word_cache) > instance.word_cache_size:
+            instance._word_cache.popitem(last=False)
         return instance
 
     def clear_cache(self):
         """Clear internal caches to free memory or re-run processing"""
-        self.normalize_text.cache_clear()
-        self.process_word.cache_clear()
         self._word_cache.clear()
+        self._word_cache_hits = 0
+        self._word_cache_misses = 0
 
     def get_cache_info(self) -> Dict:
         """Get cache statistics for debugging"""
+        lookups = self._word_cache_hits + self._word_cache_misses
         return {
-            "normalize_text_cache": self.normalize_text.cache_info(),
-            "process_word_cache": self.process_word.cache_info(),
-            "word_cache_size": len(self._word_cache)
+            "word_cache_size": len(self._word_cache),
+            "word_cache_capacity": self.word_cache_size,
+            "hits": self._word_cache_hits,
+            "misses": self._word_cache_misses,
+            "hit_rate": self._word_cache_hits / lookups if lookups else 0.0
         }
 
 
+# Process pool helpers for RussianPhonemeProcessor.text_to_indices_batch
+_batch_worker_processor: Optional[RussianPhonemeProcessor] = None
+
+
+def _init_batch_worker(processor: RussianPhonemeProcessor):
+    global _batch_worker_processor
+    _batch_worker_processor = processor
+
+
+def _phonemize_chunk(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    return _batch_worker_processor._text_to_indices_chunk(texts)
+
+
+def save_indices_batch(path: str, ids: List[str], indices: np.ndarray, offsets: np.ndarray,
+                       processor: RussianPhonemeProcessor):
+    """
+    Save CSR phoneme indices as an .npz file, with the utterance ids, the vocabulary and
+    the fingerprint of the processor that produced them.
+    """
+    phoneme_to_id = processor.phoneme_to_id
+    np.savez(
+        path,
+        ids=np.array(ids),
+        indices=indices.astype(np.int32, copy=False),
+        offsets=offsets.astype(np.int64, copy=False),
+        phonemes=np.array(sorted(phoneme_to_id, key=phoneme_to_id.get)),
+        processor=np.array(processor.fingerprint())
+    )
+
+
+def load_indices_batch(path: str, processor: Optional[RussianPhonemeProcessor] = None
+                       ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Load (ids, indices, offsets) written by save_indices_batch. With `processor`, raises
+    ValueError unless they were built by a processor with the same fingerprint (vocabulary
+    and stress dictionary/lexicon).
+    """
+    with np.load(path) as data:
+        if processor is not None:
+            if 'processor' not in data:
+                raise ValueError("no processor fingerprint (written by an older version)")
+            if str(data['processor']) != processor.fingerprint():
+                raise ValueError("built with a different phoneme vocabulary or stress dictionary")
+        return data['ids'].tolist(), data['indices'], data['offsets']
+
+
 # Example usage and testing
 if __name__ == "__main__":
     import argparse
@@ -792,6 +1082,14 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--text", type=str, help="Text to process directly (enclose in quotes for phrases).")
     parser.add_argument("-f", "--file", type=str, help="Path to a text file to process.")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging for debugging.")
+    parser.add_argument("--batch", nargs=2, metavar=("METADATA_CSV", "OUTPUT_NPZ"),
+                        help="Phonemize a metadata file (id|text per line) into CSR indices/offsets (.npz).")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker processes for --batch (default: CPU count).")
+    parser.add_argument("--stress-dict", type=str, default=None,
+                        help="Stress dictionary (TSV or compiled .lex) for --batch; use the dataset's stress_dict_path.")
+    parser.add_argument("--benchmark", type=str, metavar="METADATA_CSV",
+                        help="Benchmark the IPA tokenizer and text_to_indices over a metadata file (id|text per line).")
 
     args = parser.parse_args()
 
@@ -800,6 +1098,43 @@ if __name__ == "__main__":
     else:
         logger.setLevel(logging.INFO) # Keep INFO level by default for less clutter
 
+    if args.batch:
+        import os
+        import time
+        metadata_path, output_path = args.batch
+        batch_ids, batch_texts = [], []
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('|')
+                if len(parts) >= 2:
+                    batch_ids.append(parts[0])
+                    batch_texts.append(parts[1])
+
+        batch_processor = RussianPhonemeProcessor(stress_dict_path=args.stress_dict)
+        start_time = time.perf_counter()
+        batch_indices, batch_offsets = batch_processor.text_to_indices_batch(
+            batch_texts, workers=args.workers or os.cpu_count()
+        )
+        elapsed = time.perf_counter() - start_time
+        save_indices_batch(output_path, batch_ids, batch_indices, batch_offsets, batch_processor)
+        print(f"Phonemized {len(batch_texts)} texts ({len(batch_indices)} phonemes) in {elapsed:.2f}s -> {output_path}")
+        sys.exit(0)
+
+    if args.benchmark:
+        with open(args.benchmark, 'r', encoding='utf-8') as f:
+            benchmark_texts = [line.rstrip('\n').split('|')[1] for line in f if '|' in line]
+        stats = RussianPhonemeProcessor().benchmark_text_to_indices(benchmark_texts)
+        print(f"Texts: {stats['num_texts']}, IPA strings: {stats['num_ipa_strings']}, "
+              f"tokenizer mismatches: {stats['tokenizer_mismatches']}")
+        print(f"IPA tokenizer:   reference {stats['tokenizer_reference_s']:.3f}s, "
+              f"compiled {stats['tokenizer_compiled_s']:.3f}s (x{stats['tokenizer_speedup']:.1f})")
+        print(f"text_to_indices: reference {stats['text_to_indices_reference_s']:.3f}s, "
+              f"compiled {stats['text_to_indices_compiled_s']:.3f}s (x{stats['text_to_indices_speedup']:.1f})")
+        norm_stats = RussianPhonemeProcessor().benchmark_normalize_text(benchmark_texts)
+        print(f"normalize_text:  reference {norm_stats['reference_s']:.3f}s, "
+              f"fast {norm_stats['fast_s']:.3f}s (x{norm_stats['speedup']:.1f}), mismatches: {norm_stats['mismatches']}")
+        sys.exit(0)
+
     input_text = ""
     if args.text:
         input_text = args.text
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Compiled, memory-mapped stress lexicon for RussianPhonemeProcessor
+
+A TSV stress dictionary (word<TAB>stressed syllable[<TAB>IPA]) is compiled once
+into a sorted binary file. Lookups binary-search the memory-mapped file, so
+opening a lexicon with millions of word forms is instant, costs no Python heap,
+and every process using it (DataLoader workers, inference, agent workers)
+shares the same page-cache pages.
+
+Usage:
+  python stress_lexicon.py compile stress_dict.tsv stress_dict.lex
+  python stress_lexicon.py lookup stress_dict.lex молоко
+"""
+
+import mmap
+import struct
+import logging
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'KSLX'
+VERSION = 1
+# magic, version, number of entries, reserved
+HEADER = struct.Struct('<4sIII')
+
+
+def is_compiled_lexicon(path: Union[str, Path]) -> bool:
+    """True if `path` is a compiled lexicon file (checked by its magic bytes)."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def compile_stress_lexicon(tsv_path: Union[str, Path], output_path: Union[str, Path]) -> int:
+    """
+    Compile a TSV stress dictionary into a binary lexicon. Returns the number of entries.
+
+    Layout (little-endian): header | key offsets (n+1 uint32) | IPA offsets (n+1 uint32) |
+    stress positions (n int16) | UTF-8 keys | UTF-8 IPA strings. Keys are sorted by their
+    UTF-8 bytes, which is what the binary search compares.
+    """
+    entries: Dict[bytes, Tuple[int, bytes]] = {}
+    with open(tsv_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split('\t')
+            if len(parts) < 2:
+                continue
+            word = parts[0].lower()
+            try:
+                stress_pos = int(parts[1])
+            except ValueError:
+                logger.warning(f"Invalid stress position for word {word} (line {line_no}): {parts[1]}")
+                continue
+            ipa = parts[2] if len(parts) >= 3 else ''
+            entries[word.encode('utf-8')] = (stress_pos, ipa.encode('utf-8'))
+
+    keys = sorted(entries)
+    key_offsets = np.zeros(len(keys) + 1, dtype='<u4')
+    ipa_offsets = np.zeros(len(keys) + 1, dtype='<u4')
+    stress = np.zeros(len(keys), dtype='<i2')
+    key_blob, ipa_blob = bytearray(), bytearray()
+    for i, key in enumerate(keys):
+        stress_pos, ipa = entries[key]
+        stress[i] = stress_pos
+        key_blob += key
+        ipa_blob += ipa
+        key_offsets[i + 1] = len(key_blob)
+        ipa_offsets[i + 1] = len(ipa_blob)
+
+    output_path = Path(output_path)
+    tmp_path = output_path.with_suffix(output_path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(keys), 0))
+        f.write(key_offsets.tobytes())
+        f.write(ipa_offsets.tobytes())
+        f.write(stress.tobytes())
+        f.write(key_blob)
+        f.write(ipa_blob)
+    tmp_path.replace(output_path)
+
+    logger.info(f"Compiled {len(keys)} lexicon entries from {tsv_path} into {output_path}")
+    return len(keys)
+
+
+class StressLexicon:
+    """
+    Read-only view over a compiled lexicon. The file is mapped on first lookup;
+    pickling drops the mapping so each process maps (and shares) the file itself.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = str(path)
+        self._mmap = None
+
+    def __getstate__(self):
+        return {'path': self.path, '_mmap': None}
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, num_entries, _ = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            raise ValueError(f"Not a compiled stress lexicon (or unsupported version): {self.path}")
+
+        offset = HEADER.size
+        self._key_offsets = np.frombuffer(mm, dtype='<u4', count=num_entries + 1, offset=offset)
+        offset += 4 * (num_entries + 1)
+        self._ipa_offsets = np.frombuffer(mm, dtype='<u4', count=num_entries + 1, offset=offset)
+        offset += 4 * (num_entries + 1)
+        self._stress = np.frombuffer(mm, dtype='<i2', count=num_entries, offset=offset)
+        offset += 2 * num_entries
+        self._keys_start = offset
+        self._ipa_start = offset + int(self._key_offsets[-1])
+        self._num_entries = num_entries
+        self._mmap = mm
+
+    def _find(self, word: str) -> int:
+        """Index of `word` in the lexicon, or -1."""
+        if self._mmap is None:
+            self._open()
+
+        target = word.encode('utf-8')
+        mm, key_offsets, base = self._mmap, self._key_offsets, self._keys_start
+        lo, hi = 0, self._num_entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = mm[base + int(key_offsets[mid]):base + int(key_offsets[mid + 1])]
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def lookup(self, word: str) -> Optional[Tuple[int, Optional[str]]]:
+        """Return (stressed syllable, IPA or None) for a lowercase word, or None if absent."""
+        idx = self._find(word)
+        if idx < 0:
+            return None
+        ipa_start = self._ipa_start + int(self._ipa_offsets[idx])
+        ipa_end = self._ipa_start + int(self._ipa_offsets[idx + 1])
+        ipa = self._mmap[ipa_start:ipa_end].decode('utf-8') if ipa_end > ipa_start else None
+        return int(self._stress[idx]), ipa
+
+    def get_stress(self, word: str) -> Optional[int]:
+        """Return the stressed syllable of a lowercase word, or None if absent."""
+        idx = self._find(word)
+        return int(self._stress[idx]) if idx >= 0 else None
+
+    def __contains__(self, word: str) -> bool:
+        return self._find(word) >= 0
+
+    def __len__(self) -> int:
+        if self._mmap is None:
+            self._open()
+        return self._num_entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile or query a memory-mapped stress lexicon")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = subparsers.add_parser('compile', help='Compile a TSV (word<TAB>stress[<TAB>IPA]) into a lexicon')
+    compile_parser.add_argument('tsv', type=str, help='Input TSV stress dictionary')
+    compile_parser.add_argument('output', type=str, help='Output lexicon file')
+
+    lookup_parser = subparsers.add_parser('lookup', help='Look up words in a compiled lexicon')
+    lookup_parser.add_argument('lexicon', type=str, help='Compiled lexicon file')
+    lookup_parser.add_argument('words', nargs='+', help='Words to look up')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == 'compile':
+        compile_stress_lexicon(args.tsv, args.output)
+    else:
+        lexicon = StressLexicon(args.lexicon)
+        for word in args.words:
+            print(f"{word}: {lexicon.lookup(word.lower())}")
+
+
+if __name__ == "__main__":
+    main()
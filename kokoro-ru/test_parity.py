@@ -0,0 +1,274 @@
+"""
+Parity tests for the inference optimizations: each fast path is checked against the
+path it replaced (or its kept _reference implementation) on small random models.
+
+Run from the kokoro-ru directory:
+  python -m pytest -q test_parity.py
+"""
+
+import pickle
+
+import pytest
+import torch
+
+from hifigan_export import ExportedHiFiGAN, ONNX_FILENAME, TORCHSCRIPT_FILENAME, export_hifigan
+from hifigan_vocoder import HiFiGANConfig, HiFiGANGenerator
+from model import KokoroModel
+from russian_phoneme_processor import RussianPhonemeProcessor, load_indices_batch, save_indices_batch
+from stress_lexicon import StressLexicon, compile_stress_lexicon, is_compiled_lexicon
+from transformers import MultiHeadAttentionImproved
+from vocoder_manager import HiFiGANStream
+
+# Float rounding differences between mathematically equivalent paths (e.g. KV cache vs
+# recomputing the whole prefix) are around 1e-6 on these models
+ATOL = 1e-5
+
+TEXTS = [
+    "Привет, как дела?",
+    "Ёлка и йогурт: ЁЖИК, чай — 123 штуки!",
+    "Сего́дня   хорошо\tи\nмолоко",
+    "Здравствуйте! Hello, мир... «кавычки» и (скобки)",
+    "ёж йод",
+    "",
+    "   ",
+]
+
+
+@pytest.fixture(scope="module")
+def model() -> KokoroModel:
+    torch.manual_seed(0)
+    model = KokoroModel(vocab_size=40, mel_dim=20, hidden_dim=32, n_encoder_layers=2, n_heads=4,
+                        encoder_ff_dim=64, n_decoder_layers=2, decoder_ff_dim=64, max_decoder_seq_len=400)
+    return model.eval()
+
+
+@pytest.fixture(scope="module")
+def generator() -> HiFiGANGenerator:
+    torch.manual_seed(0)
+    config = HiFiGANConfig.get_default_config()
+    config.upsample_initial_channel = 32
+    return HiFiGANGenerator(config).eval()
+
+
+@pytest.fixture(scope="module")
+def processor() -> RussianPhonemeProcessor:
+    return RussianPhonemeProcessor()
+
+
+def _phonemes(*lengths: int) -> torch.Tensor:
+    """Zero-padded random phoneme indices, one row per length."""
+    generator = torch.Generator().manual_seed(1)
+    indices = torch.zeros(len(lengths), max(lengths), dtype=torch.long)
+    for i, length in enumerate(lengths):
+        indices[i, :length] = torch.randint(1, 40, (length,), generator=generator)
+    return indices
+
+
+# Acoustic model
+
+def test_kv_cache_matches_uncached_decoding(model):
+    # stop_threshold > 1 never stops early, so both runs decode the same number of frames
+    phonemes = _phonemes(12)
+    cached = model.forward_inference(phonemes, stop_threshold=2.0, use_kv_cache=True)
+    uncached = model.forward_inference(phonemes, stop_threshold=2.0, use_kv_cache=False)
+    assert cached.shape == uncached.shape
+    torch.testing.assert_close(cached, uncached, rtol=0, atol=ATOL)
+
+
+def test_streaming_matches_forward_inference(model):
+    phonemes = _phonemes(12)
+    full = model.forward_inference(phonemes, stop_threshold=2.0)
+    chunks = list(model.forward_inference_stream(phonemes, chunk_frames=5, stop_threshold=2.0))
+    assert all(chunk.shape[1] <= 5 for chunk in chunks)
+    assert torch.equal(torch.cat(chunks, dim=1), full)
+
+
+def test_batched_inference_matches_single(model):
+    lengths = (12, 5, 9)
+    phonemes = _phonemes(*lengths)
+    mel_batch, mel_lengths = model.forward_inference_batch(phonemes, stop_threshold=2.0)
+
+    for i, length in enumerate(lengths):
+        single = model.forward_inference(phonemes[i:i + 1, :length], stop_threshold=2.0)
+        assert int(mel_lengths[i]) == single.shape[1]
+        torch.testing.assert_close(mel_batch[i:i + 1, :single.shape[1]], single, rtol=0, atol=ATOL)
+        assert not mel_batch[i, single.shape[1]:].any()
+
+
+def test_length_regulate_matches_reference(model):
+    torch.manual_seed(2)
+    encoder_outputs = torch.randn(4, 10, 32)
+    durations = torch.randint(0, 6, (4, 10)).float()
+    lengths = torch.tensor([10, 7, 1, 4])
+    text_padding_mask = torch.arange(10).unsqueeze(0) >= lengths.unsqueeze(1)
+
+    expanded, padding_mask = model._length_regulate(encoder_outputs, durations, text_padding_mask)
+    expected, expected_padding_mask = model._length_regulate_reference(encoder_outputs, durations, text_padding_mask)
+    assert torch.equal(expanded, expected)
+    assert torch.equal(padding_mask, expected_padding_mask)
+
+
+# Attention
+
+@pytest.mark.parametrize("use_causal_mask", [False, True])
+def test_sdpa_matches_unfused_attention(model, use_causal_mask):
+    torch.manual_seed(3)
+    attention = MultiHeadAttentionImproved(32, 4, dropout=0.0).eval()
+    query = torch.randn(2, 7, 32)
+    memory = torch.randn(2, 7, 32)
+    key_padding_mask = torch.tensor([[False] * 7, [False] * 4 + [True] * 3])
+    attn_mask = model._generate_square_subsequent_mask(7, query.device) if use_causal_mask else None
+
+    fused, fused_weights = attention(query, memory, memory, attn_mask=attn_mask, key_padding_mask=key_padding_mask)
+    unfused, _ = attention(query, memory, memory, attn_mask=attn_mask, key_padding_mask=key_padding_mask,
+                           need_weights=True)
+    assert fused_weights is None
+    torch.testing.assert_close(fused, unfused, rtol=0, atol=1e-6)
+
+
+def test_relative_positions_match_full_table():
+    attention = MultiHeadAttentionImproved(32, 4, use_relative_pos=True, max_relative_distance=4)
+    for key_len in (1, 3, 17, 300):
+        positions = torch.arange(key_len)
+        table = torch.clamp(positions.unsqueeze(0) - positions.unsqueeze(1), -4, 4) + 4
+        for seq_len in {1, key_len // 2 or 1, key_len}:
+            indices = attention._get_relative_positions(seq_len, torch.device("cpu"), key_len)
+            assert torch.equal(indices.long(), table[key_len - seq_len:])
+
+
+# Vocoder
+
+def test_hifigan_stream_matches_one_shot(generator):
+    torch.manual_seed(4)
+    mel = torch.randn(1, 60, 80) - 5.0
+    with torch.no_grad():
+        expected = generator(mel).reshape(-1)
+
+    stream = HiFiGANStream(generator)
+    pieces = [stream.push(mel[:, start:start + 7]) for start in range(0, 60, 7)]
+    pieces.append(stream.flush())
+    streamed = torch.cat(pieces)
+
+    assert streamed.shape == expected.shape
+    torch.testing.assert_close(streamed, expected, rtol=0, atol=1e-6)
+
+
+def _export_and_compare(generator, tmp_path, filename: str, export_onnx: bool):
+    export_hifigan(generator, tmp_path, example_frames=32, export_onnx=export_onnx)
+    exported = ExportedHiFiGAN(tmp_path / filename)
+    assert exported.samples_per_frame == generator.samples_per_frame
+    assert exported.receptive_field_frames == generator.receptive_field_frames
+
+    # Dynamic frame and batch dimensions: a different shape than the traced example
+    mel = torch.randn(2, 80, 45) - 5.0
+    with torch.no_grad():
+        expected = generator(mel)
+    torch.testing.assert_close(exported(mel), expected, rtol=0, atol=1e-4)
+
+
+def test_torchscript_export_matches_eager(generator, tmp_path):
+    _export_and_compare(generator, tmp_path, TORCHSCRIPT_FILENAME, export_onnx=False)
+    assert generator.has_weight_norm  # export folds a copy
+
+
+def test_onnx_export_matches_eager(generator, tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    _export_and_compare(generator, tmp_path, ONNX_FILENAME, export_onnx=True)
+
+
+# Text processing
+
+def test_normalize_text_matches_reference(processor):
+    for text in TEXTS:
+        assert processor.normalize_text(text) == processor._normalize_text_reference(text), text
+
+
+def test_tokenizer_matches_reference(processor):
+    ipa_strings = [processor.to_ipa(phonemes) for text in TEXTS for _, phonemes, _ in processor.process_text(text)]
+    ipa_strings += list(processor.exceptions.values())
+    ipa_strings += ["", "ˈ", "tʃʲˈa", "ʃtʃʃtʃ"]
+    assert len(ipa_strings) > 10
+    for ipa in ipa_strings:
+        assert processor._tokenize_ipa_string(ipa) == processor._tokenize_ipa_string_reference(ipa), ipa
+
+
+def test_stress_lexicon_round_trip(tmp_path):
+    tsv_path = tmp_path / "stress_dict.tsv"
+    tsv_path.write_text(
+        "# word\tstress\tipa\n"
+        "молоко\t2\n"
+        "замок\t0\tzˈamək\n"
+        "Ёжик\t0\n"
+        "плохо\tx\n"
+        "неполная строка\n"
+        "\n"
+        "замок\t1\n"
+        "я\t0\tja\n",
+        encoding="utf-8"
+    )
+    lexicon_path = tmp_path / "stress_dict.lex"
+    assert compile_stress_lexicon(tsv_path, lexicon_path) == 4
+    assert is_compiled_lexicon(lexicon_path)
+    assert not is_compiled_lexicon(tsv_path)
+
+    lexicon = StressLexicon(lexicon_path)
+    expected = {"молоко": (2, None), "замок": (1, None), "ёжик": (0, None), "я": (0, "ja")}
+    assert len(lexicon) == len(expected)
+    for word, entry in expected.items():
+        assert lexicon.lookup(word) == entry
+        assert lexicon.get_stress(word) == entry[0]
+        assert word in lexicon
+    for word in ("плохо", "", "молок", "молокоо", "яя"):
+        assert lexicon.lookup(word) is None
+        assert word not in lexicon
+
+    unpickled = pickle.loads(pickle.dumps(lexicon))
+    assert unpickled.lookup("замок") == (1, None)
+
+    # Stress-only entries give the same phonemes as the TSV the lexicon was built from;
+    # lexicon IPA is used like an exception pronunciation (the TSV loader ignores it)
+    from_tsv = RussianPhonemeProcessor(stress_dict_path=str(tsv_path))
+    from_lexicon = RussianPhonemeProcessor(stress_dict_path=str(lexicon_path))
+    assert from_lexicon.stress_lexicon is not None
+    for text in ("молоко и замок", "ёжик на замке"):
+        assert from_lexicon.process_text(text) == from_tsv.process_text(text)
+    assert from_lexicon._lookup_ipa("я") == "ja"
+    assert from_tsv._lookup_ipa("я") is None
+
+
+def test_stress_lexicon_overrides_built_in_patterns(tmp_path):
+    # "молоко" and "дела" have built-in stress patterns (2 and 1); a dictionary overrides them
+    # whether it is loaded as TSV or compiled into a lexicon
+    tsv_path = tmp_path / "stress_dict.tsv"
+    tsv_path.write_text("молоко\t0\nдела\t0\n", encoding="utf-8")
+    lexicon_path = tmp_path / "stress_dict.lex"
+    compile_stress_lexicon(tsv_path, lexicon_path)
+
+    from_tsv = RussianPhonemeProcessor(stress_dict_path=str(tsv_path))
+    from_lexicon = RussianPhonemeProcessor(stress_dict_path=str(lexicon_path))
+    assert RussianPhonemeProcessor().stress_patterns["молоко"] == 2
+    for word in ("молоко", "дела"):
+        assert from_lexicon._lookup_stress(word) == from_tsv._lookup_stress(word) == 0
+    assert from_lexicon.process_text("молоко и дела") == from_tsv.process_text("молоко и дела")
+
+
+def test_precomputed_indices_match_stress_dictionary(tmp_path):
+    tsv_path = tmp_path / "stress_dict.tsv"
+    tsv_path.write_text("замок\t1\nмолоко\t0\n", encoding="utf-8")
+    texts = ["Замок на двери", "Молоко и замок"]
+
+    with_dict = RussianPhonemeProcessor(stress_dict_path=str(tsv_path))
+    indices, offsets = with_dict.text_to_indices_batch(texts, workers=1)
+    npz_path = tmp_path / "phonemes.npz"
+    save_indices_batch(str(npz_path), ["a", "b"], indices, offsets, with_dict)
+
+    # Same stress data: the cached indices are what on-the-fly phonemization produces
+    ids, loaded, loaded_offsets = load_indices_batch(str(npz_path), RussianPhonemeProcessor(stress_dict_path=str(tsv_path)))
+    assert ids == ["a", "b"]
+    for i, text in enumerate(texts):
+        assert loaded[loaded_offsets[i]:loaded_offsets[i + 1]].tolist() == with_dict.text_to_indices(text)
+
+    # Same vocabulary but no stress dictionary (the old --batch default): rejected
+    with pytest.raises(ValueError):
+        load_indices_batch(str(npz_path), RussianPhonemeProcessor())
@@ -119,7 +119,8 @@ class KokoroTrainer:
             dataset=self.dataset,
             batch_size=config.batch_size,
             drop_last=True,
-            shuffle=True
+            shuffle=True,
+            max_frames_per_batch=config.max_frames_per_batch
         )
 
         self.dataloader = DataLoader(
@@ -649,6 +650,17 @@ class KokoroTrainer:
         dur_loss_epoch = 0.0
         stop_loss_epoch = 0.0
 
+        # Rebuild (reshuffle) the length-grouped batches for this epoch
+        self.batch_sampler.set_epoch(epoch)
+        padding_stats = self.batch_sampler.get_padding_stats()
+        if padding_stats:
+            logger.info(f"Epoch {epoch+1} batches: {padding_stats['num_batches']}, "
+                        f"size {padding_stats['min_batch_size']}-{padding_stats['max_batch_size']} "
+                        f"(mean {padding_stats['mean_batch_size']:.1f}), "
+                        f"padded frames/batch mean {padding_stats['mean_padded_frames']:.0f} "
+                        f"max {padding_stats['max_padded_frames']}, "
+                        f"padding waste {padding_stats['padding_waste'] * 100:.1f}%")
+
         num_batches = len(self.dataloader)
 
         # Determine if profiling for this epoch
@@ -2,7 +2,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.checkpoint import checkpoint
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import math
 import logging
 
@@ -11,6 +11,9 @@ logger = logging.getLogger(__name__)
 class MultiHeadAttentionImproved(nn.Module):
     """Improved multi-head attention with better initialization and optional relative positioning"""
 
+    # The relative position index cache grows in steps of this many key positions
+    RELATIVE_POSITION_CACHE_STEP = 256
+
     def __init__(self, d_model: int, num_heads: int, dropout: float = 0.1,
                  use_relative_pos: bool = False, max_relative_distance: int = 32):
         super().__init__()
@@ -38,10 +41,18 @@ class MultiHeadAttentionImproved(nn.Module):
             # Initialize these embeddings appropriately
             nn.init.xavier_uniform_(self.relative_position_k.weight)
             nn.init.xavier_uniform_(self.relative_position_v.weight)
+            # Per-device 1-D int32 vector of clamped, shifted relative distances (see
+            # _get_relative_positions). Holds 2 * L - 1 entries for the longest key length L
+            # seen, rounded up to RELATIVE_POSITION_CACHE_STEP: about 32 KB at 4000 frames.
+            self._relative_position_cache: Dict[str, torch.Tensor] = {}
 
         self.dropout_attn = nn.Dropout(dropout)
         self.scale = math.sqrt(self.d_k)
 
+        # Return (head-averaged) attention weights from forward. Forces the unfused path;
+        # set to True on a layer, or pass need_weights=True, for debugging/visualization
+        self.need_weights = False
+
         # Better initialization for linear layers
         self._init_weights()
 
@@ -54,42 +65,108 @@ class MultiHeadAttentionImproved(nn.Module):
         if self.w_o.bias is not None:
             nn.init.zeros_(self.w_o.bias)
 
-    def _get_relative_positions(self, seq_len: int, device: torch.device) -> torch.Tensor:
+    def _get_relative_positions(self, seq_len: int, device: torch.device,
+                                key_len: Optional[int] = None) -> torch.Tensor:
         """
-        Generate relative position indices for attention.
-        Output shape: (seq_len, seq_len)
-        """
-        # Create a tensor of indices from 0 to seq_len-1
-        idx = torch.arange(seq_len, device=device)
-        # Create a matrix of (i - j) for all pairs (i, j)
-        # Resulting shape: (seq_len, seq_len)
-        relative_pos_indices = idx.unsqueeze(0) - idx.unsqueeze(1)
-
-        # Clip values to be within [-max_relative_distance, max_relative_distance]
-        relative_pos_indices = torch.clamp(
-            relative_pos_indices, -self.max_relative_distance, self.max_relative_distance
-        )
+        Relative position indices for attention, built from a cached per-device vector.
+        Output shape: (seq_len, key_len)
 
-        # Shift values to be positive for embedding lookup
-        # e.g., if max_dist=32, range is -32 to 32. Adding 32 shifts to 0 to 64.
-        # This maps to indices [0, 2*max_relative_distance]
-        relative_pos_indices = relative_pos_indices + self.max_relative_distance
-
-        return relative_pos_indices # (S, S)
+        When key_len is larger than seq_len (incremental decoding with a key/value cache),
+        the queries are treated as the last seq_len positions of the key sequence.
+        """
+        if key_len is None:
+            key_len = seq_len
+
+        key = str(device)
+        offsets = self._relative_position_cache.get(key)
+        if offsets is None or offsets.shape[0] < 2 * key_len - 1:
+            step = self.RELATIVE_POSITION_CACHE_STEP
+            size = (key_len + step - 1) // step * step
+            # offsets[d + size - 1] is the embedding index of relative distance d = j - i:
+            # clipped to [-max_relative_distance, max_relative_distance] and shifted to be
+            # positive, e.g. if max_dist=32, range is -32 to 32. Adding 32 shifts to 0 to 64.
+            offsets = torch.arange(-(size - 1), size, device=device, dtype=torch.int32)
+            offsets = torch.clamp(offsets, -self.max_relative_distance, self.max_relative_distance)
+            offsets = offsets + self.max_relative_distance
+            self._relative_position_cache[key] = offsets
+
+        # Row i of the result is offsets[center - i : center - i + key_len]. unfold yields these
+        # windows in order of increasing start, i.e. for i = key_len - 1 down to 0.
+        center = offsets.shape[0] // 2
+        windows = offsets[center - (key_len - 1):center + key_len].unfold(0, key_len, 1)
+        return windows[:seq_len].flip(0) # (S_q, S_k)
+
+    @staticmethod
+    def _sdpa_mask(attn_mask: Optional[torch.Tensor],
+                   key_padding_mask: Optional[torch.Tensor]) -> Optional[torch.Tensor]:
+        """
+        Combine the float('-inf') attention mask and the padding mask (True for padded) into
+        one boolean mask (True = attend) broadcastable to (B, H, S_q, S_k), as used by
+        F.scaled_dot_product_attention. Same semantics as the masked_fill path.
+        """
+        mask = None
+        if attn_mask is not None:
+            mask = (attn_mask != float('-inf')).view(1, 1, *attn_mask.shape[-2:])
+        if key_padding_mask is not None:
+            keep = ~key_padding_mask.to(torch.bool).unsqueeze(1).unsqueeze(2)  # (B, 1, 1, S_k)
+            mask = keep if mask is None else mask & keep
+        return mask
 
     def forward(self, query: torch.Tensor, key: torch.Tensor, value: torch.Tensor,
                 attn_mask: Optional[torch.Tensor] = None, # Causal mask for decoder self-attention (float('-inf'))
-                key_padding_mask: Optional[torch.Tensor] = None # Padding mask (True for padded)
-               ) -> Tuple[torch.Tensor, torch.Tensor]: # Return output and attention weights
+                key_padding_mask: Optional[torch.Tensor] = None, # Padding mask (True for padded)
+                cache: Optional[Dict[str, torch.Tensor]] = None, # Incremental decoding key/value cache
+                static_kv: bool = False, # key/value are constant across calls (encoder memory)
+                need_weights: Optional[bool] = None # Defaults to self.need_weights
+               ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]: # Return output and attention weights (or None)
+        """
+        If `cache` is given, the keys/values projected from `key`/`value` are appended to
+        cache['key']/cache['value'] (shape (B, H, S_past, D_k)) and attention runs over the
+        whole cached sequence. Used for step-by-step self-attention in autoregressive decoding,
+        where `query`, `key` and `value` only contain the newest frame(s).
+
+        With `static_kv=True` the cache instead holds the projected `key`/`value` from the first
+        call and reuses them as-is afterwards (cross-attention over fixed encoder memory).
+
+        Without relative positions, and unless weights are requested, attention runs through the
+        fused F.scaled_dot_product_attention kernel (no materialized (B, H, S_q, S_k) scores) and
+        the returned weights are None.
+        """
+        if need_weights is None:
+            need_weights = self.need_weights
 
         batch_size, seq_len_q, _ = query.size()
-        seq_len_k = key.size(1)
-        seq_len_v = value.size(1) # Should be same as seq_len_k
 
         # 1. Linear projections and reshape for multi-head attention
         Q = self.w_q(query).view(batch_size, seq_len_q, self.num_heads, self.d_k).transpose(1, 2) # (B, H, S_q, D_k)
-        K = self.w_k(key).view(batch_size, seq_len_k, self.num_heads, self.d_k).transpose(1, 2)   # (B, H, S_k, D_k)
-        V = self.w_v(value).view(batch_size, seq_len_v, self.num_heads, self.d_k).transpose(1, 2)  # (B, H, S_v, D_k)
+
+        if cache is not None and static_kv and 'key' in cache:
+            # Memory was already projected on an earlier decoding step
+            K = cache['key']
+            V = cache['value']
+        else:
+            K = self.w_k(key).view(batch_size, key.size(1), self.num_heads, self.d_k).transpose(1, 2)   # (B, H, S_k, D_k)
+            V = self.w_v(value).view(batch_size, value.size(1), self.num_heads, self.d_k).transpose(1, 2)  # (B, H, S_v, D_k)
+
+            if cache is not None:
+                # Prepend keys/values of previously processed positions
+                if not static_kv and 'key' in cache:
+                    K = torch.cat([cache['key'], K], dim=2)
+                    V = torch.cat([cache['value'], V], dim=2)
+                cache['key'] = K
+                cache['value'] = V
+
+        seq_len_k = K.size(2)
+        use_relative_pos = self.use_relative_pos and (seq_len_q == seq_len_k or (cache is not None and not static_kv))
+
+        if not use_relative_pos and not need_weights:
+            context = F.scaled_dot_product_attention(
+                Q, K, V,
+                attn_mask=self._sdpa_mask(attn_mask, key_padding_mask),
+                dropout_p=self.dropout_attn.p if self.training else 0.0
+            )
+            context = context.transpose(1, 2).contiguous().view(batch_size, seq_len_q, self.d_model)
+            return self.w_o(context), None
 
         # 2. Scaled dot-product attention (Content-based scores)
         # scores = Q @ K.transpose(-2, -1) / sqrt(d_k)
@@ -97,9 +174,9 @@ class MultiHeadAttentionImproved(nn.Module):
         scores = torch.matmul(Q, K.transpose(-2, -1)) / self.scale
 
         # 3. Add relative positional encoding scores
-        if self.use_relative_pos and seq_len_q == seq_len_k:
+        if use_relative_pos:
             # Generate relative position indices (S_q, S_k)
-            rel_pos_indices = self._get_relative_positions(seq_len_q, query.device)
+            rel_pos_indices = self._get_relative_positions(seq_len_q, query.device, seq_len_k)
 
             # Retrieve relative key embeddings (S_q, S_k, D_k)
             rel_pos_k_emb = self.relative_position_k(rel_pos_indices)
@@ -136,7 +213,7 @@ class MultiHeadAttentionImproved(nn.Module):
         context = torch.matmul(attn_weights, V)
 
         # 7. Add relative positional encoding to values (for the `A * R_v` term)
-        if self.use_relative_pos and seq_len_q == seq_len_k:
+        if use_relative_pos:
             # Retrieve relative value embeddings (S_q, S_k, D_k)
             rel_pos_v_emb = self.relative_position_v(rel_pos_indices)
 
@@ -229,7 +306,7 @@ class ImprovedTransformerEncoderBlock(nn.Module):
             # Pre-normalization (e.g., Transformer-XL, GPT-2)
             # Self-attention sub-layer
             src_norm = self.norm1(src) # Apply LayerNorm BEFORE attention
-            # MultiHeadAttentionImproved returns (output, attn_weights)
+            # MultiHeadAttentionImproved returns (output, attn_weights), weights are None unless requested
             attn_output, _ = self.self_attn(src_norm, src_norm, src_norm,
                                             attn_mask=src_mask,
                                             key_padding_mask=src_key_padding_mask)
@@ -314,9 +391,13 @@ class ImprovedTransformerDecoderBlock(nn.Module):
                 tgt_mask: Optional[torch.Tensor] = None, # Causal mask for decoder self-attention
                 memory_mask: Optional[torch.Tensor] = None, # Not typically used for cross-attention
                 tgt_key_padding_mask: Optional[torch.Tensor] = None, # Padding mask for decoder input
-                memory_key_padding_mask: Optional[torch.Tensor] = None # Padding mask for encoder output
+                memory_key_padding_mask: Optional[torch.Tensor] = None, # Padding mask for encoder output
+                cache: Optional[Dict[str, Dict[str, torch.Tensor]]] = None # Per-layer incremental decoding cache
                ) -> torch.Tensor:
 
+        self_attn_cache = cache['self_attn'] if cache is not None else None
+        cross_attn_cache = cache['cross_attn'] if cache is not None else None
+
         # Ensure masks are boolean at this level
         if tgt_key_padding_mask is not None:
             tgt_key_padding_mask = tgt_key_padding_mask.to(torch.bool)
@@ -329,7 +410,8 @@ class ImprovedTransformerDecoderBlock(nn.Module):
             tgt_norm = self.norm1(tgt)
             attn_output, _ = self.self_attn(tgt_norm, tgt_norm, tgt_norm,
                                             attn_mask=tgt_mask,
-                                            key_padding_mask=tgt_key_padding_mask)
+                                            key_padding_mask=tgt_key_padding_mask,
+                                            cache=self_attn_cache)
             tgt = tgt + self.dropout1(attn_output)
 
             # Cross-attention sub-layer
@@ -337,7 +419,8 @@ class ImprovedTransformerDecoderBlock(nn.Module):
             # Query is from decoder (tgt_norm), Key/Value from encoder (memory)
             cross_attn_output, _ = self.cross_attn(tgt_norm, memory, memory,
                                                    attn_mask=memory_mask, # Usually None
-                                                   key_padding_mask=memory_key_padding_mask)
+                                                   key_padding_mask=memory_key_padding_mask,
+                                                   cache=cross_attn_cache, static_kv=True)
             tgt = tgt + self.dropout2(cross_attn_output)
 
             # Feed-forward sub-layer
@@ -349,13 +432,15 @@ class ImprovedTransformerDecoderBlock(nn.Module):
             # Self-attention sub-layer
             attn_output, _ = self.self_attn(tgt, tgt, tgt,
                                             attn_mask=tgt_mask,
-                                            key_padding_mask=tgt_key_padding_mask)
+                                            key_padding_mask=tgt_key_padding_mask,
+                                            cache=self_attn_cache)
             tgt = self.norm1(tgt + self.dropout1(attn_output))
 
             # Cross-attention sub-layer
             cross_attn_output, _ = self.cross_attn(tgt, memory, memory,
                                                    attn_mask=memory_mask, # Usually None
-                                                   key_padding_mask=memory_key_padding_mask)
+                                                   key_padding_mask=memory_key_padding_mask,
+                                                   cache=cross_attn_cache, static_kv=True)
             tgt = self.norm2(tgt + self.dropout2(cross_attn_output))
 
             # Feed-forward sub-layer
@@ -387,16 +472,45 @@ class ImprovedTransformerDecoder(nn.Module):
         else:
             self.norm = None # No final norm for post-norm architecture
 
+    def init_cache(self) -> List[Dict[str, Dict[str, torch.Tensor]]]:
+        """
+        Create an empty per-layer cache for incremental (step-by-step) decoding.
+        Self-attention keys/values grow by one frame per step; cross-attention keys/values
+        are projected from the encoder memory on the first step and reused afterwards.
+        """
+        return [{'self_attn': {}, 'cross_attn': {}} for _ in self.layers]
+
+    @staticmethod
+    def reorder_cache(cache: List[Dict[str, Dict[str, torch.Tensor]]],
+                      batch_index: torch.Tensor) -> List[Dict[str, Dict[str, torch.Tensor]]]:
+        """
+        Select (and reorder) batch entries of an incremental decoding cache in place,
+        e.g. to drop sequences that finished generating. batch_index is a 1D LongTensor.
+        """
+        for layer_cache in cache:
+            for attn_cache in layer_cache.values():
+                for name, tensor in attn_cache.items():
+                    attn_cache[name] = tensor.index_select(0, batch_index)
+        return cache
+
     def forward(self, tgt: torch.Tensor, memory: torch.Tensor,
                 tgt_mask: Optional[torch.Tensor] = None, # Causal mask for decoder self-attention
                 memory_key_padding_mask: Optional[torch.Tensor] = None, # Padding mask for encoder output
-                tgt_key_padding_mask: Optional[torch.Tensor] = None # Padding mask for decoder input
+                tgt_key_padding_mask: Optional[torch.Tensor] = None, # Padding mask for decoder input
+                cache: Optional[List[Dict[str, Dict[str, torch.Tensor]]]] = None # From init_cache(), inference only
                ) -> torch.Tensor:
 
         output = tgt
 
-        for layer in self.layers:
-            if self.training:
+        for i, layer in enumerate(self.layers):
+            if cache is not None:
+                # Incremental decoding: tgt holds only the newest frame(s), past keys/values come from the cache
+                output = layer(
+                    output, memory, tgt_mask, None,
+                    tgt_key_padding_mask, memory_key_padding_mask,
+                    cache=cache[i]
+                )
+            elif self.training:
                 # Use gradient checkpointing during training to save memory
                 # Arguments to checkpoint must be positional and match the layer's forward signature
                 # ImprovedTransformerDecoderBlock.forward takes:
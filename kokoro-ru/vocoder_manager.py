@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 VocoderManager - Handles different vocoder backends for TTS inference
-Supports HiFi-GAN and Griffin-Lim vocoders
+Supports HiFi-GAN (eager or exported TorchScript/ONNX) and Griffin-Lim vocoders
 """
 
 import torch
@@ -9,15 +9,78 @@ import torchaudio
 import requests
 import logging
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Iterator, List
 from urllib.parse import urlparse
 
 # Import vocoder modules
 from hifigan_vocoder import load_hifigan_model
+from hifigan_export import ExportedHiFiGAN
+from config import TrainingConfig
 
 logger = logging.getLogger(__name__)
 
 
+class HiFiGANStream:
+    """
+    Streaming HiFi-GAN vocoding. Mel chunks are pushed as the decoder produces them;
+    each call returns the audio of every frame that now has enough right context.
+
+    The generator runs on a window of the buffered frames extended by `context_frames`
+    on both sides (its receptive field), and only the samples of the new frames are kept
+    (overlap-and-discard), so the concatenated chunks match a one-shot run over the full mel.
+    """
+
+    def __init__(self, generator: torch.nn.Module, device: str = "cpu", context_frames: Optional[int] = None):
+        self.generator = generator
+        self.device = device
+        self.context_frames = context_frames if context_frames is not None else generator.receptive_field_frames + 1
+        self.samples_per_frame = generator.samples_per_frame
+
+        self._buffer: Optional[torch.Tensor] = None  # (n_mels, frames) from frame index _buffer_start
+        self._buffer_start = 0
+        self._total_frames = 0
+        self._emitted_frames = 0
+
+    def push(self, mel_chunk: torch.Tensor) -> torch.Tensor:
+        """Add mel frames ((time, n_mels) or (1, time, n_mels)) and return the audio that is ready (1D, may be empty)."""
+        if mel_chunk.dim() == 3:
+            mel_chunk = mel_chunk.squeeze(0)
+        mel_chunk = mel_chunk.transpose(0, 1).to(self.device)
+
+        self._buffer = mel_chunk if self._buffer is None else torch.cat([self._buffer, mel_chunk], dim=1)
+        self._total_frames += mel_chunk.shape[1]
+        return self._vocode_until(self._total_frames - self.context_frames)
+
+    def flush(self) -> torch.Tensor:
+        """Return the audio of all remaining frames; the stream can then be reused for a new utterance."""
+        audio = self._vocode_until(self._total_frames, at_end=True)
+        self._buffer = None
+        self._buffer_start = self._total_frames = self._emitted_frames = 0
+        return audio
+
+    def _vocode_until(self, end_frame: int, at_end: bool = False) -> torch.Tensor:
+        if self._buffer is None or end_frame <= self._emitted_frames:
+            return torch.zeros(0)
+
+        window_start = max(self._emitted_frames - self.context_frames, self._buffer_start)
+        window_end = self._total_frames if at_end else min(end_frame + self.context_frames, self._total_frames)
+        window = self._buffer[:, window_start - self._buffer_start:window_end - self._buffer_start]
+
+        with torch.no_grad():
+            audio = self.generator(window.unsqueeze(0)).reshape(-1)
+
+        first = (self._emitted_frames - window_start) * self.samples_per_frame
+        last = (end_frame - window_start) * self.samples_per_frame
+        audio = audio[first:last].cpu()
+
+        self._emitted_frames = end_frame
+        # Keep only the left context needed for the next window
+        keep_from = max(self._emitted_frames - self.context_frames, self._buffer_start)
+        self._buffer = self._buffer[:, keep_from - self._buffer_start:]
+        self._buffer_start = keep_from
+        return audio
+
+
 class VocoderManager:
     """Manages different vocoder backends"""
 
@@ -34,13 +97,24 @@ class VocoderManager:
         }
     }
 
-    def __init__(self, vocoder_type: str = "hifigan", vocoder_path: Optional[str] = None, device: str = "cpu"):
+    # Log-mel value of silence, matching the epsilon used in feature extraction (log(1e-9))
+    LOG_SILENCE = -20.7232658
+
+    # Pseudo-inverse mel filterbanks shared by all instances, keyed by mel settings and device
+    _inverse_mel_cache: Dict[tuple, torch.Tensor] = {}
+
+    def __init__(self, vocoder_type: str = "hifigan", vocoder_path: Optional[str] = None, device: str = "cpu",
+                 config: Optional[TrainingConfig] = None):
         self.vocoder_type = vocoder_type.lower()
         self.device = device
+        # Audio settings of the mel spectrograms (STFT and mel filterbank for Griffin-Lim)
+        self.config = config or TrainingConfig(auto_optimize_checkpointing=False)
         self.vocoder = None
 
         if vocoder_type == "hifigan":
             self.vocoder = self._load_hifigan(vocoder_path)
+        elif vocoder_type == "hifigan_exported":
+            self.vocoder = self._load_exported_hifigan(vocoder_path)
         elif vocoder_type == "griffin_lim":
             self.vocoder = self._setup_griffin_lim()
         else:
@@ -115,6 +189,12 @@ class VocoderManager:
             logger.info("Falling back to Griffin-Lim")
             return self._setup_griffin_lim()
 
+    def _load_exported_hifigan(self, vocoder_path: Optional[str]) -> torch.nn.Module:
+        """Load a vocoder written by `hifigan_export.py export` (directory, .ts or .onnx file)"""
+        if not vocoder_path or not Path(vocoder_path).exists():
+            raise ValueError(f"hifigan_exported requires --vocoder-path to an exported vocoder, got: {vocoder_path}")
+        return ExportedHiFiGAN(vocoder_path, self.device)
+
     def _setup_griffin_lim(self):
         """Setup Griffin-Lim as fallback with device compatibility"""
         logger.info("Using Griffin-Lim vocoder")
@@ -122,9 +202,9 @@ class VocoderManager:
         # For MPS device compatibility, create Griffin-Lim on CPU initially
         # and move to device later if supported
         griffin_lim = torchaudio.transforms.GriffinLim(
-            n_fft=1024,
-            hop_length=256,
-            win_length=1024,
+            n_fft=self.config.n_fft,
+            hop_length=self.config.hop_length,
+            win_length=self.config.win_length,
             power=2.0,
             n_iter=60  # More iterations for better quality
         )
@@ -140,13 +220,61 @@ class VocoderManager:
 
     def mel_to_audio(self, mel_spec: torch.Tensor) -> torch.Tensor:
         """Convert mel spectrogram to audio"""
-        if self.vocoder_type == "hifigan":
+        if self.vocoder_type in ("hifigan", "hifigan_exported"):
             return self._hifigan_inference(mel_spec)
         elif self.vocoder_type == "griffin_lim":
             return self._griffin_lim_inference(mel_spec)
         else:
             raise ValueError(f"Unknown vocoder type: {self.vocoder_type}")
 
+    def mel_batch_to_audio(self, mel_batch: torch.Tensor, mel_lengths: torch.Tensor) -> List[torch.Tensor]:
+        """
+        Convert a zero-padded mel batch (batch, time, n_mels) to a list of 1D waveforms,
+        each trimmed to its own length. The whole batch is vocoded in one pass.
+        """
+        mel_lengths = [int(length) for length in mel_lengths]
+
+        if not self.uses_hifigan:
+            return self._griffin_lim_batch_inference(mel_batch, mel_lengths)
+
+        with torch.no_grad():
+            mel_batch = mel_batch.to(self.device)
+            # Fill padding with log-silence rather than zeros so it does not bleed into the
+            # receptive field of valid frames near the end of shorter utterances
+            frame_ids = torch.arange(mel_batch.shape[1], device=mel_batch.device)
+            padding = frame_ids.unsqueeze(0) >= torch.tensor(mel_lengths, device=mel_batch.device).unsqueeze(1)
+            mel_batch = mel_batch.masked_fill(padding.unsqueeze(-1), self.LOG_SILENCE)
+
+            audio = self.vocoder(mel_batch.transpose(1, 2))  # (batch, 1, samples)
+            audio = audio.reshape(audio.shape[0], -1).cpu()
+
+        samples_per_frame = audio.shape[1] // max(mel_batch.shape[1], 1)
+        return [audio[i, :length * samples_per_frame] for i, length in enumerate(mel_lengths)]
+
+    @property
+    def uses_hifigan(self) -> bool:
+        """True if a HiFi-GAN generator (eager or exported) is loaded; Griffin-Lim cannot be batched or streamed."""
+        return (self.vocoder_type in ("hifigan", "hifigan_exported")
+                and not isinstance(self.vocoder, torchaudio.transforms.GriffinLim))
+
+    def create_stream(self, context_frames: Optional[int] = None) -> HiFiGANStream:
+        """Create a streaming vocoder session (HiFi-GAN only)."""
+        if not self.uses_hifigan:
+            raise ValueError("Streaming vocoding requires a HiFi-GAN vocoder")
+        return HiFiGANStream(self.vocoder, self.device, context_frames)
+
+    def stream_mel_to_audio(self, mel_chunks: Iterable[torch.Tensor],
+                            context_frames: Optional[int] = None) -> Iterator[torch.Tensor]:
+        """Vocode mel chunks ((time, n_mels) each) as they arrive, yielding non-empty audio chunks."""
+        stream = self.create_stream(context_frames)
+        for mel_chunk in mel_chunks:
+            audio = stream.push(mel_chunk)
+            if audio.numel() > 0:
+                yield audio
+        audio = stream.flush()
+        if audio.numel() > 0:
+            yield audio
+
     def _hifigan_inference(self, mel_spec: torch.Tensor) -> torch.Tensor:
         """HiFi-GAN inference"""
         if isinstance(self.vocoder, torchaudio.transforms.GriffinLim):
@@ -172,36 +300,56 @@ class VocoderManager:
 
         return audio.cpu()
 
-    def _griffin_lim_inference(self, mel_spec: torch.Tensor) -> torch.Tensor:
-        """Griffin-Lim inference with device compatibility handling"""
-        # Convert log mel to linear scale
-        mel_spec = torch.exp(mel_spec)
+    def _get_inverse_mel_matrix(self, device: torch.device) -> torch.Tensor:
+        """
+        (n_freqs, n_mels) least-squares inverse of the mel filterbank used in feature extraction,
+        so a mel spectrogram maps back to a linear one with a single matmul. Built once per
+        mel configuration and device.
+        """
+        key = (self.config.n_fft, self.config.n_mels, self.config.sample_rate,
+               self.config.f_min, self.config.f_max, str(device))
+        matrix = self._inverse_mel_cache.get(key)
+        if matrix is None:
+            fbanks = torchaudio.functional.melscale_fbanks(
+                n_freqs=self.config.n_fft // 2 + 1,
+                f_min=self.config.f_min,
+                f_max=self.config.f_max,
+                n_mels=self.config.n_mels,
+                sample_rate=self.config.sample_rate
+            )  # (n_freqs, n_mels), same filterbank as torchaudio.transforms.MelSpectrogram
+            # Computed on the CPU in float64 (pinv is unsupported on MPS and ill-conditioned in float32)
+            matrix = torch.linalg.pinv(fbanks.T.double()).float().to(device)
+            self._inverse_mel_cache[key] = matrix
+        return matrix
+
+    def _mel_to_linear(self, mel_spec: torch.Tensor) -> torch.Tensor:
+        """Log-mel (..., n_mels, time) to linear power spectrogram (..., n_freqs, time) on the Griffin-Lim device"""
+        device = self.vocoder.window.device
+        inverse_mel = self._get_inverse_mel_matrix(device)
+        return torch.clamp(inverse_mel @ torch.exp(mel_spec.to(device)), min=0.0)
 
+    def _griffin_lim_inference(self, mel_spec: torch.Tensor) -> torch.Tensor:
+        """Griffin-Lim inference"""
         # Transpose to get correct shape: (time, n_mels) -> (n_mels, time)
-        if len(mel_spec.shape) == 2 and mel_spec.shape[1] == 80:
+        if len(mel_spec.shape) == 2 and mel_spec.shape[1] == self.config.n_mels:
             mel_spec = mel_spec.transpose(0, 1)
 
-        # Handle MPS device incompatibility with InverseMelScale
-        device_for_mel_ops = "cpu" if self.device == "mps" else self.device
-
-        # Convert mel spectrogram back to linear magnitude spectrogram
-        inverse_mel_scale = torchaudio.transforms.InverseMelScale(
-            n_stft=513,
-            n_mels=80,
-            sample_rate=22050,
-            f_min=0.0,
-            f_max=8000.0
-        ).to(device_for_mel_ops)
+        with torch.no_grad():
+            # Convert the log mel spectrogram to a linear power spectrogram, then to audio
+            audio = self.vocoder(self._mel_to_linear(mel_spec))
 
-        # Move mel_spec to compatible device for inverse transform
-        mel_spec_for_inverse = mel_spec.to(device_for_mel_ops)
-        linear_spec = inverse_mel_scale(mel_spec_for_inverse)
+        return audio.cpu()
 
-        # Move back to original device for Griffin-Lim if needed
-        if device_for_mel_ops != self.device:
-            linear_spec = linear_spec.to(self.device)
+    def _griffin_lim_batch_inference(self, mel_batch: torch.Tensor, mel_lengths: List[int]) -> List[torch.Tensor]:
+        """Griffin-Lim over a zero-padded (batch, time, n_mels) mel batch, all utterances in one pass"""
+        with torch.no_grad():
+            # Silent padding keeps the iterations from spreading energy into the padded frames
+            frame_ids = torch.arange(mel_batch.shape[1])
+            padding = frame_ids.unsqueeze(0) >= torch.tensor(mel_lengths).unsqueeze(1)
+            mel_batch = mel_batch.cpu().masked_fill(padding.unsqueeze(-1), self.LOG_SILENCE)
 
-        # Convert linear magnitude spectrogram to audio using Griffin-Lim
-        audio = self.vocoder(linear_spec)
+            audio = self.vocoder(self._mel_to_linear(mel_batch.transpose(1, 2))).cpu()  # (batch, samples)
 
-        return audio.cpu()
+        # Same length as single-utterance Griffin-Lim: (frames - 1) * hop samples
+        hop_length = self.config.hop_length
+        return [audio[i, :max(length - 1, 0) * hop_length] for i, length in enumerate(mel_lengths)]